@@ -0,0 +1,264 @@
+"""Benchmark tikz_export.py on synthetic scenes
+
+Runs the exporter with a stand-in for the Blender API (mock_blender) on a
+synthetic scene (synthetic.make_scene) and times these stages for every
+combination of the boolean options in BENCH_OPTIONS:
+
+    write_object     the code for all objects, from the scene description
+    write_materials  the materials section
+    write_objects    a complete export, from Blender objects to a .tex file
+
+For each stage the throughput is reported in points/sec and output
+bytes/sec, together with the peak memory use of the process. The
+results are saved as JSON, and can be compared with the results from an
+earlier version to find regressions:
+
+    python benchmarks/bench_export.py -o before.json
+    ... change tikz_core.py ...
+    python benchmarks/bench_export.py -o after.json --compare before.json
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import itertools
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    # Python < 2.6
+    json = None
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import mock_blender
+mock_blender.install()
+import tikz_core
+import tikz_export
+import tikz_batch
+import synthetic
+
+# Boolean options that change the generated code
+BENCH_OPTIONS = ['DRAW_CURVE', 'FILL_CLOSED_CURVE', 'TRANSFORM_CURVE', 'EMPTIES',
+                 'EXPORT_MATERIALS', 'USE_PLOTPATH', 'WRAP_LINES']
+
+# Slowdown reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+def peak_memory():
+    """Return the peak resident memory of the process in kB, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Bytes on OS X
+        peak //= 1024
+    return peak
+
+
+def best_time(func, repeat):
+    """Return the shortest time of repeat calls to func and its result"""
+    best = None
+    for i in range(repeat):
+        t0 = time.time()
+        result = func()
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best, result
+
+
+def bench_write_object(scene):
+    state = tikz_core.ExportState()
+    empties = tikz_core.group_empties(scene.objects)
+    return sum([len(tikz_core.write_object(obj, empties, state))
+                for obj in scene.objects])
+
+
+def bench_write_materials(scene):
+    styles = tikz_core.StyleTable()
+    tikz_core.collect_materials(scene.objects, styles)
+    return len(tikz_core.write_materials(styles))
+
+
+def bench_write_objects(filepath):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        tikz_export.write_objects(filepath)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return os.path.getsize(filepath)
+
+
+def option_combinations(names):
+    """Return a list with dicts of all combinations of boolean options"""
+    return [dict(zip(names, values))
+            for values in itertools.product([False, True], repeat=len(names))]
+
+
+def run(params, combinations, extra_options, repeat):
+    """Run the benchmarks and return a list of result dicts"""
+    objects = synthetic.make_scene(**params)
+    mock_blender.select(objects)
+    npoints = synthetic.count_points(objects)
+    scene = tikz_export.dump_scene(objects, mock_blender.Scene.GetCurrent())
+    tmpdir = tempfile.mkdtemp()
+    filepath = os.path.join(tmpdir, 'bench.tex')
+    results = []
+    try:
+        for options in combinations:
+            options = dict(options)
+            options.update(extra_options)
+            options['CLIPBOARD_OUTPUT'] = False
+            options['SAVE_SCENE'] = False
+            tikz_core.set_options(options)
+            stages = [('write_object', lambda: bench_write_object(scene)),
+                      ('write_materials', lambda: bench_write_materials(scene)),
+                      ('write_objects', lambda: bench_write_objects(filepath))]
+            for stage, func in stages:
+                seconds, nbytes = best_time(func, repeat)
+                seconds = max(seconds, 1e-9)
+                results.append(dict(stage=stage, options=options, seconds=seconds,
+                                    bytes=nbytes, points=npoints,
+                                    points_per_sec=npoints / seconds,
+                                    bytes_per_sec=nbytes / seconds,
+                                    peak_kb=peak_memory()))
+    finally:
+        shutil.rmtree(tmpdir)
+    return results
+
+
+def result_key(result):
+    return (result['stage'], tuple(sorted(result['options'].items())))
+
+
+def options_label(options):
+    """Return the enabled boolean options of BENCH_OPTIONS as a short string"""
+    on = [name for name in BENCH_OPTIONS if options.get(name)]
+    return ",".join(on) or "-"
+
+
+def print_results(results):
+    print "%-16s %10s %12s %12s %10s  %s" % ('stage', 'time', 'points/s',
+                                             'bytes/s', 'peak kB', 'options')
+    for r in results:
+        print "%-16s %9.4fs %12.0f %12.0f %10s  %s" % (
+            r['stage'], r['seconds'], r['points_per_sec'], r['bytes_per_sec'],
+            r['peak_kb'], options_label(r['options']))
+
+
+def compare(results, old_results):
+    """Print the change in time from old_results and return the regressions"""
+    old = dict([(result_key(r), r) for r in old_results])
+    regressions = []
+    print
+    print "%-16s %10s %10s %8s  %s" % ('stage', 'old', 'new', 'change', 'options')
+    for r in results:
+        o = old.get(result_key(r))
+        if o is None:
+            continue
+        change = r['seconds'] / max(o['seconds'], 1e-9) - 1
+        flag = ''
+        if change > REGRESSION_THRESHOLD:
+            flag = '  REGRESSION'
+            regressions.append(r)
+        print "%-16s %9.4fs %9.4fs %+7.1f%%  %s%s" % (
+            r['stage'], o['seconds'], r['seconds'], change * 100,
+            options_label(r['options']), flag)
+    return regressions
+
+
+def main(args=None):
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('-c', '--curves', type='int', default=synthetic.DEFAULTS['curves'],
+                      help="number of curves [%default]")
+    parser.add_option('-p', '--points', type='int', default=synthetic.DEFAULTS['points'],
+                      help="points per curve [%default]")
+    parser.add_option('-b', '--bezier', type='float',
+                      default=synthetic.DEFAULTS['bezier_ratio'],
+                      help="fraction of bezier curves [%default]")
+    parser.add_option('-y', '--cyclic', type='float',
+                      default=synthetic.DEFAULTS['cyclic_ratio'],
+                      help="fraction of closed curves [%default]")
+    parser.add_option('-e', '--empties', type='int', default=synthetic.DEFAULTS['empties'],
+                      help="number of parented empties [%default]")
+    parser.add_option('-m', '--materials', type='int',
+                      default=synthetic.DEFAULTS['materials'],
+                      help="number of materials [%default]")
+    parser.add_option('-s', '--seed', type='int', default=synthetic.DEFAULTS['seed'],
+                      help="random seed for the scene [%default]")
+    parser.add_option('-r', '--repeat', type='int', default=3,
+                      help="runs per benchmark, the best is reported [%default]")
+    parser.add_option('-q', '--quick', action='store_true',
+                      help="only run the default options")
+    parser.add_option('-O', '--option', dest='extra', action='append', default=[],
+                      metavar='NAME=VALUE', help="set an export option for all runs")
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help="save the results to FILE as JSON")
+    parser.add_option('--compare', metavar='FILE',
+                      help="compare with results saved in FILE")
+    opts, rest = parser.parse_args(args)
+    if json is None and (opts.output or opts.compare):
+        parser.error("saving and comparing results requires Python 2.6")
+
+    params = dict(curves=opts.curves, points=opts.points, bezier_ratio=opts.bezier,
+                  cyclic_ratio=opts.cyclic, empties=opts.empties,
+                  materials=opts.materials, seed=opts.seed)
+    extra_options = {}
+    for item in opts.extra:
+        name, sep, value = item.partition('=')
+        name = name.strip().upper()
+        if not sep or name not in tikz_core.OPTIONS:
+            parser.error("invalid option: %s" % item)
+        # Same value syntax as the tikz_batch.py options files
+        extra_options[name] = tikz_batch.parse_value(value.strip())
+    if opts.quick:
+        defaults = tikz_core.get_options()
+        combinations = [dict([(name, defaults[name]) for name in BENCH_OPTIONS])]
+    else:
+        combinations = option_combinations(BENCH_OPTIONS)
+
+    results = run(params, combinations, extra_options, opts.repeat)
+    print_results(results)
+    regressions = []
+    if opts.compare:
+        f = open(opts.compare)
+        try:
+            old = json.load(f)
+        finally:
+            f.close()
+        if old['scene'] != params:
+            print "Warning: %s was run on a different scene" % opts.compare
+        regressions = compare(results, old['results'])
+        print "%d regressions (more than %d%% slower)" \
+              % (len(regressions), REGRESSION_THRESHOLD * 100)
+    if opts.output:
+        f = open(opts.output, 'w')
+        try:
+            json.dump(dict(version=tikz_core.__version__, python=sys.version,
+                           numpy=tikz_core.numpy is not None,
+                           date=time.strftime('%Y-%m-%d %H:%M:%S'),
+                           scene=params, results=results), f, indent=1)
+        finally:
+            f.close()
+        print "Results saved to %s" % opts.output
+    if regressions:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Benchmark coordinate formatting for large polylines
+
+Compares formatting every point separately, the way tikz_export.py used
+to do it, with the bulk formatting functions. The bulk functions are
+timed both with plain Python lists and with NumPy arrays, if available.
+
+The wrap mode compares wrapping a curve with several plot paths using
+textwrap after each plot path, like tikz_export.py used to do, with
+LineWrapper.
+
+Run from the repository root with:
+
+    python benchmarks/bench_format.py
+"""
+import os
+import sys
+import math
+import time
+from textwrap import wrap
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from tikz_core import xy_values, format_coords, format_wrapped_coords, numpy
+from tikz_core import LineWrapper
+
+SIZES = [1000, 10000, 100000, 1000000]
+REPEAT = 3
+# Number of plot paths in the wrap mode
+WRAP_NURBS = 10
+
+
+def make_points(n):
+    return [[math.cos(i * 0.001) * 3.0, math.sin(i * 0.0013) * 2.0, 0.0, 1.0]
+            for i in xrange(n)]
+
+
+# Reference implementations formatting one point at a time
+
+def lines_per_point(points):
+    coords = ["(+%.4f,+%.4f)" % (point[0], point[1]) for point in points]
+    ps = "%s\n  " % coords[0]
+    i = 0
+    for c in coords[1:]:
+        i += 1
+        if i % 3:
+            ps += "-- %s" % c
+        else:
+            ps += "  -- %s\n  " % c
+    return ps
+
+
+def plot_per_point(points):
+    coords = ["(+%.4f,+%.4f)" % (point[0], point[1]) for point in points]
+    return " ".join(coords)
+
+
+def plot_pieces(points):
+    """Split the points in WRAP_NURBS plot paths"""
+    n = max(1, len(points) // WRAP_NURBS)
+    return [" plot coordinates {%s}" % format_coords(xy_values(points[i:i + n]))
+            for i in xrange(0, len(points), n)]
+
+
+def wrap_rewrap(points):
+    ps = []
+    for piece in plot_pieces(points):
+        ps.append(piece)
+        ps = ["\n".join(wrap("".join(ps), 80, subsequent_indent="  ",
+                             break_long_words=False))]
+    return ps[0]
+
+
+def wrap_single_pass(points):
+    wrapper = LineWrapper(80, "  ")
+    for piece in plot_pieces(points):
+        wrapper.write(piece)
+    return wrapper.close()
+
+
+def lines_bulk(points):
+    return format_wrapped_coords(xy_values(points), False)
+
+
+def plot_bulk(points):
+    return format_coords(xy_values(points))
+
+
+BENCHMARKS = [
+    ('lines', lines_per_point, lines_bulk),
+    ('plot', plot_per_point, plot_bulk),
+    ('wrap', wrap_rewrap, wrap_single_pass),
+]
+
+
+def timeit(func, arg):
+    best = None
+    for i in range(REPEAT):
+        t0 = time.time()
+        result = func(arg)
+        t = time.time() - t0
+        if best is None or t < best:
+            best = t
+    return best, result
+
+
+def main():
+    print "%-6s %10s %12s %12s %12s" % ('mode', 'points', 'per point', 'bulk',
+                                         'bulk numpy')
+    for n in SIZES:
+        points = make_points(n)
+        if numpy is not None:
+            array = numpy.array(points)
+        for mode, reference, func in BENCHMARKS:
+            t_ref, ref = timeit(reference, points)
+            t_bulk, res = timeit(func, points)
+            assert res == ref
+            if numpy is not None:
+                t_np, res = timeit(func, array)
+                assert res == ref
+                np_str = "%11.3fs" % t_np
+            else:
+                np_str = "%12s" % 'n/a'
+            print "%-6s %10d %11.3fs %11.3fs %s" % (mode, n, t_ref, t_bulk, np_str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""A stand-in for the Blender 2.4x API used by tikz_export.py
+
+Only the parts of the API that tikz_export.py uses are provided. Call
+install() before importing tikz_export, and set the selected objects
+with select():
+
+    import mock_blender
+    mock_blender.install()
+    mock_blender.select(objects)
+    import tikz_export
+
+Objects are created with Curve, Empty, Camera and Mat. The world matrix
+is built from a location, a rotation around the Z axis and a scale, or
+given directly with the matrix argument. animate() sets a function that
+moves the objects when the current frame is changed, and set_groups()
+sets the groups of the scene.
+"""
+import math
+import os
+import sys as _sys
+import types
+
+# Directory with tikz_export.py and the helper modules
+SCRIPTSDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+_selected = []
+_registry = {}
+_scene_properties = {}
+_camera = []
+_frame = [1]
+_frame_handler = []
+_groups = []
+
+
+def _module(name):
+    m = types.ModuleType('Blender.' + name)
+    _sys.modules['Blender.' + name] = m
+    globals()[name] = m
+    return m
+
+
+def make_matrix(loc=(0.0, 0.0, 0.0), rot_z=0.0, scale=(1.0, 1.0, 1.0), matrix=None):
+    """Return a world matrix in Blender's row convention"""
+    if matrix is not None:
+        return [list(row) for row in matrix]
+    c, s = math.cos(rot_z), math.sin(rot_z)
+    sx, sy, sz = scale
+    return [[sx * c, sx * s, 0.0, 0.0],
+            [-sy * s, sy * c, 0.0, 0.0],
+            [0.0, 0.0, sz, 0.0],
+            [loc[0], loc[1], loc[2], 1.0]]
+
+
+class BezTriple(object):
+    def __init__(self, h1, knot, h2):
+        self.vec = [list(h1), list(knot), list(h2)]
+
+
+class CurNurb(object):
+    """A curve segment. points are BezTriples or (x, y, z, w) rows."""
+
+    def __init__(self, type, points, cyclic=False, orderU=4, flagU=0):
+        self.type = type
+        self.points = points
+        self.cyclic = cyclic
+        self.orderU = orderU
+        self.flagU = flagU
+
+    def __iter__(self):
+        return iter(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def isCyclic(self):
+        return self.cyclic
+
+
+class CurveData(object):
+    def __init__(self, name, nurbs, materials=()):
+        self.name = name
+        self.nurbs = nurbs
+        self.materials = list(materials)
+
+    def __iter__(self):
+        return iter(self.nurbs)
+
+    def getMaterials(self):
+        return self.materials
+
+
+class Mat(object):
+    """A material"""
+
+    def __init__(self, name, rgb, alpha=1.0, properties=None):
+        self.name = name
+        self.rgbCol = list(rgb)
+        self.alpha = alpha
+        self.properties = properties or {}
+
+
+class GameProperty(object):
+    def __init__(self, name, data):
+        self.name = name
+        self.type = 'STRING'
+        self.data = data
+
+
+class BlenderObject(object):
+    def __init__(self, name, type, data=None, loc=(0.0, 0.0, 0.0), rot_z=0.0,
+                 scale=(1.0, 1.0, 1.0), parent=None, properties=None,
+                 game_properties=None, matrix=None, layers=(1,)):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.parent = parent
+        self.matrixWorld = make_matrix(loc, rot_z, scale, matrix)
+        self.properties = properties or {}
+        self.game_properties = game_properties or {}
+        self.layers = list(layers)
+
+    def getData(self, mesh=False):
+        return self.data
+
+    def getAllProperties(self):
+        return [GameProperty(name, data)
+                for name, data in self.game_properties.items()]
+
+
+def Curve(name, nurbs, materials=(), **kw):
+    """Return a curve object"""
+    return BlenderObject(name, 'Curve', CurveData(name, nurbs, materials), **kw)
+
+
+def Empty(name, **kw):
+    """Return an empty"""
+    return BlenderObject(name, 'Empty', **kw)
+
+
+class CameraData(object):
+    def __init__(self, type='persp', lens=35.0, scale=7.0):
+        self.type = type
+        self.lens = lens
+        self.scale = scale
+
+
+def Camera(name, type='persp', lens=35.0, scale=7.0, **kw):
+    """Return a camera object. The camera looks along its -Z axis."""
+    return BlenderObject(name, 'Camera', CameraData(type, lens, scale), **kw)
+
+
+def select(objects, properties=None, camera=None):
+    """Set the selected objects, the scene properties and the active camera"""
+    _selected[:] = objects
+    _scene_properties.clear()
+    _scene_properties.update(properties or {})
+    _camera[:] = [camera]
+
+
+class _SceneObjects(object):
+    def __init__(self):
+        self.camera = (_camera or [None])[0]
+
+
+class _Scene(object):
+    def __init__(self):
+        self.properties = _scene_properties
+        self.objects = _SceneObjects()
+
+
+class _Button(object):
+    def __init__(self, val):
+        self.val = val
+
+
+class _Group(object):
+    def __init__(self, name, objects):
+        self.name = name
+        self.objects = list(objects)
+
+
+def set_groups(groups):
+    """Set the groups of the scene from a dict of object lists by group name"""
+    _groups[:] = [_Group(name, objects) for name, objects in groups.items()]
+
+
+def animate(func):
+    """Call func with the frame number when the current frame is set
+
+    func can move the objects to animate them. None removes it.
+    """
+    _frame_handler[:] = [func]
+
+
+def Get(key):
+    if key in ('scriptsdir', 'uscriptsdir'):
+        return SCRIPTSDIR
+    if key == 'curframe':
+        return _frame[0]
+    return None
+
+
+def Set(key, value):
+    if key == 'curframe':
+        _frame[0] = value
+        if _frame_handler and _frame_handler[0] is not None:
+            _frame_handler[0](value)
+
+
+def install():
+    """Make this module importable as Blender"""
+    module = _sys.modules[__name__]
+    _sys.modules['Blender'] = module
+
+    Object = _module('Object')
+    Object.GetSelected = lambda: list(_selected)
+
+    Scene = _module('Scene')
+    Scene.GetCurrent = _Scene
+
+    Registry = _module('Registry')
+    Registry.GetKey = lambda key, cache=False: _registry.get(key)
+    Registry.SetKey = lambda key, d, cache=False: _registry.__setitem__(key, dict(d))
+
+    Draw = _module('Draw')
+    Draw.Create = _Button
+    Draw.PupBlock = lambda title, block: 0
+    Draw.PupMenu = lambda text: None
+
+    Window = _module('Window')
+    Window.FileSelector = lambda callback, title, filename: callback(filename)
+
+    bsys = types.ModuleType('Blender.sys')
+    bsys.makename = lambda ext='': 'untitled' + ext
+    bsys.splitext = os.path.splitext
+    _sys.modules['Blender.sys'] = bsys
+    globals()['sys'] = bsys
+
+    Group = _module('Group')
+    Group.Get = lambda: list(_groups)
+
+    for name in ('Mesh', 'Mathutils', 'Material'):
+        _module(name)
@@ -0,0 +1,84 @@
+"""Synthetic scenes for the tikz_export.py benchmarks
+
+make_scene returns Blender objects from mock_blender with the requested
+number of curves, points, empties and materials. The scenes only depend
+on the parameters and the seed, so the same scene is generated in every
+benchmark run.
+"""
+import math
+import random
+
+import mock_blender
+
+DEFAULTS = dict(curves=200, points=100, bezier_ratio=0.5, cyclic_ratio=0.3,
+                empties=50, materials=10, seed=1)
+
+
+def poly_points(n, rnd):
+    """Return n points on a wobbly line as (x, y, z, w) rows"""
+    a = rnd.uniform(0.5, 2.0)
+    f = rnd.uniform(0.01, 0.1)
+    z = rnd.uniform(-1.0, 1.0)
+    return [[0.05 * i, a * math.sin(f * i), z, 1.0] for i in xrange(n)]
+
+
+def bezier_points(n, rnd):
+    """Return n BezTriples on a circle with random radius"""
+    r = rnd.uniform(0.5, 3.0)
+    z = rnd.uniform(-1.0, 1.0)
+    # Handle length for a smooth curve through n points on the circle
+    k = 4.0 / 3.0 * math.tan(math.pi / (2 * n)) * r
+    points = []
+    for i in xrange(n):
+        t = 2 * math.pi * i / n
+        c, s = math.cos(t), math.sin(t)
+        x, y = r * c, r * s
+        points.append(mock_blender.BezTriple((x + k * s, y - k * c, z), (x, y, z),
+                                             (x - k * s, y + k * c, z)))
+    return points
+
+
+def make_scene(curves=200, points=100, bezier_ratio=0.5, cyclic_ratio=0.3,
+               empties=50, materials=10, seed=1):
+    """Return a list of curves and empties
+
+    bezier_ratio and cyclic_ratio are the fractions of the curves that are
+    bezier curves and closed curves. The empties are parented to random
+    curves. Each curve gets one of the materials, or none if materials
+    is 0.
+    """
+    rnd = random.Random(seed)
+    mats = [mock_blender.Mat('Material.%03d' % i,
+                             [rnd.random(), rnd.random(), rnd.random()],
+                             rnd.choice([1.0, 0.5]))
+            for i in xrange(materials)]
+    objects = []
+    for i in xrange(curves):
+        cyclic = rnd.random() < cyclic_ratio
+        if rnd.random() < bezier_ratio:
+            nurb = mock_blender.CurNurb(1, bezier_points(max(points, 2), rnd), cyclic)
+        else:
+            nurb = mock_blender.CurNurb(0, poly_points(max(points, 2), rnd), cyclic)
+        if mats:
+            curve_mats = [mats[i % len(mats)]]
+        else:
+            curve_mats = []
+        objects.append(mock_blender.Curve(
+            'Curve.%05d' % i, [nurb], curve_mats,
+            loc=(rnd.uniform(-10, 10), rnd.uniform(-10, 10), rnd.uniform(-5, 5)),
+            rot_z=rnd.choice([0.0, rnd.uniform(0, math.pi)]),
+            scale=rnd.choice([(1.0, 1.0, 1.0), (2.0, 0.5, 1.0)])))
+    for i in xrange(empties):
+        parent = None
+        if objects:
+            parent = rnd.choice(objects[:curves])
+        objects.append(mock_blender.Empty(
+            'Empty.%05d' % i, parent=parent,
+            loc=(rnd.uniform(-10, 10), rnd.uniform(-10, 10), 0.0)))
+    return objects
+
+
+def count_points(objects):
+    """Return the number of points and bezier knots of the curves"""
+    return sum([len(nurb) for obj in objects if obj.type == 'Curve'
+                for nurb in obj.data])
@@ -0,0 +1,204 @@
+"""Tests for the code generation in tikz_core.py"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tikz_core
+import tikz_profile
+import tikz_scene
+
+
+def poly_scene(npoints, name='Line', cyclic=False):
+    """Return a scene with a single poly line with npoints points"""
+    nurb = tikz_scene.Nurb(tikz_scene.TYPE_POLY,
+                           [[0.1 * i, 0.2 * i, 0.0, 1.0] for i in range(npoints)],
+                           cyclic)
+    return tikz_scene.Scene([tikz_scene.Object(name, 'Curve', nurbs=[nurb])])
+
+
+def styled_scene(styles):
+    """Return a scene with an open poly line for each style"""
+    objects = []
+    for i, style in enumerate(styles):
+        nurb = tikz_scene.Nurb(tikz_scene.TYPE_POLY,
+                               [[i, 0.0, 0.0, 1.0], [i + 1, 1.0, 0.0, 1.0]])
+        objects.append(tikz_scene.Object('Line%d' % i, 'Curve', nurbs=[nurb],
+                                         properties=dict(style=style)))
+    return tikz_scene.Scene(objects)
+
+
+class ExportTest(unittest.TestCase):
+    """Restores the options and records the code copied to the clipboard"""
+
+    def setUp(self):
+        self.options = tikz_core.get_options()
+        self.copy_to_clipboard = tikz_core.copy_to_clipboard
+        self.tmpdir = tempfile.mkdtemp()
+        self.copied = []
+        tikz_core.copy_to_clipboard = self.copy
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+        tikz_core.set_options(self.options)
+        tikz_core.copy_to_clipboard = self.copy_to_clipboard
+        shutil.rmtree(self.tmpdir)
+
+    def copy(self, text):
+        self.copied.append(text)
+        return True
+
+
+class ObjectCacheTest(ExportTest):
+
+    def export(self, clipboard):
+        tikz_core.set_options(dict(CACHE_DIR=os.path.join(self.tmpdir, 'cache'),
+                                   CLIPBOARD_OUTPUT=clipboard, USE_PLOTPATH=True,
+                                   PLOT_FILE_POINTS=3, STANDALONE=False,
+                                   PROFILE=False, PARTITION='off'))
+        filepath = os.path.join(self.tmpdir, 'fig.tex')
+        self.assertTrue(tikz_core.write_scene(poly_scene(5), filepath))
+        return filepath
+
+    def test_clipboard_then_file(self):
+        # The clipboard export inlines the coordinates and caches the code
+        self.export(True)
+        self.assertTrue('plot coordinates' in self.copied[0], self.copied[0])
+        filepath = self.export(False)
+        f = open(filepath)
+        try:
+            code = f.read()
+        finally:
+            f.close()
+        self.assertTrue('plot file {fig-Line-0.table}' in code, code)
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'fig-Line-0.table')))
+
+
+class PlotFileTest(ExportTest):
+
+    def export(self, scene):
+        tikz_core.set_options(dict(CACHE_DIR='', CLIPBOARD_OUTPUT=False,
+                                   USE_PLOTPATH=True, PLOT_FILE_POINTS=2,
+                                   DRAW_CURVE=True, FILL_CLOSED_CURVE=True,
+                                   STANDALONE=False, PROFILE=False, PARTITION='off'))
+        filepath = os.path.join(self.tmpdir, 'fig.tex')
+        tikz_core.write_scene(scene, filepath)
+        f = open(filepath)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def test_open_path_named_like_closing_operation(self):
+        # The data file names contain the object name
+        for name in ['Bicycle', 'Circle', 'Rectangle']:
+            code = self.export(poly_scene(5, name))
+            self.assertTrue('\\path[draw]  plot file {fig-%s-0.table};' % name
+                            in code, code)
+
+    def test_closed_path(self):
+        code = self.export(poly_scene(5, 'Bicycle', True))
+        self.assertTrue('\\path[draw,fill]  plot file {fig-Bicycle-0.table} -- cycle;'
+                        in code, code)
+
+
+class PartitionTest(ExportTest):
+
+    def partition(self, clipboard):
+        tikz_core.set_options(dict(CLIPBOARD_OUTPUT=clipboard, PARTITION='layer',
+                                   CACHE_DIR='', PROFILE=False))
+        scene = poly_scene(5)
+        scene.objects[0].layers = [2]
+        return tikz_core.write_scene(scene, os.path.join(self.tmpdir, 'fig.tex'))
+
+    def test_clipboard(self):
+        self.assertFalse(self.partition(True))
+        self.assertEqual(self.copied, [])
+
+    def test_files(self):
+        self.assertTrue(self.partition(False))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'fig-layer02.tex')))
+
+
+class ScopeTest(ExportTest):
+
+    def export(self, styles):
+        tikz_core.set_options(dict(SCOPES=True, STANDALONE=False,
+                                   EXPORT_MATERIALS=False, TRANSFORM_CURVE=True))
+        return "".join(tikz_core.iter_document(styled_scene(styles)))
+
+    def test_shared_style(self):
+        code = self.export(['thick'] * 3)
+        self.assertTrue('\\begin{scope}[thick]' in code, code)
+        self.assertEqual(code.count('\\path[draw]'), 3, code)
+
+    def test_action_styles_stay_on_paths(self):
+        for style in ['fill=blue!20', 'draw=none', 'fill=none', 'shade',
+                      'pattern=north lines', 'clip']:
+            code = self.export([style] * 3)
+            self.assertFalse('scope' in code, code)
+            self.assertEqual(code.count('\\path[draw,%s]' % style), 3, code)
+
+    def test_prefix_ends_at_action(self):
+        code = self.export(['thick,fill=red'] * 3)
+        self.assertFalse('scope' in code, code)
+        self.assertEqual(code.count('\\path[draw,thick,fill=red]'), 3, code)
+
+
+class RelativeCoordsTest(ExportTest):
+
+    def export(self, cyclic, compact):
+        tikz_core.set_options(dict(RELATIVE_COORDS=True, COMPACT_COORDS=compact,
+                                   PRECISION=2, WRAP_LINES=False, CODE_ONLY=True,
+                                   STANDALONE=False, DRAW_CURVE=True,
+                                   FILL_CLOSED_CURVE=False, TRANSFORM_CURVE=True,
+                                   SCOPES=False))
+        poly = tikz_scene.Nurb(tikz_scene.TYPE_POLY,
+                               [[0, 0, 0, 1], [1, 0.5, 0, 1], [1.25, 2, 0, 1]], cyclic)
+        bezier = tikz_scene.Nurb(tikz_scene.TYPE_BEZIER,
+                                 [[-1, 0, 0, 0, 0, 0, 1, 0, 0],
+                                  [2, 1, 0, 3, 1, 0, 4, 1, 0],
+                                  [3, -1, 0, 2, -2, 0, 1, -3, 0]], cyclic)
+        scene = tikz_scene.Scene([tikz_scene.Object('Poly', 'Curve', nurbs=[poly]),
+                                  tikz_scene.Object('Bezier', 'Curve', nurbs=[bezier])])
+        return "".join(tikz_core.iter_document(scene)).splitlines()
+
+    def test_open(self):
+        # Without Compact the coordinates keep the + of the default format
+        self.assertEqual(self.export(False, False), [
+            '% Poly',
+            '\\path[draw] (+0.00,+0.00) -- ++(+1.00,+0.50) -- ++(+0.25,+1.50);',
+            '% Bezier',
+            '\\path[draw] (+0.00,+0.00) .. controls (+1.00,+0.00) and (+2.00,+1.00) '
+            '.. ++(+3.00,+1.00) .. controls (+4.00,+1.00) and (+3.00,+-1.00) '
+            '.. ++(+-1.00,+-3.00);'])
+
+    def test_closed_compact(self):
+        # The control points are absolute, and the knots are relative to
+        # the previous knot
+        self.assertEqual(self.export(True, True), [
+            '% Poly',
+            '\\path[draw] (0,0) -- ++(1,0.5) -- ++(0.25,1.5) -- ++(-1.25,-2) -- cycle;',
+            '% Bezier',
+            '\\path[draw] (0,0) .. controls (1,0) and (2,1) .. ++(3,1) '
+            '.. controls (4,1) and (3,-1) .. ++(-1,-3) '
+            '.. controls (1,-3) and (-1,0) .. ++(-2,2) -- cycle;'])
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_transform_cache_only_when_profiling(self):
+        state = tikz_core.ExportState()
+        self.assertEqual(state.report(), [])
+        state = tikz_core.ExportState(profile=tikz_profile.Profile())
+        self.assertEqual(state.report(), ["Transform cache: 0 hits, 0 misses"])
+
+
+if __name__ == '__main__':
+    unittest.main()
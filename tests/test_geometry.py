@@ -0,0 +1,163 @@
+"""Tests for the geometry functions in tikz_geometry.py"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tikz_geometry
+import tikz_scene
+from tikz_geometry import numpy
+
+RECT = (0.0, 0.0, 10.0, 10.0)
+
+
+def point_lists(points):
+    """Return points as a list of (x, y, z, w) tuples and as an array
+
+    The lists use the pure Python code, the arrays the NumPy code.
+    """
+    rows = [(float(x), float(y), 0.0, 1.0) for x, y in points]
+    if numpy is None:
+        return [rows]
+    return [rows, numpy.array(rows)]
+
+
+def as_tuples(points):
+    """Return (x, y) points as a list of tuples rounded to 9 decimals"""
+    return [(round(float(p[0]), 9), round(float(p[1]), 9)) for p in points]
+
+
+class ClipPolylineTest(unittest.TestCase):
+
+    def clip(self, points):
+        results = [[as_tuples(piece) for piece in tikz_geometry.clip_polyline(p, RECT)]
+                   for p in point_lists(points)]
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        return results[0]
+
+    def test_crossing(self):
+        self.assertEqual(self.clip([(-5, 5), (15, 5)]), [[(0, 5), (10, 5)]])
+        self.assertEqual(self.clip([(-5, -5), (5, 5)]), [[(0, 0), (5, 5)]])
+
+    def test_inside_vertex_kept(self):
+        self.assertEqual(self.clip([(-5, 5), (5, 5), (15, 5)]),
+                         [[(0, 5), (5, 5), (10, 5)]])
+
+    def test_outside(self):
+        self.assertEqual(self.clip([(-5, -5), (-1, 20)]), [])
+        # Crosses the corner region without entering the rectangle
+        self.assertEqual(self.clip([(-5, 8), (8, 21)]), [])
+
+    def test_leave_and_enter(self):
+        self.assertEqual(self.clip([(5, 5), (15, 5), (15, 8), (5, 8)]),
+                         [[(5, 5), (10, 5)], [(10, 8), (5, 8)]])
+
+
+class ClipPolygonTest(unittest.TestCase):
+
+    def clip(self, points):
+        results = [as_tuples(tikz_geometry.clip_polygon(p, RECT))
+                   for p in point_lists(points)]
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
+        return results[0]
+
+    def test_corner(self):
+        clipped = self.clip([(5, 5), (15, 5), (15, 15), (5, 15)])
+        self.assertEqual(len(clipped), 4)
+        self.assertEqual(sorted(clipped), [(5, 5), (5, 10), (10, 5), (10, 10)])
+
+    def test_corner_cut(self):
+        # A triangle over the lower left corner becomes a pentagon
+        clipped = self.clip([(-2, 4), (4, -2), (4, 4)])
+        self.assertEqual(sorted(clipped), [(0, 2), (0, 4), (2, 0), (4, 0), (4, 4)])
+
+    def test_inside(self):
+        square = [(1, 1), (2, 1), (2, 2), (1, 2)]
+        self.assertEqual(sorted(self.clip(square)), sorted(square))
+
+    def test_outside(self):
+        self.assertEqual(self.clip([(11, 11), (15, 11), (15, 15)]), [])
+
+
+# Control points of the nurbs curves, with equal weights
+NURBS_POINTS = [(0.0, 0.0, 0.0), (1.0, 2.0, 0.5), (3.0, 3.0, 1.0), (4.0, 1.0, 0.0),
+                (6.0, 0.5, -1.0), (7.0, 2.5, 0.0)]
+
+
+def de_boor(points, order, knots, span, u):
+    """Return the point at u in the knot span [knots[span], knots[span + 1]]"""
+    p = order - 1
+    d = [list(points[j]) for j in range(span - p, span + 1)]
+    for r in range(1, order):
+        for j in range(p, r - 1, -1):
+            lo = knots[span - p + j]
+            alpha = (u - lo) / (knots[span + 1 + j - r] - lo)
+            d[j] = [(1 - alpha) * c0 + alpha * c1 for c0, c1 in zip(d[j - 1], d[j])]
+    return d[p]
+
+
+def bezier_point(h1, knots, h2, i, t):
+    """Return the point at t on the i'th segment of a bezier curve"""
+    j = (i + 1) % len(knots)
+    return tikz_geometry.bezier_point(knots[i], h2[i], h1[j], knots[j], t)
+
+
+class NurbsTest(unittest.TestCase):
+
+    def convert(self, points, order, cyclic=False, knot_type=0):
+        """Return the bezier curves converted from the lists and arrays"""
+        rows = [(x, y, z, 2.0) for x, y, z in points]
+        inputs = [rows]
+        if numpy is not None:
+            inputs.append(numpy.array(rows))
+        return [[[tuple([float(c) for c in row]) for row in part]
+                 for part in tikz_geometry.nurbs_to_bezier(p, order, cyclic, knot_type)]
+                for p in inputs]
+
+    def check(self, curves, points, order, knots, spans, cyclic=False):
+        """Compare each bezier segment with de Boor evaluation of its span"""
+        for h1, bknots, h2 in curves:
+            self.assertEqual(len(bknots), len(spans) + int(not cyclic))
+            for i, span in enumerate(spans):
+                u0, u1 = knots[span], knots[span + 1]
+                for t in (0.0, 0.2, 0.5, 0.7, 1.0):
+                    expected = de_boor(points, order, knots, span, u0 + t * (u1 - u0))
+                    point = bezier_point(h1, bknots, h2, i, t)
+                    for a, b in zip(point, expected):
+                        self.assertAlmostEqual(a, b, 9)
+
+    def test_endpoint_knots(self):
+        knots = tikz_geometry.nurbs_knots(6, 4, tikz_scene.KNOTS_ENDPOINT)
+        self.assertEqual(knots, [0, 0, 0, 0, 1, 2, 3, 3, 3, 3])
+        curves = self.convert(NURBS_POINTS, 4, False, tikz_scene.KNOTS_ENDPOINT)
+        self.check(curves, NURBS_POINTS, 4, knots, [3, 4, 5])
+        # The curve starts and ends at the end points
+        for h1, bknots, h2 in curves:
+            self.assertEqual(bknots[0], NURBS_POINTS[0])
+            self.assertEqual(bknots[-1], NURBS_POINTS[-1])
+
+    def test_uniform_knots(self):
+        knots = tikz_geometry.nurbs_knots(6, 4, tikz_scene.KNOTS_UNIFORM)
+        self.assertEqual(knots, range(10))
+        curves = self.convert(NURBS_POINTS, 4, False, tikz_scene.KNOTS_UNIFORM)
+        self.check(curves, NURBS_POINTS, 4, knots, [3, 4, 5])
+
+    def test_quadratic(self):
+        knots = tikz_geometry.nurbs_knots(6, 3, tikz_scene.KNOTS_ENDPOINT)
+        self.assertEqual(knots, [0, 0, 0, 1, 2, 3, 4, 4, 4])
+        curves = self.convert(NURBS_POINTS, 3, False, tikz_scene.KNOTS_ENDPOINT)
+        self.check(curves, NURBS_POINTS, 3, knots, [2, 3, 4, 5])
+
+    def test_cyclic(self):
+        # A cyclic curve is a uniform curve with the first order - 1 points
+        # repeated at the end
+        points = NURBS_POINTS[:5]
+        curves = self.convert(points, 4, True)
+        self.check(curves, points + points[:3], 4, range(12), [3, 4, 5, 6, 7], True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Tests for the scene description in tikz_scene.py"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tikz_core
+import tikz_scene
+
+
+def mirrored_curve():
+    """Return a poly line mirrored in X and moved 2 units along X"""
+    matrix = [[-1.0, 0.0, 0.0, 0.0],
+              [0.0, 1.0, 0.0, 0.0],
+              [0.0, 0.0, 1.0, 0.0],
+              [2.0, 0.0, 0.0, 1.0]]
+    nurb = tikz_scene.Nurb(tikz_scene.TYPE_POLY,
+                           [[0.0, 0.0, 0.0, 1.0], [1.0, 1.0, 0.0, 1.0]])
+    return tikz_scene.Object('Mirrored', 'Curve', matrix, nurbs=[nurb])
+
+
+class MatrixScaleTest(unittest.TestCase):
+
+    def test_rotated_and_scaled(self):
+        obj = tikz_scene.Object('Scaled', 'Curve', [[0.0, 2.0, 0.0, 0.0],
+                                                    [-0.5, 0.0, 0.0, 0.0],
+                                                    [0.0, 0.0, 1.0, 0.0],
+                                                    [0.0, 0.0, 0.0, 1.0]])
+        self.assertEqual(tikz_scene.matrix_scale(obj.matrix), (2.0, 0.5, 1.0))
+
+    def test_mirrored(self):
+        # Same decomposition as Blender: rotate by 180 degrees and flip Y
+        obj = mirrored_curve()
+        self.assertEqual(tikz_scene.matrix_scale(obj.matrix), (1.0, -1.0, 1.0))
+        self.assertAlmostEqual(tikz_scene.matrix_euler(obj.matrix)[2],
+                               3.141592653589793)
+
+    def test_mirrored_path_options(self):
+        saved = tikz_core.get_options()
+        try:
+            tikz_core.set_options(dict(TRANSFORM_CURVE=True, DRAW_CURVE=True,
+                                       FILL_CLOSED_CURVE=False))
+            code = tikz_core.write_object(mirrored_curve(), {})
+        finally:
+            tikz_core.set_options(saved)
+        self.assertTrue('\\path[draw,xshift=2.0000cm,rotate=180.0000,yscale=-1.0000]'
+                        in code, code)
+
+
+if __name__ == '__main__':
+    unittest.main()
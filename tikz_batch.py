@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""Export saved scenes to TikZ in parallel
+
+Usage: tikz_batch.py [options] scene.tikzscene [scene2.tikzscene ...]
+
+Exports scenes saved with the 'Save scene' option of tikz_export.py to
+.tex files without Blender. The scenes are exported in parallel using a
+pool of worker processes. A summary with the time used for each file and
+any failures is printed at the end.
+
+Export options are read from an options file with one option per line,
+using the same names as tikz_export.py:
+
+    # Options for the documentation figures
+    STANDALONE = False
+    DRAW_CURVE = True
+    FILL_CLOSED_CURVE = False
+"""
+import os
+import sys
+import time
+from optparse import OptionParser
+
+import tikz_core
+import tikz_scene
+
+try:
+    import multiprocessing
+except ImportError:
+    # Python < 2.6. Export the scenes one at a time.
+    multiprocessing = None
+
+
+def parse_value(value):
+    """Convert an option value from an options file"""
+    if value.lower() in ('true', 'yes', 'on'):
+        return True
+    if value.lower() in ('false', 'no', 'off'):
+        return False
+    for conv in (int, float):
+        try:
+            return conv(value)
+        except ValueError:
+            pass
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+        value = value[1:-1]
+    return value
+
+
+def read_options(filename):
+    """Read export options from a file with NAME = value lines
+
+    Raises ValueError for malformed lines and unknown option names.
+    """
+    options = {}
+    f = open(filename)
+    try:
+        lineno = 0
+        for line in f:
+            lineno += 1
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            name, sep, value = line.partition('=')
+            name = name.strip().upper()
+            if not sep or name not in tikz_core.OPTIONS:
+                raise ValueError("%s:%d: invalid option line: %s"
+                                 % (filename, lineno, line))
+            options[name] = parse_value(value.strip())
+    finally:
+        f.close()
+    return options
+
+
+def output_path(scenepath, outdir=None):
+    """Return the .tex path for scenepath"""
+    texpath = os.path.splitext(scenepath)[0] + '.tex'
+    if outdir:
+        texpath = os.path.join(outdir, os.path.basename(texpath))
+    return texpath
+
+
+def export_scene(job):
+    """Export a single scene
+
+    job is a tuple (scenepath, texpath, options). Returns a tuple
+    (scenepath, texpath, seconds, error), where error is None if the
+    export succeeded.
+    """
+    scenepath, texpath, options = job
+    t0 = time.time()
+    try:
+        tikz_core.set_options(options)
+        scene = tikz_scene.load(scenepath)
+        if not tikz_core.write_scene(scene, texpath):
+            return scenepath, texpath, time.time() - t0, "nothing written"
+    except Exception, e:
+        return scenepath, texpath, time.time() - t0, \
+               "%s: %s" % (e.__class__.__name__, e)
+    return scenepath, texpath, time.time() - t0, None
+
+
+def export_scenes(scenepaths, options, outdir=None, jobs=None):
+    """Export scenes using a pool of jobs processes
+
+    Returns a list with the results from export_scene, in the same order as
+    scenepaths.
+    """
+    options = dict(options)
+    options['CLIPBOARD_OUTPUT'] = False
+    joblist = [(path, output_path(path, outdir), options) for path in scenepaths]
+    if multiprocessing is None or jobs == 1 or len(joblist) < 2:
+        return map(export_scene, joblist)
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(export_scene, joblist, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def print_summary(results, seconds):
+    """Print the time used and any errors for each exported scene"""
+    failed = [r for r in results if r[3]]
+    print
+    print "%8s  %s" % ('time', 'file')
+    for scenepath, texpath, t, error in results:
+        if error:
+            print "%7.2fs  %s FAILED: %s" % (t, scenepath, error)
+        else:
+            print "%7.2fs  %s" % (t, texpath)
+    print "%d files exported, %d failed in %.2fs" \
+          % (len(results) - len(failed), len(failed), seconds)
+
+
+def main(args=None):
+    parser = OptionParser(usage="%prog [options] scene.tikzscene ...")
+    parser.add_option('-o', '--options', dest='options', metavar='FILE',
+                      help="read export options from FILE")
+    parser.add_option('-d', '--outdir', dest='outdir', metavar='DIR',
+                      help="write the .tex files to DIR instead of next to the scenes")
+    parser.add_option('-j', '--jobs', dest='jobs', type='int', metavar='N',
+                      help="number of worker processes (default: number of CPUs)")
+    parser.add_option('-l', '--list', dest='listfile', metavar='FILE',
+                      help="read scene paths from FILE, one per line")
+    opts, scenepaths = parser.parse_args(args)
+    if opts.listfile:
+        f = open(opts.listfile)
+        try:
+            scenepaths += [line.strip() for line in f if line.strip()]
+        finally:
+            f.close()
+    if not scenepaths:
+        parser.error("no scenes to export")
+    options = {}
+    if opts.options:
+        try:
+            options = read_options(opts.options)
+        except ValueError, e:
+            parser.error(str(e))
+    if opts.outdir and not os.path.isdir(opts.outdir):
+        os.makedirs(opts.outdir)
+
+    t0 = time.time()
+    results = export_scenes(scenepaths, options, opts.outdir, opts.jobs)
+    print_summary(results, time.time() - t0)
+    if [r for r in results if r[3]]:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
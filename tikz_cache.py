@@ -0,0 +1,182 @@
+"""On-disk cache of exported object code for tikz_export.py
+
+The code generated for each object is stored in a file named after a hash
+of everything the code depends on: the curve data, transform, material,
+style properties and the export options. Unchanged objects reuse the
+stored code when a scene is exported again.
+
+The cache is bounded in size. When it grows beyond the limit, the least
+recently used files are removed. A MemoryCache keeps the code in memory
+for reuse between the frames of an animation. This module does not depend
+on Blender.
+"""
+
+import os
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CACHE_EXT = '.frag'
+
+
+def canonical(value):
+    """Return a string representation of value that doesn't depend on dict order"""
+    if isinstance(value, dict):
+        items = [(canonical(k), canonical(v)) for k, v in value.items()]
+        items.sort()
+        return '{%s}' % ','.join(['%s:%s' % item for item in items])
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ','.join([canonical(v) for v in value])
+    return repr(value)
+
+
+def points_digest(points):
+    """Return a digest of a point array
+
+    NumPy arrays are hashed from their raw data, which is much faster than
+    going through the values one by one.
+    """
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        points = numpy.ascontiguousarray(points, float)
+        return '%s:%s' % (points.shape, md5(points.tostring()).hexdigest())
+    return md5(canonical(points)).hexdigest()
+
+
+def make_key(*values):
+    """Return the cache key for values"""
+    return md5(canonical(values)).hexdigest()
+
+
+class FragmentCache(object):
+    """A directory with the code for previously exported objects
+
+    max_size is the largest total size of the cache files in bytes. hits and
+    misses count the lookups. Errors reading or writing the cache are
+    ignored, the code is then generated as if the cache was empty.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXT)
+
+    def get(self, key):
+        """Return the code stored for key, or None"""
+        path = self.path(key)
+        try:
+            f = open(path, 'rb')
+            try:
+                code = f.read()
+            finally:
+                f.close()
+            # Mark the file as recently used
+            os.utime(path, None)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return code
+
+    def put(self, key, code):
+        """Store the code for key"""
+        path = self.path(key)
+        # Write to a temporary file first, so a concurrent export never
+        # reads a partially written file.
+        tmppath = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            f = open(tmppath, 'wb')
+            try:
+                f.write(code)
+            finally:
+                f.close()
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmppath, path)
+        except (IOError, OSError):
+            try:
+                os.remove(tmppath)
+            except OSError:
+                pass
+
+    def prune(self):
+        """Remove the least recently used files until the cache fits max_size
+
+        Returns the number of removed files.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(CACHE_EXT):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+class MemoryCache(object):
+    """Object code kept in memory, optionally in front of a FragmentCache
+
+    Used when exporting several frames of an animation: objects that don't
+    change between frames have the same key and reuse the code generated
+    for an earlier frame. Code found in parent is kept in memory too, and
+    stored code is also stored in parent.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the code stored for key, or None"""
+        code = self.fragments.get(key)
+        if code is None and self.parent is not None:
+            code = self.parent.get(key)
+            if code is not None:
+                self.fragments[key] = code
+        if code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return code
+
+    def put(self, key, code):
+        """Store the code for key"""
+        self.fragments[key] = code
+        if self.parent is not None:
+            self.parent.put(key, code)
+
+    def prune(self):
+        """Prune the parent cache. Returns the number of removed files."""
+        if self.parent is None:
+            return 0
+        return self.parent.prune()
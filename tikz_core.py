@@ -0,0 +1,2529 @@
+"""TikZ code generation for tikz_export.py
+
+Converts the scene description in tikz_scene to TikZ code and writes it
+to files or the clipboard. The export options are module level variables,
+set with set_options. This module does not depend on Blender, so it can
+be imported and used repeatedly by other tools, like tikz_batch.py, at a
+low cost.
+"""
+
+import os
+from itertools import izip
+import math, re, time
+import Queue, threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import tikz_scene
+import tikz_geometry
+import tikz_cache
+import tikz_profile
+from tikz_scene import TYPE_POLY, TYPE_BEZIER, TYPE_NURBS
+
+# Same as the version of tikz_export.py
+__version__ = "1.0"
+
+R2D = 180.0 / math.pi
+
+# Templates
+standalone_template = r"""
+\documentclass{article}
+\usepackage{tikz}
+%(preamble)s
+%(materials)s
+\begin{document}
+\begin{tikzpicture}
+%(pathcode)s
+\end{tikzpicture}
+\end{document}
+"""
+
+# Standalone template for animations exported as a single overlay document
+overlay_template = r"""
+\documentclass{beamer}
+\usepackage{tikz}
+%(preamble)s
+%(materials)s
+\begin{document}
+\begin{frame}
+\begin{tikzpicture}
+%(pathcode)s
+\end{tikzpicture}
+\end{frame}
+\end{document}
+"""
+
+fig_template = r"""
+%(materials)s
+\begin{tikzpicture}
+%(pathcode)s
+\end{tikzpicture}
+"""
+
+# Export options
+STANDALONE = True
+CODE_ONLY = False
+DRAW_CURVE = True
+FILL_CLOSED_CURVE = True
+TRANSFORM_CURVE = True
+CLIPBOARD_OUTPUT = False
+EMPTIES = True
+EXPORT_MATERIALS = False
+ONLY_PROPERTIES = False
+USE_PLOTPATH = False
+WRAP_LINES = True
+SAVE_SCENE = False
+DEPTH_POLICY = 'origin'
+SIMPLIFY_TOLERANCE = 0.0
+PRECISION = 4
+COMPACT_COORDS = False
+RELATIVE_COORDS = False
+CACHE_DIR = ''
+CACHE_SIZE = 32
+INSTANCES = False
+PROFILE = False
+MESH_MODE = 'off'
+MESH_CULL = True
+PROJECTION = 'none'
+CLIP = 'none'
+PLOT_FILE_POINTS = 0
+CHUNK_SIZE = 0
+CHUNK_PATHS = 0
+SCOPES = False
+FRAMES = ''
+FRAME_MODE = 'files'
+PRIMITIVES = False
+PARTITION = 'off'
+
+
+# Names of the export options
+OPTIONS = ['STANDALONE', 'CODE_ONLY', 'DRAW_CURVE', 'FILL_CLOSED_CURVE',
+           'TRANSFORM_CURVE', 'CLIPBOARD_OUTPUT', 'EMPTIES', 'EXPORT_MATERIALS',
+           'ONLY_PROPERTIES', 'USE_PLOTPATH', 'WRAP_LINES', 'SAVE_SCENE',
+           'DEPTH_POLICY', 'SIMPLIFY_TOLERANCE', 'PRECISION', 'COMPACT_COORDS',
+           'RELATIVE_COORDS', 'CACHE_DIR', 'CACHE_SIZE', 'INSTANCES', 'PROFILE',
+           'MESH_MODE', 'MESH_CULL', 'PROJECTION', 'CLIP', 'PLOT_FILE_POINTS',
+           'CHUNK_SIZE', 'CHUNK_PATHS', 'SCOPES', 'FRAMES', 'FRAME_MODE',
+           'PRIMITIVES', 'PARTITION']
+
+
+def get_options():
+    """Return the current export options as a dict"""
+    return dict([(name, globals()[name]) for name in OPTIONS])
+
+
+def set_options(d):
+    """Set the export options found in d
+
+    Raises KeyError if d contains an unknown option name.
+    """
+    for name in d:
+        if name not in OPTIONS:
+            raise KeyError(name)
+    for name, value in d.items():
+        globals()[name] = value
+
+
+# Draw order policies. See depth_key.
+DEPTH_POLICIES = ('origin', 'min', 'mean', 'max', 'layer')
+# Mesh export modes. See write_mesh.
+MESH_MODES = ('off', 'edges', 'faces')
+# Projections. See make_projection.
+PROJECTIONS = ('none', 'camera', 'ortho', 'persp')
+# Clip rectangles. See clip_rect.
+CLIPS = ('none', 'scene', 'camera')
+# Largest difference from a primitive shape, as a fraction of its size
+PRIMITIVE_TOLERANCE = 0.001
+# Bezier curves with more knots aren't compared with primitive shapes
+MAX_PRIMITIVE_KNOTS = 16
+# Curve types that are exported. Nurbs curves are converted to bezier curves.
+NURB_TYPES = (TYPE_BEZIER, TYPE_POLY, TYPE_NURBS)
+# Output of animations. See write_frames.
+FRAME_MODES = ('files', 'overlay')
+# Partition policies. See partition_scene.
+PARTITIONS = ('off', 'group', 'layer')
+X = 0
+Y = 1
+
+# Maximum number of bytes collected before each write to the output file
+OUTPUT_BUFFER_SIZE = 64 * 1024
+
+# Options that change the code generated for an object. Part of the
+# object cache key.
+OBJECT_OPTIONS = ['DRAW_CURVE', 'FILL_CLOSED_CURVE', 'TRANSFORM_CURVE', 'EMPTIES',
+                  'EXPORT_MATERIALS', 'USE_PLOTPATH', 'WRAP_LINES',
+                  'SIMPLIFY_TOLERANCE', 'INSTANCES', 'MESH_MODE', 'MESH_CULL',
+                  'PROJECTION', 'PLOT_FILE_POINTS', 'PRIMITIVES']
+
+# Geometry is clipped this far outside the clip rectangle, so the ends of
+# clipped lines and the outlines of clipped polygons are hidden by \clip
+CLIP_MARGIN = 0.1
+# Half the film width of Blender cameras in mm
+CAMERA_FILM = 16.0
+
+# Number of threads writing chunk files
+WRITER_THREADS = 4
+
+# Extension of the data files for plot paths
+PLOT_FILE_EXT = '.table'
+
+# Extension of the materials file shared by partitions
+MATERIALS_EXT = '.materials.tex'
+
+# Styles with these keys change the transformation. They aren't moved to
+# scopes, since that would change the order of the transformations.
+_transform_keys = re.compile(r'shift|scale|rotate|slant|\bcm\b|transform')
+
+# Styles with these keys, or with the value none, are path actions. A scope
+# only sets their color and doesn't apply the action, so they aren't moved
+# to scopes either.
+_action_keys = re.compile(r'(?:^|,)\s*(?:fill|draw|pattern|shade|shading|clip|'
+                          r'preaction|postaction|path picture|'
+                          r'(?:top|bottom|left|right|middle|inner|outer|ball) color)'
+                          r'\s*(?:=|,|$)|=\s*none\s*(?:,|$)')
+
+# Prefix of the macros defined for shared curves
+SHAPE_PREFIX = 'tikzshape'
+
+# Utility functions
+
+def nsplit(seq, n=2):
+    """Split a sequence into pieces of length n
+
+    If the lengt of the sequence isn't a multiple of n, the rest is discareded.
+    Note that nsplit will strings into individual characters.
+
+    Examples:
+    >>> nsplit('aabbcc')
+    [('a', 'a'), ('b', 'b'), ('c', 'c')]
+    >>> nsplit('aabbcc',n=3)
+    [('a', 'a', 'b'), ('b', 'c', 'c')]
+
+    # Note that cc is discarded
+    >>> nsplit('aabbcc',n=4)
+    [('a', 'a', 'b', 'b')]
+    """
+    return [xy for xy in izip(*[iter(seq)] * n)]
+
+
+def mreplace(s, chararray, newchararray):
+    for a, b in zip(chararray, newchararray):
+        s = s.replace(a, b)
+    return s
+
+
+def tikzify(s):
+    if s.strip():
+        return mreplace(s, r'\,:.', '-+_*')
+    else:
+        return ""
+
+
+# Coordinate formatting
+#
+# Coordinates are formatted in bulk. The format string for a whole nurb is
+# built first and then applied to a flat tuple with all the x and y values.
+# This is considerably faster than formatting each point separately. When
+# NumPy is available and the points are stored in arrays, the values are
+# gathered with array operations as well.
+
+COORD = "(+%.4f,+%.4f)"
+
+# Largest number of decimals used with automatic precision
+MAX_PRECISION = 8
+
+
+def coord_format(precision=4, compact=False):
+    """Return the format string for a coordinate"""
+    if compact:
+        return "(%%.%df,%%.%df)" % (precision, precision)
+    return "(+%%.%df,+%%.%df)" % (precision, precision)
+
+
+_trailing_zeros = re.compile(r'\.0+(?=[,):]| and )|(\.\d*?[1-9])0+(?=[,):]| and )')
+_negative_zero = re.compile(r'(?<=[(,])-0(?=[,)])')
+
+
+def strip_zeros(s):
+    """Remove trailing zeros from the coordinates in s"""
+    s = _trailing_zeros.sub(lambda m: m.group(1) or '', s)
+    return _negative_zero.sub('0', s)
+
+
+def auto_precision(extent):
+    """Return the number of decimals for a figure of the given extent
+
+    The resolution is about 1/10000 of the extent.
+    """
+    if extent <= 0:
+        return 4
+    precision = int(math.ceil(4 - math.log10(extent)))
+    return max(0, min(MAX_PRECISION, precision))
+
+
+def relative_values(values, precision):
+    """Convert a flat list of x and y values to relative values
+
+    The first point is kept. The other points are replaced by the distance
+    from the previous point. The values are rounded first, so the rounding
+    errors don't add up.
+    """
+    r = [round(v, precision) for v in values]
+    return r[:2] + [a - b for a, b in izip(r[2:], r)]
+
+
+def relative_bezier_values(values, precision):
+    """Make the knots in a list from bezier_values relative
+
+    Each knot is replaced by the distance from the previous knot. The
+    control points are not changed.
+    """
+    values = list(values)
+    x0 = round(values[0], precision)
+    y0 = round(values[1], precision)
+    for i in xrange(6, len(values), 6):
+        x = round(values[i], precision)
+        y = round(values[i + 1], precision)
+        values[i] = x - x0
+        values[i + 1] = y - y0
+        x0, y0 = x, y
+    return values
+
+
+def xy_array(points):
+    """Return the x and y coordinates of a sequence of points
+
+    Returns an n x 2 array if the points are stored in a NumPy array, and a
+    list of (x, y) tuples otherwise.
+    """
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        return points[:, :2]
+    return [(p[X], p[Y]) for p in points]
+
+
+def xy_values(points):
+    """Return the x and y coordinates of a sequence of points as a flat list"""
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        return points[:, :2].ravel().tolist()
+    return [c for p in points for c in (p[X], p[Y])]
+
+
+def bezier_arrays(curnurb):
+    """Return the first handles, knots and second handles of a bezier nurb"""
+    points = curnurb.points
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        return points[:, 0:2], points[:, 3:5], points[:, 6:8]
+    return ([(p[0], p[1]) for p in points], [(p[3], p[4]) for p in points],
+            [(p[6], p[7]) for p in points])
+
+
+def bezier_values(h1, knots, h2, cyclic):
+    """Return the coordinate values of a bezier path as a flat list
+
+    The list starts with the first knot followed by the two control points
+    and the end knot of each segment. Closed curves get an extra segment
+    back to the first knot.
+    """
+    n = len(knots)
+    if cyclic:
+        nseg = n
+    else:
+        nseg = n - 1
+    if numpy is not None and isinstance(knots, numpy.ndarray):
+        idx = numpy.arange(1, nseg + 1) % n
+        segments = numpy.hstack([h2[:nseg], h1[idx], knots[idx]])
+        return knots[0].tolist() + segments.ravel().tolist()
+    values = list(knots[0])
+    for i in xrange(nseg):
+        j = (i + 1) % n
+        values.extend(h2[i])
+        values.extend(h1[j])
+        values.extend(knots[j])
+    return values
+
+
+def format_bezier(values, cyclic, coord=COORD, knot_coord=None):
+    """Format the values returned by bezier_values as a curve-to path
+
+    knot_coord is the format of the knots after the first one, if
+    different from coord.
+    """
+    if knot_coord is None:
+        knot_coord = coord
+    nseg = (len(values) - 2) // 6
+    fmt = "%s\n%s" % (coord, ("  .. controls %s and %s .. %s\n" \
+                                % (coord, coord, knot_coord)) * nseg)
+    if cyclic:
+        fmt += "  -- cycle\n"
+    return fmt % tuple(values)
+
+
+def format_coords(values, sep=" ", coord=COORD, next_coord=None):
+    """Format a flat list of x and y values as coordinates joined by sep
+
+    next_coord is the format of the coordinates after the first one, if
+    different from coord.
+    """
+    n = len(values) // 2
+    if next_coord is None or not n:
+        return sep.join([coord] * n) % tuple(values)
+    return sep.join([coord] + [next_coord] * (n - 1)) % tuple(values)
+
+
+def format_wrapped_coords(values, cyclic, coord=COORD, next_coord=None):
+    """Format a polyline as line-to operations with three coordinates per line
+
+    For closed polylines the values must end with the first point again.
+    next_coord is the format of the coordinates after the first one, if
+    different from coord.
+    """
+    if next_coord is None:
+        next_coord = coord
+    # Every third coordinate ends a line. The format for complete lines is
+    # repeated, and only the last few tokens are handled one by one.
+    m = len(values) // 2 - 1
+    if cyclic:
+        m -= 1
+    fmt = ["%s\n  " % coord,
+           ("-- %s-- %s  -- %s\n  " % (next_coord, next_coord, next_coord)) * (m // 3)]
+    tokens = [next_coord] * (m % 3)
+    if cyclic:
+        tokens.extend([next_coord, 'cycle\n  '])
+    i = m - m % 3
+    for t in tokens:
+        i += 1
+        if i % 3:
+            fmt.append("-- %s" % t)
+        else:
+            fmt.append("  -- %s\n  " % t)
+    return "".join(fmt) % tuple(values)
+
+
+class LineWrapper(object):
+    """Wrap text at whitespace in a single pass
+
+    Gives the same lines as textwrap.wrap(text, width,
+    subsequent_indent=indent, break_long_words=False), except that words
+    are never split at hyphens. The text can be added in pieces with write,
+    and each piece is only processed once. Call close to get the result.
+    """
+
+    chunk_re = re.compile(r'\s+|\S+')
+
+    def __init__(self, width=80, indent="  "):
+        self.width = width
+        self.indent = indent
+        self.lines = []
+        self.line = []
+        self.linelen = 0
+        self.linewidth = width
+        self.linestart = True
+        # The last chunk of the text may continue in the next piece
+        self.partial = ''
+
+    def write(self, text):
+        """Add text"""
+        chunks = self.chunk_re.findall(self.partial + text)
+        if chunks:
+            self.partial = chunks.pop()
+        for chunk in chunks:
+            self.add_chunk(chunk)
+
+    def add_chunk(self, chunk):
+        space = chunk.isspace()
+        if space:
+            chunk = ' ' * len(chunk)
+        while True:
+            if self.linestart:
+                self.linestart = False
+                if self.lines:
+                    self.linewidth = self.width - len(self.indent)
+                    # Drop whitespace at the start of a line
+                    if space:
+                        return
+            n = len(chunk)
+            if self.linelen + n <= self.linewidth:
+                self.line.append(chunk)
+                self.linelen += n
+                return
+            if not self.line and n > self.linewidth:
+                # Too long for any line. Put it on a line of its own.
+                self.line.append(chunk)
+                self.end_line()
+                return
+            self.end_line()
+
+    def end_line(self):
+        if self.line and self.line[-1].isspace():
+            del self.line[-1]
+        if self.line:
+            if self.lines:
+                indent = self.indent
+            else:
+                indent = ''
+            self.lines.append(indent + "".join(self.line))
+        self.line = []
+        self.linelen = 0
+        self.linestart = True
+
+    def close(self):
+        """Return the wrapped text"""
+        if self.partial:
+            self.add_chunk(self.partial)
+            self.partial = ''
+        self.end_line()
+        return "\n".join(self.lines)
+
+
+def copy_to_clipboard(text):
+    """Copy text to the clipboard
+
+    Returns True if successful. False otherwise.
+
+    Works on Windows, *nix and Mac. Tries the following:
+    1. Use the win32clipboard module from the win32 package.
+    2. Calls the xclip command line tool (*nix)
+    3. Calls the pbcopy command line tool (Mac)
+    4. Try pygtk
+    """
+    # try windows first
+    try:
+        import win32clipboard
+
+        win32clipboard.OpenClipboard()
+        win32clipboard.EmptyClipboard()
+        win32clipboard.SetClipboardText(text)
+        win32clipboard.CloseClipboard()
+        return True
+    except:
+        pass
+    # try xclip
+    try:
+        import subprocess
+
+        p = subprocess.Popen(['xclip', '-selection', 'c'], stdin=subprocess.PIPE)
+        p.stdin.write(text)
+        p.stdin.close()
+        retcode = p.wait()
+        return True
+    except:
+        pass
+    # try pbcopy (Os X)
+    try:
+        import subprocess
+
+        p = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE)
+        p.stdin.write(text)
+        p.stdin.close()
+        retcode = p.wait()
+        return True
+    except:
+        pass
+    # try os /linux
+    try:
+        import subprocess
+
+        p = subprocess.Popen(['xsel'], stdin=subprocess.PIPE)
+        p.stdin.write(text)
+        p.stdin.close()
+        retcode = p.wait()
+        return True
+    except:
+        pass
+    # try pygtk
+    try:
+        # Code from
+        # http://www.vector-seven.com/2007/06/27/
+        #    passing-data-between-gtk-applications-with-gtkclipboard/
+        import pygtk
+
+        pygtk.require('2.0')
+        import gtk
+        # get the clipboard
+        clipboard = gtk.clipboard_get()
+        # set the clipboard text data
+        clipboard.set_text(text)
+        # make our data available to other applications
+        clipboard.store()
+    except:
+        return False
+
+
+def get_property(obj, name):
+    """Get named object property
+    
+    Looks first in custom properties, then game properties. Returns a list.
+    """
+    prop_value = []
+    if name in obj.properties:
+        prop_value.append(obj.properties[name])
+    # look for game properties
+    if name in obj.game_properties:
+        prop_value.append(obj.game_properties[name])
+    return prop_value
+
+
+def material_options(material):
+    """Return the only properties flag and the style property of a material"""
+    matopts = ''
+    proponly = ONLY_PROPERTIES
+    try:
+        proponly = material.properties['onlyproperties']
+        if proponly and type(proponly) == str:
+            proponly = proponly.lower() not in ('0', 'false')
+    except:
+        pass
+    try:
+        matopts = material.properties['style']
+    except:
+        pass
+    return proponly, matopts
+
+
+def material_key(material):
+    """Return a key that is equal for materials with the same TikZ style"""
+    proponly, matopts = material_options(material)
+    if proponly and matopts:
+        return (None, None, matopts)
+    alpha = material.alpha
+    if alpha >= 1.0:
+        alpha = None
+    return (tuple(material.rgb), alpha, matopts)
+
+
+class StyleTable(object):
+    """The materials used in a single export
+
+    Materials with the same color, opacity and style are interned as a
+    single TikZ style, named after the first of them that is used. The
+    other materials are aliases of it. materials maps the style names of
+    all used materials to the materials, and names maps material names to
+    the name of their interned style.
+    """
+
+    def __init__(self):
+        self.materials = {}
+        self.names = {}
+        self.interned = {}
+
+    def name(self, material):
+        """Return the style name of material and register it"""
+        try:
+            return self.names[material.name]
+        except KeyError:
+            pass
+        mat_name = tikzify(material.name)
+        style = self.interned.setdefault(material_key(material), mat_name)
+        self.names[material.name] = style
+        self.materials[mat_name] = material
+        return style
+
+
+def get_material(material, styles):
+    """Convert material to TikZ options
+
+    styles is the StyleTable of the export.
+    """
+    if not material:
+        return ""
+    return styles.name(material)
+
+
+def write_materials(styles):
+    """Return code for the materials in a StyleTable
+
+    Each interned style is defined once, and each color once for all
+    styles using it. Aliases refer to their interned style.
+    """
+    c = "% Materials section \n"
+    colors = {}
+    for mat_name, material in styles.materials.items():
+        style = styles.names[material.name]
+        if style != mat_name:
+            c += "\\tikzstyle{%s}= [%s]\n" % (mat_name, style)
+            continue
+        proponly, matopts = material_options(material)
+
+        rgb = material.rgb
+        alpha = material.alpha
+        options = []
+
+        if not (proponly and matopts):
+            color = colors.get(tuple(rgb))
+            if color is None:
+                color = colors[tuple(rgb)] = '%s_col' % mat_name
+                c += "\\definecolor{%s}{rgb}{%s,%s,%s}\n" \
+                     % tuple([color] + list(rgb))
+            options.append(color)
+            if alpha < 1.0:
+                options.append('opacity=%s' % alpha)
+        if matopts:
+            options += [matopts]
+        c += "\\tikzstyle{%s}= [%s]\n" % (mat_name, ",".join(options))
+    return c
+
+
+class Transform(object):
+    """Transform values derived from an object's world matrix"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.location = tuple(matrix[3][:3])
+        # Convert to degrees
+        self.rot_z = tikz_scene.matrix_euler(matrix)[2] * R2D
+        self.scale = tikz_scene.matrix_scale(matrix)
+        self.inverse = None
+
+
+class TransformCache(object):
+    """Per export cache of object transforms
+
+    The transform values and the inverse matrix are computed at most once
+    for each object. hits and misses count the lookups.
+    """
+
+    def __init__(self):
+        self.transforms = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, obj):
+        """Return the Transform of obj"""
+        try:
+            t = self.transforms[obj.name]
+            self.hits += 1
+        except KeyError:
+            t = self.transforms[obj.name] = Transform(obj.matrix)
+            self.misses += 1
+        return t
+
+    def inverse(self, obj):
+        """Return the inverse of the world matrix of obj"""
+        t = self.get(obj)
+        if t.inverse is None:
+            t.inverse = tikz_scene.matrix_invert(t.matrix)
+        return t.inverse
+
+
+class ExportState(object):
+    """State for a single export
+
+    transforms is the TransformCache. points_in and points_out count the
+    points before and after simplification. The coordinate format is set
+    with set_format. cache is the tikz_cache.FragmentCache or MemoryCache,
+    or None.
+    shapes maps the names of objects sharing a curve to the macro name,
+    path code and closed flag of the curve, see curve_path. profile is the tikz_profile.Profile, or None.
+    projection is the tikz_geometry.Projection, or None if Z is dropped.
+    clip is the clip rectangle, or None. visible maps the names of the
+    objects inside it to dicts with the bounding boxes of their visible
+    nurbs, or of the mesh with the key None. Plot path data is written to
+    files starting with data_path, or inlined if it is None. data_files
+    maps the names of the written files to the objects they belong to.
+    scopes maps object names to (options, hoisted, end) tuples, see
+    find_scopes. styles is the StyleTable with the used materials.
+    materials is the code for the materials section, or None to generate
+    it from styles.
+    """
+
+    def __init__(self, cache=None, profile=None):
+        self.transforms = TransformCache()
+        self.points_in = 0
+        self.points_out = 0
+        self.cache = cache
+        self.shapes = {}
+        self.profile = profile
+        self.projection = None
+        self.clip = None
+        self.visible = {}
+        self.culled = 0
+        self.clipped = 0
+        self.data_path = None
+        self.data_files = {}
+        self.data_points = 0
+        self.scopes = {}
+        self.styles = StyleTable()
+        self.materials = None
+        self.scope_count = 0
+        self.keys_saved = 0
+        self.set_format()
+
+    def set_format(self, precision=4, compact=False, relative=False):
+        """Set the coordinate format"""
+        self.precision = precision
+        self.compact = compact
+        self.relative = relative
+        self.coord = coord_format(precision, compact)
+        if relative:
+            self.next_coord = '++' + self.coord
+        else:
+            self.next_coord = self.coord
+
+    def report(self):
+        """Return a list of lines with statistics for the export
+
+        The transform cache is only reported when profiling.
+        """
+        lines = []
+        if self.profile is not None:
+            lines.append("Transform cache: %d hits, %d misses"
+                         % (self.transforms.hits, self.transforms.misses))
+        if self.points_in:
+            lines.append("Simplified curves: %d points in, %d points out"
+                         % (self.points_in, self.points_out))
+        if self.clip is not None:
+            lines.append("Clipping: %d nurbs outside, %d clipped"
+                         % (self.culled, self.clipped))
+        if self.scope_count:
+            lines.append("Scopes: %d scopes, about %d option keys saved"
+                         % (self.scope_count, self.keys_saved))
+        if self.data_files:
+            lines.append("Plot files: %d files, %d points"
+                         % (len(self.data_files), self.data_points))
+        if self.cache is not None:
+            lines.append("Object cache: %d hits, %d misses"
+                         % (self.cache.hits, self.cache.misses))
+        return lines
+
+
+def nurb_xy(curnurb):
+    """Return the x and y coordinates of all points of a nurb
+
+    Includes the handles of bezier curves.
+    """
+    if curnurb.type == TYPE_BEZIER:
+        h1, knots, h2 = bezier_arrays(curnurb)
+        if numpy is not None and isinstance(knots, numpy.ndarray):
+            return numpy.vstack([h1, knots, h2])
+        return h1 + knots + h2
+    return xy_array(curnurb.points)
+
+
+def figure_extent(objects):
+    """Return the largest width or height of the curves in local coordinates"""
+    extent = 0.0
+    for obj in objects:
+        if obj.type != 'Curve':
+            continue
+        for curnurb in obj.nurbs:
+            if curnurb.type not in NURB_TYPES or not len(curnurb):
+                continue
+            xy = nurb_xy(curnurb)
+            if numpy is not None and isinstance(xy, numpy.ndarray):
+                extent = max(extent, (xy.max(0) - xy.min(0)).max())
+            else:
+                xs = [p[0] for p in xy]
+                ys = [p[1] for p in xy]
+                extent = max(extent, max(xs) - min(xs), max(ys) - min(ys))
+    return float(extent)
+
+
+def simplify_tolerance(obj, transforms, projected=False):
+    """Return the simplification tolerance for obj in its local coordinates
+
+    The tolerance is given in output units by the SIMPLIFY_TOLERANCE option
+    or the object's 'simplify' property. Projected curves are already in
+    output units.
+    """
+    tolerance = SIMPLIFY_TOLERANCE
+    for value in get_property(obj, 'simplify'):
+        try:
+            tolerance = float(value)
+            break
+        except ValueError:
+            pass
+    if tolerance > 0 and TRANSFORM_CURVE and not projected:
+        # The scale is applied by TikZ
+        scale = max([abs(v) for v in transforms.get(obj).scale[:2]])
+        if scale:
+            tolerance /= scale
+    return tolerance
+
+
+def simplify_nurb(curnurb, tolerance, state):
+    """Return a simplified copy of a bezier or poly nurb"""
+    n = len(curnurb)
+    if curnurb.type == TYPE_BEZIER:
+        h1, knots, h2 = tikz_geometry.simplify_bezier(
+            *(bezier_arrays(curnurb) + (tolerance, curnurb.cyclic)))
+        points = [(a[0], a[1], 0.0, k[0], k[1], 0.0, b[0], b[1], 0.0)
+                  for a, k, b in zip(h1, knots, h2)]
+    else:
+        keep = tikz_geometry.simplify_polyline(xy_array(curnurb.points), tolerance,
+                                               curnurb.cyclic)
+        if numpy is not None and isinstance(curnurb.points, numpy.ndarray):
+            points = curnurb.points[keep]
+        else:
+            points = [curnurb.points[i] for i in keep]
+    state.points_in += n
+    state.points_out += len(points)
+    return tikz_scene.Nurb(curnurb.type, points, curnurb.cyclic, curnurb.order,
+                           curnurb.knot_type)
+
+
+def project_nurb(curnurb, matrix, projection):
+    """Return a copy of a nurb with the points projected to drawing coordinates
+
+    Bezier handles are projected like the knots. A handle and its knot stay
+    on a line, so smooth joints stay smooth.
+    """
+    points = curnurb.points
+    if curnurb.type == TYPE_BEZIER:
+        columns = (0, 3, 6)
+    else:
+        columns = (0,)
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        projected = points.copy()
+        if len(points):
+            for c in columns:
+                projected[:, c:c + 3] = projection.project(points[:, c:c + 3], matrix)
+    else:
+        projected = [list(p) for p in points]
+        for c in columns:
+            for row, p in zip(projected,
+                              projection.project([p[c:c + 3] for p in points], matrix)):
+                row[c:c + 3] = p
+    return tikz_scene.Nurb(curnurb.type, projected, curnurb.cyclic, curnurb.order,
+                           curnurb.knot_type)
+
+
+def drawing_matrix(obj, state):
+    """Return the matrix from the path coordinates of a curve to the drawing
+
+    The transformation options of the path are applied in this order by
+    TikZ: scale, rotate and shift. Returns None if the path coordinates are
+    drawing coordinates.
+    """
+    if state.projection is not None or not TRANSFORM_CURVE:
+        return None
+    t = state.transforms.get(obj)
+    a = t.rot_z / R2D
+    c, s = math.cos(a), math.sin(a)
+    sx, sy = t.scale[:2]
+    x, y = t.location[:2]
+    return [[sx * c, sx * s, 0.0, 0.0],
+            [-sy * s, sy * c, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [x, y, 0.0, 1.0]]
+
+
+def nurb_corners(curnurb):
+    """Return the corners of the 3D bounding box of a nurb, or None"""
+    points = curnurb.points
+    if not len(points):
+        return None
+    if curnurb.type == TYPE_BEZIER:
+        columns = (0, 3, 6)
+    else:
+        columns = (0,)
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        xyz = numpy.vstack([points[:, c:c + 3] for c in columns])
+        lo = xyz.min(0).tolist()
+        hi = xyz.max(0).tolist()
+    else:
+        xyz = [p[c:c + 3] for c in columns for p in points]
+        lo = [min([p[i] for p in xyz]) for i in range(3)]
+        hi = [max([p[i] for p in xyz]) for i in range(3)]
+    return [(x, y, z) for x in (lo[0], hi[0]) for y in (lo[1], hi[1])
+            for z in (lo[2], hi[2])]
+
+
+def object_boxes(obj, state):
+    """Return the bounding boxes of the exported parts of obj in the drawing
+
+    Returns a list of (key, box) tuples. The keys are the nurb numbers of
+    curves and None for meshes. The boxes are found by transforming the
+    corners of the 3D bounding boxes, so they can be larger than needed.
+    """
+    projection = state.projection
+    parts = []
+    if obj.type == 'Mesh':
+        if has_mesh(obj) and len(obj.mesh.verts):
+            parts.append((None, nurb_corners(tikz_scene.Nurb(TYPE_POLY, obj.mesh.verts))))
+        matrix = obj.matrix
+    elif obj.type == 'Curve':
+        for i, curnurb in enumerate(obj.nurbs):
+            # A nurbs curve is inside the box of its control points
+            if curnurb.type in NURB_TYPES:
+                corners = nurb_corners(curnurb)
+                if corners:
+                    parts.append((i, corners))
+        matrix = drawing_matrix(obj, state)
+    boxes = []
+    for key, corners in parts:
+        if projection is not None:
+            corners = projection.project(corners, obj.matrix)
+        elif matrix is not None:
+            corners = tikz_geometry.transform_points(corners, matrix)
+        boxes.append((key, tikz_geometry.points_box(corners)))
+    return boxes
+
+
+def find_visible(objects, state):
+    """Find the curves and meshes inside the clip rectangle
+
+    The bounding boxes of all nurbs and meshes are added to a
+    tikz_geometry.GridIndex, which is searched for the boxes overlapping
+    the clip rectangle. Fills in state.visible.
+    """
+    rect = tikz_geometry.expand_box(state.clip, CLIP_MARGIN)
+    index = tikz_geometry.GridIndex(rect)
+    total = 0
+    for obj in objects:
+        for key, box in object_boxes(obj, state):
+            index.insert((obj.name, key, box), box)
+            total += 1
+    visible = state.visible = {}
+    for name, key, box in index.query(rect):
+        if name not in visible:
+            visible[name] = {}
+        visible[name][key] = box
+    state.culled = total - sum([len(v) for v in visible.values()])
+
+
+def clip_nurb(curnurb, box, matrix, state):
+    """Return the parts of a poly nurb inside the clip rectangle as nurbs
+
+    box is the bounding box of the nurb in the drawing and matrix the
+    drawing_matrix. The nurb is clipped in drawing coordinates, and the
+    clipped points are transformed back to path coordinates. Open
+    polylines can be split into several nurbs.
+    """
+    rect = tikz_geometry.expand_box(state.clip, CLIP_MARGIN)
+    if tikz_geometry.box_inside(box, rect):
+        return [curnurb]
+    points = curnurb.points
+    if matrix is not None:
+        try:
+            inverse = tikz_scene.matrix_invert(matrix)
+        except ValueError:
+            return [curnurb]
+        points = tikz_geometry.transform_points(points, matrix)
+    if curnurb.cyclic:
+        pieces = [tikz_geometry.clip_polygon(points, rect)]
+    else:
+        pieces = tikz_geometry.clip_polyline(points, rect)
+    state.clipped += 1
+    nurbs = []
+    for piece in pieces:
+        if not len(piece):
+            continue
+        rows = [(p[0], p[1], 0.0, 1.0) for p in piece]
+        if matrix is not None:
+            rows = [tuple(p) + (1.0,) for p in
+                    tikz_geometry.transform_points(rows, inverse)]
+        nurbs.append(tikz_scene.Nurb(TYPE_POLY, tikz_scene.point_array(rows),
+                                     curnurb.cyclic))
+    return nurbs
+
+
+def convert_nurb(curnurb):
+    """Return a nurbs curve converted to a bezier or poly nurb, or None
+
+    The order is limited to the number of points. Curves of order 2 are
+    poly lines through the control points. See tikz_geometry.nurbs_to_bezier.
+    """
+    order = min(curnurb.order, len(curnurb))
+    if order < 2:
+        return None
+    if order == 2:
+        return tikz_scene.Nurb(TYPE_POLY, curnurb.points, curnurb.cyclic)
+    h1, knots, h2 = tikz_geometry.nurbs_to_bezier(curnurb.points, order,
+                                                  curnurb.cyclic, curnurb.knot_type)
+    if numpy is not None and isinstance(knots, numpy.ndarray):
+        points = numpy.hstack([h1, knots, h2])
+    else:
+        points = [a + k + b for a, k, b in zip(h1, knots, h2)]
+    return tikz_scene.Nurb(TYPE_BEZIER, points, curnurb.cyclic)
+
+
+def exported_nurbs(obj, state, clip=True):
+    """Generate the bezier and poly nurbs of a curve, ready to be formatted
+
+    Nurbs curves are converted to bezier curves. The nurbs are projected,
+    clipped and simplified as set up in state. With clip false the nurbs
+    are not clipped.
+    """
+    projection = state.projection
+    tolerance = simplify_tolerance(obj, state.transforms, projection is not None)
+    visible = None
+    if clip and state.clip is not None:
+        visible = state.visible.get(obj.name, {})
+        matrix = drawing_matrix(obj, state)
+    for i, curnurb in enumerate(obj.nurbs):
+        if curnurb.type not in NURB_TYPES:
+            continue
+        if visible is not None and i not in visible:
+            continue
+        if curnurb.type == TYPE_NURBS:
+            curnurb = convert_nurb(curnurb)
+            if curnurb is None:
+                continue
+        if projection is not None:
+            curnurb = project_nurb(curnurb, obj.matrix, projection)
+        nurbs = [curnurb]
+        if visible is not None and curnurb.type == TYPE_POLY:
+            nurbs = clip_nurb(curnurb, visible[i], matrix, state)
+        for curnurb in nurbs:
+            if tolerance > 0:
+                curnurb = simplify_nurb(curnurb, tolerance, state)
+            yield curnurb
+
+
+def plot_file_name(obj, number, state):
+    """Return a data file name for the number'th plot path of obj
+
+    The name is made from the output file name and the object name, so it
+    stays the same between exports. Characters that TeX can't handle in
+    file names are replaced.
+    """
+    base = "%s-%s-%d" % (os.path.basename(state.data_path),
+                         re.sub(r'[^A-Za-z0-9_-]', '_', obj.name), number)
+    name = base + PLOT_FILE_EXT
+    i = 1
+    while state.data_files.get(name, obj.name) != obj.name:
+        name = "%s_%d%s" % (base, i, PLOT_FILE_EXT)
+        i += 1
+    return name
+
+
+def write_plot_file(values, obj, number, state):
+    """Write the x and y values of a plot path to a data file
+
+    The file has a line with the x and y coordinate of each point, the
+    format read by the TikZ plot file operation. All lines are formatted
+    with a single string operation. Returns the file name.
+    """
+    name = plot_file_name(obj, number, state)
+    npoints = len(values) // 2
+    fmt = "%%.%df %%.%df\n" % (state.precision, state.precision)
+    path = os.path.join(os.path.dirname(state.data_path), name)
+    f = open(path, 'w')
+    try:
+        f.write("# %s\n" % obj.name)
+        f.write((fmt * npoints) % tuple(values))
+    finally:
+        f.close()
+    state.data_files[name] = obj.name
+    state.data_points += npoints
+    return name
+
+
+def primitive_code(curnurb, state):
+    """Return the code for a nurb that is a circle, ellipse, arc or rectangle
+
+    Closed bezier curves are compared with ellipses, open bezier curves
+    with circular arcs and closed polylines with rectangles. Returns None
+    if the nurb isn't one of these within PRIMITIVE_TOLERANCE.
+    """
+    number = "%%.%df" % state.precision
+    if curnurb.type == TYPE_BEZIER:
+        if not 1 < len(curnurb) <= MAX_PRIMITIVE_KNOTS:
+            return None
+        points = tikz_geometry.bezier_samples(*(bezier_arrays(curnurb)
+                                                + (curnurb.cyclic,)))
+        if not curnurb.cyclic:
+            arc = tikz_geometry.find_arc(points, PRIMITIVE_TOLERANCE)
+            if arc is None:
+                return None
+            start, sweep, radius = arc
+            return "%s arc (%s:%s:%s)\n" % (state.coord % points[0], number % start,
+                                            number % (start + sweep), number % radius)
+        ellipse = tikz_geometry.find_ellipse(points, PRIMITIVE_TOLERANCE)
+        if ellipse is None:
+            return None
+        cx, cy, rx, ry = ellipse
+        if abs(rx - ry) <= PRIMITIVE_TOLERANCE * max(rx, ry):
+            return "%s circle (%s)\n" % (state.coord % (cx, cy),
+                                         number % ((rx + ry) / 2))
+        return "%s ellipse (%s and %s)\n" % (state.coord % (cx, cy), number % rx,
+                                             number % ry)
+    if curnurb.type == TYPE_POLY and curnurb.cyclic and len(curnurb) <= 5:
+        rect = tikz_geometry.find_rectangle(curnurb.points, PRIMITIVE_TOLERANCE)
+        if rect is not None:
+            return "%s rectangle %s\n" % (state.coord % rect[:2],
+                                          state.coord % rect[2:])
+    return None
+
+
+def curve_path(obj, state, clip=True):
+    """Return the path code for the nurbs of a curve object
+
+    Returns a tuple (code, closed), where closed is true if any of the
+    exported nurbs is cyclic. code is an empty string if the curve has no
+    exported nurbs. With clip false the curve isn't clipped.
+    """
+    # Path fragments are collected per object. The options have to be
+    # written before the path, and they depend on the finished path.
+    ps = []
+    # Plot paths are wrapped together with the path code before them. The
+    # code after the last plot path isn't wrapped.
+    wrapper = None
+    wrapped = 0
+    plot_files = 0
+    closed = False
+    for curnurb in exported_nurbs(obj, state, clip):
+        if PRIMITIVES:
+            code = primitive_code(curnurb, state)
+            if code:
+                # Arcs are made from open curves, the other primitives
+                # from cyclic ones
+                ps.append(code)
+                closed = closed or curnurb.cyclic
+                continue
+        if curnurb.type == TYPE_BEZIER:
+            h1, knots, h2 = bezier_arrays(curnurb)
+            if not len(knots):
+                continue
+            closed = closed or curnurb.cyclic
+            values = bezier_values(h1, knots, h2, curnurb.cyclic)
+            if state.relative:
+                values = relative_bezier_values(values, state.precision)
+            ps.append(format_bezier(values, curnurb.cyclic, state.coord,
+                                    state.next_coord))
+        elif curnurb.type == TYPE_POLY:
+            values = xy_values(curnurb.points)
+            if not values:
+                continue
+            closed = closed or curnurb.cyclic
+
+            if USE_PLOTPATH:
+                plotopts = get_property(obj, 'plotstyle')
+                if plotopts:
+                    poptstr = "[%s]" % ",".join(plotopts)
+                else:
+                    poptstr = ''
+                if state.data_path and PLOT_FILE_POINTS \
+                        and len(values) // 2 > PLOT_FILE_POINTS:
+                    name = write_plot_file(values, obj, plot_files, state)
+                    plot_files += 1
+                    ps.append(" plot%s file {%s}" % (poptstr, name))
+                else:
+                    ps.append(" plot%s coordinates {%s}"
+                              % (poptstr, format_coords(values, " ", state.coord)))
+                if curnurb.cyclic:
+                    ps.append(" -- cycle")
+                if WRAP_LINES:
+                    if wrapper is None:
+                        wrapper = LineWrapper(80, "  ")
+                    wrapper.write("".join(ps[wrapped:]))
+                    wrapped = len(ps)
+
+            else:
+                if curnurb.cyclic:
+                    values = values + values[:2]
+                if state.relative:
+                    values = relative_values(values, state.precision)
+                # Join the coordinates. Could have used "--".join(coords), but
+                # have to add some logic for pretty printing.
+                if WRAP_LINES:
+                    ps.append(format_wrapped_coords(values, curnurb.cyclic,
+                                                    state.coord, state.next_coord))
+                else:
+                    ps.append(format_coords(values, " -- ", state.coord,
+                                            state.next_coord))
+                    if curnurb.cyclic:
+                        ps.append(" -- cycle\n  ")
+
+    if wrapper is not None:
+        ps = [wrapper.close()] + ps[wrapped:]
+    ps = "".join(ps)
+    if state.compact:
+        ps = strip_zeros(ps)
+    if not WRAP_LINES:
+        ps = ' '.join(ps.replace('\n', ' ').split())
+    return ps, closed
+
+
+def iter_object(obj, empties, state=None):
+    """Generate the code for a single object as a sequence of fragments
+
+    empties is a dict with lists of the empties parented to each object,
+    keyed by the parent's name. state is the ExportState for the export.
+    """
+    name = obj.name
+    if state is None:
+        state = ExportState()
+    transforms = state.transforms
+
+    if obj.type not in ["Curve", "Empty", "Mesh"]:
+        return
+
+    if obj.type == 'Mesh':
+        if has_mesh(obj):
+            code = write_mesh(obj, state)
+            if code:
+                yield "%% %s\n" % name
+                yield code
+    elif obj.type == 'Curve':
+        yield "%% %s\n" % name
+        shape = state.shapes.get(name)
+        if shape:
+            macro, ps, closed = shape
+        else:
+            macro = None
+            ps, closed = curve_path(obj, state)
+        if not ps:
+            return
+        options = []
+        if DRAW_CURVE:
+            options += ['draw']
+        if FILL_CLOSED_CURVE:
+            if closed:
+                options += ['fill']
+        if TRANSFORM_CURVE and state.projection is None:
+            t = transforms.get(obj)
+            x, y, z = t.location
+            rot_z = t.rot_z
+            scale_x, scale_y, scale_z = t.scale
+            if x <> 0: options.append('xshift=%.4fcm' % x)
+            if y <> 0: options.append('yshift=%.4fcm' % y)
+            if rot_z <> 0: options.append('rotate=%.4f' % rot_z)
+            if scale_x <> 1: options += ['xscale=%.4f' % scale_x]
+            if scale_y <> 1: options += ['yscale=%.4f' % scale_y]
+        options.extend(object_styles(obj, state)[hoisted_styles(obj, state):])
+
+        optstr = ",".join(options)
+        emptstr = []
+        if EMPTIES:
+            if obj.name in empties:
+                for empty in empties[obj.name]:
+                    # Get correct coordinate relative to the parent
+                    if state.projection is not None:
+                        ex, ey, ez = state.projection.project([empty.location])[0]
+                    elif TRANSFORM_CURVE:
+                        inverse = transforms.inverse(obj)
+                        ex, ey, ez = tikz_scene.matrix_multiply(empty.matrix, inverse)[3][:3]
+                    else:
+                        ex, ey, ez = [a - b for a, b in
+                                      zip(transforms.get(empty).location,
+                                          transforms.get(obj).location)]
+                    coord = state.coord % (ex, ey)
+                    if state.compact:
+                        coord = strip_zeros(coord)
+                    emptstr.append("  %s coordinate (%s)\n" % (coord, empty.name))
+
+        if macro:
+            ps = "\\" + macro
+        if len(optstr) > 50 or emptstr:
+            yield "\\path[%s]\n" % optstr
+            for e in emptstr:
+                yield e
+            yield "  %s;\n" % ps.rstrip()
+        else:
+            yield "\\path[%s] %s;\n" % (optstr, ps.rstrip())
+    elif obj.type == 'Empty' and EMPTIES and not obj.parent:
+        if state.projection is not None:
+            x, y, z = state.projection.project([obj.location])[0]
+        else:
+            x, y, z = transforms.get(obj).location
+        coord = coord_format(state.precision, True) % (x, y)
+        if state.compact:
+            coord = strip_zeros(coord)
+        yield "\\coordinate (%s) at %s;\n" % (tikzify(obj.name), coord)
+
+
+def object_styles(obj, state):
+    """Return the material and style options of a path
+
+    They are the last path options, after the actions and transformations.
+    """
+    styles = []
+    if EXPORT_MATERIALS:
+        matopts = get_material(obj.material, state.styles)
+        if matopts:
+            styles.append(matopts)
+    styles.extend(get_property(obj, 'style'))
+    return styles
+
+
+def hoisted_styles(obj, state):
+    """Return the number of styles of obj moved to the enclosing scope"""
+    scope = state.scopes.get(obj.name)
+    if scope is None:
+        return 0
+    return scope[1]
+
+
+def write_object(obj, empties, state=None):
+    """Write Curves"""
+    return "".join(iter_object(obj, empties, state))
+
+
+def object_key(obj, empties, state):
+    """Return the object cache key for obj
+
+    The key covers everything write_object uses: the curve data, world
+    matrix, material name, properties, the empties parented to obj and the
+    export options. Code with plot data files is never stored, but whether
+    data files can be written is part of the key, so code with inlined
+    coordinates isn't reused when they should go to data files.
+    """
+    nurbs = [(n.type, n.cyclic, n.order, n.knot_type,
+              tikz_cache.points_digest(n.points)) for n in obj.nurbs]
+    if obj.mesh:
+        nurbs.append((tikz_cache.points_digest(obj.mesh.verts),
+                      tikz_cache.make_key(obj.mesh.faces, obj.mesh.edges)))
+    if obj.material:
+        # Identical materials share the style of the first one used
+        material = (obj.material.name, state.styles.name(obj.material))
+    else:
+        material = None
+    children = [(e.name, e.matrix) for e in empties.get(obj.name, [])]
+    options = [globals()[name] for name in OBJECT_OPTIONS]
+    shape = state.shapes.get(obj.name)
+    if shape:
+        shape = shape[0]
+    projection = state.projection
+    if projection is not None:
+        projection = (projection.view, projection.perspective)
+    return tikz_cache.make_key(__version__, obj.name, obj.type, obj.matrix,
+                               obj.parent, material, obj.properties,
+                               obj.game_properties, nurbs, children, options,
+                               state.precision, state.compact, state.relative,
+                               shape, projection, state.clip,
+                               hoisted_styles(obj, state),
+                               state.data_path is not None)
+
+
+def cached_object(obj, empties, state):
+    """Return the code for obj from the object cache
+
+    The code is generated with write_object and stored if it isn't in the
+    cache.
+    """
+    key = object_key(obj, empties, state)
+    code = state.cache.get(key)
+    if code is None:
+        nfiles = len(state.data_files)
+        code = write_object(obj, empties, state)
+        # The data files are only written when the code is generated
+        if len(state.data_files) == nfiles:
+            state.cache.put(key, code)
+    return code
+
+
+def open_cache(filepath):
+    """Return the object cache for an export to filepath, or None
+
+    A relative CACHE_DIR is relative to the directory of filepath.
+    """
+    if not CACHE_DIR:
+        return None
+    directory = CACHE_DIR
+    if filepath and not os.path.isabs(directory):
+        directory = os.path.join(os.path.dirname(filepath), directory)
+    try:
+        return tikz_cache.FragmentCache(directory, CACHE_SIZE * 1024 * 1024)
+    except OSError, e:
+        print "Object cache disabled: %s" % e
+        return None
+
+
+def shape_name(i):
+    """Return the macro name for the i'th shared curve
+
+    TeX macro names can only contain letters, so the number is written
+    with the letters A-Z as digits.
+    """
+    letters = []
+    while True:
+        letters.append(chr(ord('A') + i % 26))
+        i = i // 26 - 1
+        if i < 0:
+            break
+    letters.reverse()
+    return SHAPE_PREFIX + "".join(letters)
+
+
+def shape_key(obj, state):
+    """Return a key that is equal for objects with the same path code"""
+    nurbs = [(n.type, n.cyclic, n.order, n.knot_type,
+              tikz_cache.points_digest(n.points)) for n in obj.nurbs]
+    plotstyle = None
+    if USE_PLOTPATH:
+        plotstyle = get_property(obj, 'plotstyle')
+    return tikz_cache.make_key(nurbs, simplify_tolerance(obj, state.transforms),
+                               plotstyle)
+
+
+def find_shapes(objects, state):
+    """Find curves shared by several objects
+
+    Objects with identical curve data get the same entry in state.shapes.
+    The path code is generated once per shape. Returns a list of
+    (macro name, path code, closed) tuples in order of first use.
+    """
+    groups = {}
+    order = []
+    for obj in objects:
+        if not has_path(obj):
+            continue
+        key = shape_key(obj, state)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(obj)
+    shapes = []
+    for key in order:
+        group = groups[key]
+        if len(group) < 2:
+            continue
+        # Shared curves are used with different transformations, so they
+        # aren't clipped
+        ps, closed = curve_path(group[0], state, False)
+        if not ps:
+            continue
+        shape = (shape_name(len(shapes)), ps, closed)
+        shapes.append(shape)
+        for obj in group:
+            state.shapes[obj.name] = shape
+    return shapes
+
+
+def write_shapes(shapes):
+    """Return the macro definitions for shared curves"""
+    c = "% Shapes\n"
+    for macro, ps, closed in shapes:
+        c += "\\def\\%s{%s}\n" % (macro, ps.rstrip())
+    return c
+
+
+def mesh_options(obj, state):
+    """Return the path options for the faces or edges of a mesh"""
+    options = []
+    if DRAW_CURVE or MESH_MODE == 'edges':
+        options.append('draw')
+    if FILL_CLOSED_CURVE and MESH_MODE == 'faces':
+        options.append('fill')
+    options.extend(object_styles(obj, state)[hoisted_styles(obj, state):])
+    return ",".join(options)
+
+
+def write_mesh(obj, state):
+    """Return the code for a mesh
+
+    The vertices are transformed to world coordinates in one operation and
+    projected by dropping Z, or through the camera. With MESH_MODE 'edges'
+    all edges are written as a single path. With 'faces' each face is a
+    closed path. The faces are drawn farthest first, so nearer faces cover
+    them when filled. Faces and edges outside the clip rectangle are
+    skipped.
+    """
+    mesh = obj.mesh
+    if state.projection is not None:
+        points = state.projection.project(mesh.verts, obj.matrix)
+    else:
+        points = tikz_geometry.transform_points(mesh.verts, obj.matrix)
+    optstr = mesh_options(obj, state).replace('%', '%%')
+    coord = state.coord
+    rect = None
+    if state.clip is not None:
+        rect = tikz_geometry.expand_box(state.clip, CLIP_MARGIN)
+    if MESH_MODE == 'edges':
+        values = tikz_geometry.visible_edges(points, mesh.edges, rect)
+        if not values:
+            return ""
+        if WRAP_LINES:
+            sep = "\n  "
+        else:
+            sep = " "
+        segment = "%s -- %s" % (coord, coord)
+        fmt = "\\path[%s] %s;\n" % (optstr, sep.join([segment] * (len(values) // 4)))
+    else:
+        sizes, values = tikz_geometry.sort_faces(points, mesh.faces, MESH_CULL, rect)
+        if not values:
+            return ""
+        fmts = {}
+        for n in set(sizes):
+            fmts[n] = "\\path[%s] %s -- cycle;\n" % (optstr, " -- ".join([coord] * n))
+        fmt = "".join([fmts[n] for n in sizes])
+    code = fmt % tuple(values)
+    if state.compact:
+        code = strip_zeros(code)
+    return code
+
+
+def has_mesh(obj):
+    """Return True if write_object will generate code for the mesh obj"""
+    return obj.type == 'Mesh' and MESH_MODE in ('edges', 'faces') \
+        and obj.mesh is not None
+
+
+def has_path(obj):
+    """Return True if write_object will generate a path for obj"""
+    if obj.type != 'Curve':
+        return False
+    for curnurb in obj.nurbs:
+        if curnurb.type in NURB_TYPES:
+            return True
+    return False
+
+
+def point_depths(obj, projection=None):
+    """Return the world space z coordinates of the knots and points of a curve
+
+    Returns the z coordinates of the vertices for meshes. With a
+    projection the depths in the camera's view are returned instead.
+    """
+    m = obj.matrix
+    col = [m[0][2], m[1][2], m[2][2]]
+    depths = []
+    if projection is not None:
+        transform = lambda points: projection.project(points, m)
+    else:
+        transform = lambda points: tikz_geometry.transform_points(points, m)
+    if obj.mesh and len(obj.mesh.verts):
+        points = transform(obj.mesh.verts)
+        if numpy is not None and isinstance(points, numpy.ndarray):
+            return points[:, 2].tolist()
+        return [p[2] for p in points]
+    for curnurb in obj.nurbs:
+        if curnurb.type == TYPE_BEZIER:
+            # Use the knots, not the handles
+            start = 3
+        else:
+            start = 0
+        points = curnurb.points
+        if not len(points):
+            continue
+        if projection is not None:
+            depths.extend([p[2] for p in transform([p[start:start + 3] for p in points])])
+        elif numpy is not None and isinstance(points, numpy.ndarray):
+            depths.extend((numpy.dot(points[:, start:start + 3], col) + m[3][2]).tolist())
+        else:
+            depths.extend([p[start] * col[0] + p[start + 1] * col[1] + p[start + 2] * col[2]
+                           + m[3][2] for p in points])
+    return depths
+
+
+def depth_key(obj, policy=None, projection=None):
+    """Return the sort key used for the draw order of obj
+
+    With a projection the depth in the camera's view is used instead of the
+    z coordinate. The policy is one of DEPTH_POLICIES:
+
+    - origin: the z coordinate of the object's origin
+    - min, mean, max: the minimum, mean or maximum z coordinate of the
+      points of a curve or the vertices of a mesh. Empties use their
+      origin.
+    - layer: the number in the object's 'layer' property, with the origin
+      as tie breaker. Objects without the property are on layer 0.
+    """
+    if policy is None:
+        policy = DEPTH_POLICY
+    if projection is not None:
+        z = projection.depth(obj.location)
+    else:
+        z = obj.location[2]
+    if policy in ('min', 'mean', 'max') and obj.type in ('Curve', 'Mesh'):
+        depths = point_depths(obj, projection)
+        if depths:
+            if policy == 'min':
+                z = min(depths)
+            elif policy == 'max':
+                z = max(depths)
+            else:
+                z = sum(depths) / len(depths)
+    elif policy == 'layer':
+        layer = 0.0
+        for value in get_property(obj, 'layer'):
+            try:
+                layer = float(value)
+                break
+            except ValueError:
+                pass
+        return (layer, z)
+    return z
+
+
+def depth_sorted(objects, policy=None, projection=None):
+    """Return a list of (depth key, object) tuples in draw order
+
+    The depth key is computed once for each object. The sort is stable, so
+    objects with the same depth keep their order.
+    """
+    keyed = [(depth_key(obj, policy, projection), i, obj)
+             for i, obj in enumerate(objects)]
+    keyed.sort()
+    return [(key, obj) for key, i, obj in keyed]
+
+
+def draw_order(objects, policy=None, projection=None):
+    """Return objects sorted in draw order"""
+    return [obj for key, obj in depth_sorted(objects, policy, projection)]
+
+
+def scope_styles(obj, state):
+    """Return the styles of obj that can be moved to a scope
+
+    Returns None for objects without paths. The styles are taken in order
+    up to the first one that changes the transformation or has an action.
+    """
+    if not (has_path(obj) or has_mesh(obj)):
+        return None
+    styles = object_styles(obj, state)
+    # The material style is defined in the materials section
+    texts = list(styles)
+    if EXPORT_MATERIALS and obj.material:
+        texts[0] = str(obj.material.properties.get('style', ''))
+    for i, text in enumerate(texts):
+        if _transform_keys.search(text) or _action_keys.search(text):
+            return tuple(styles[:i])
+    return tuple(styles)
+
+
+def count_keys(styles):
+    """Return the number of option keys in a list of options"""
+    return sum([len(style.split(',')) for style in styles])
+
+
+def path_count(obj):
+    """Return the number of paths written for obj"""
+    if has_mesh(obj) and MESH_MODE == 'faces':
+        return len(obj.mesh.faces)
+    return 1
+
+
+def group_ties(keyed, styles_dict):
+    """Return the objects in draw order with equal styles together
+
+    styles_dict maps object names to their scope_styles. Only objects with
+    the same depth key are reordered. Within them the objects with the
+    styles of the previous object come first, then the other styles in
+    order of first use.
+    """
+    ordered = []
+    previous = None
+    i = 0
+    n = len(keyed)
+    while i < n:
+        j = i + 1
+        while j < n and keyed[j][0] == keyed[i][0]:
+            j += 1
+        groups = {}
+        order = []
+        for key, obj in keyed[i:j]:
+            styles = styles_dict[obj.name]
+            if styles not in groups:
+                groups[styles] = []
+                order.append(styles)
+            groups[styles].append(obj)
+        if previous in groups:
+            order.remove(previous)
+            order.insert(0, previous)
+        for styles in order:
+            ordered.extend(groups[styles])
+            if styles is not None:
+                previous = styles
+        i = j
+    return ordered
+
+
+def find_scopes(keyed, state):
+    """Find runs of paths with common styles and move them to scopes
+
+    keyed is the list from depth_sorted. Objects with the same depth are
+    grouped by their styles first. A run is extended as long as the
+    common leading styles save more keys than they did without the
+    object. Fills in state.scopes with (options, hoisted, end) tuples,
+    where options is the scope's options for the first object of a run,
+    hoisted the number of styles removed from the object's paths and end
+    is true for the last object of a run. Returns the objects in draw
+    order.
+    """
+    styles_dict = dict([(obj.name, scope_styles(obj, state)) for key, obj in keyed])
+    ordered = group_ties(keyed, styles_dict)
+    runs = []
+    run = None
+    for obj in ordered:
+        styles = styles_dict[obj.name]
+        if run is not None and styles is None:
+            run[2].append(obj)
+            continue
+        if run is not None:
+            common = run[0]
+            for k in range(min(len(common), len(styles))):
+                if common[k] != styles[k]:
+                    common = common[:k]
+                    break
+            else:
+                common = common[:len(styles)]
+            paths = run[1] + path_count(obj)
+            if count_keys(common) * (paths - 1) > count_keys(run[0]) * (run[1] - 1):
+                run[0] = common
+                run[1] = paths
+                run[2].append(obj)
+                continue
+        run = [styles or (), path_count(obj), [obj]]
+        runs.append(run)
+    scopes = state.scopes = {}
+    for styles, paths, objects in runs:
+        if not styles or paths < 2:
+            continue
+        options = ",".join(styles)
+        for i, obj in enumerate(objects):
+            hoisted = 0
+            if styles_dict[obj.name] is not None:
+                hoisted = len(styles)
+            scopes[obj.name] = (options, hoisted, i == len(objects) - 1)
+            options = None
+        state.scope_count += 1
+        state.keys_saved += count_keys(styles) * (paths - 1)
+    return ordered
+
+
+def scope_code(obj, state):
+    """Return the code written before and after the code of obj for scopes"""
+    scope = state.scopes.get(obj.name)
+    if scope is None:
+        return "", ""
+    begin = end = ""
+    if scope[0] is not None:
+        begin = "\\begin{scope}[%s]\n" % scope[0]
+    if scope[2]:
+        end = "\\end{scope}\n"
+    return begin, end
+
+
+def collect_materials(objects, styles):
+    """Register the materials used by objects in the StyleTable styles
+
+    The materials section is written before the paths, so the used
+    materials have to be known before the path code is generated.
+    """
+    for obj in objects:
+        if has_path(obj) or has_mesh(obj):
+            get_material(obj.material, styles)
+
+
+def split_template(template):
+    """Split a template into the parts before and after the path code"""
+    head, sep, tail = template.partition('%(pathcode)s')
+    return head, tail
+
+
+def write_fragments(f, fragments, bufsize=OUTPUT_BUFFER_SIZE, profile=None):
+    """Write a sequence of strings to f, joining at most bufsize bytes per write
+
+    The time used for writing is added to the write stage of profile.
+    """
+    write = f.write
+    if profile is not None:
+        write = profile.timed(write, 'write')
+    buf = []
+    size = 0
+    for fragment in fragments:
+        buf.append(fragment)
+        size += len(fragment)
+        if size >= bufsize:
+            write("".join(buf))
+            buf = []
+            size = 0
+    if buf:
+        write("".join(buf))
+
+
+def make_projection(camera, projection=None):
+    """Return the tikz_geometry.Projection for the PROJECTION option
+
+    'none' drops the Z coordinate and returns None. 'camera' projects
+    through the camera using its own type, 'ortho' and 'persp' force an
+    orthographic or perspective projection from the camera's position.
+    Returns None if the scene has no camera.
+    """
+    if projection is None:
+        projection = PROJECTION
+    if projection == 'none':
+        return None
+    if camera is None:
+        print "No camera in the scene. Exporting without projection."
+        return None
+    if projection == 'camera':
+        perspective = camera.type != 'ortho'
+    else:
+        perspective = projection == 'persp'
+    return tikz_geometry.Projection(camera.matrix, perspective)
+
+
+def parse_rect(value):
+    """Return a rectangle from a string like '0 0 10 5' or '0,0,10,5'
+
+    The corners can be given in any order. Returns None if value isn't a
+    rectangle.
+    """
+    try:
+        x0, y0, x1, y1 = [float(v) for v in str(value).replace(',', ' ').split()]
+    except ValueError:
+        return None
+    if x0 == x1 or y0 == y1:
+        return None
+    return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+
+def camera_frame(camera, projection):
+    """Return the rectangle seen through the camera in drawing coordinates
+
+    With a projection the frame is centered on the origin. Without one the
+    camera is assumed to look straight down, and the frame is centered on
+    the camera. The larger side of the frame is given by the lens or the
+    orthographic scale, the other side by the aspect ratio.
+    """
+    if projection is not None:
+        x, y = 0.0, 0.0
+        if projection.perspective:
+            half = projection.distance * CAMERA_FILM / camera.lens
+        else:
+            half = camera.scale / 2.0
+    else:
+        x, y, z = camera.matrix[3][:3]
+        if camera.type == 'ortho':
+            half = camera.scale / 2.0
+        else:
+            half = abs(z) * CAMERA_FILM / camera.lens
+    aspect = camera.aspect or 1.0
+    if aspect >= 1:
+        w, h = half, half / aspect
+    else:
+        w, h = half * aspect, half
+    return (x - w, y - h, x + w, y + h)
+
+
+def clip_rect(scene, projection, clip=None):
+    """Return the clip rectangle for the CLIP option, or None
+
+    'scene' uses the 'clip' property of the scene and 'camera' the frame of
+    the scene's camera.
+    """
+    if clip is None:
+        clip = CLIP
+    if clip == 'scene':
+        rect = parse_rect(scene.properties.get('clip', ''))
+        if rect is None:
+            print "The scene has no valid clip property. Exporting without clipping."
+        return rect
+    if clip == 'camera':
+        if scene.camera is None:
+            print "No camera in the scene. Exporting without clipping."
+            return None
+        return camera_frame(scene.camera, projection)
+    return None
+
+
+def write_clip(rect, state):
+    """Return the \\clip command for the clip rectangle"""
+    coord = state.coord
+    c = "\\clip %s rectangle %s;\n" % (coord % rect[:2], coord % rect[2:])
+    if state.compact:
+        c = strip_zeros(c)
+    return c
+
+
+def group_empties(objects):
+    """Return a dict with lists of the empties parented to each object
+
+    The dict is keyed by the parent's name.
+    """
+    empties_wp = [obj for obj in objects if obj.type == 'Empty' and obj.parent]
+    empties_dict = {}
+    for empty in empties_wp:
+        if empty.parent in empties_dict:
+            empties_dict[empty.parent] += [empty]
+        else:
+            empties_dict[empty.parent] = [empty]
+    return empties_dict
+
+
+def begin_document(scene, state, overlay=False):
+    """Prepare the export of a scene
+
+    Sets up state and returns a tuple (head, tail, prologue, objects,
+    empties). head and tail are the document before and after the path
+    code. prologue is a list with the code written before the objects,
+    objects the objects in draw order and empties the empties grouped by
+    parent. For a frame of an overlay document scopes aren't used, and the
+    standalone document is a beamer frame.
+    """
+    profile = state.profile
+    objects = scene.objects
+    precision = PRECISION
+    if precision < 0:
+        precision = auto_precision(figure_extent(objects))
+    state.set_format(precision, COMPACT_COORDS, RELATIVE_COORDS)
+    state.projection = make_projection(scene.camera)
+    state.clip = clip_rect(scene, state.projection)
+    t0 = time.time()
+    empties_dict = group_empties(objects)
+    if profile is not None:
+        profile.add_time('empties', t0)
+
+    t0 = time.time()
+    if state.materials is not None:
+        matcode = state.materials
+    elif EXPORT_MATERIALS:
+        collect_materials(objects, state.styles)
+        matcode = write_materials(state.styles)
+    else:
+        matcode = ""
+    if profile is not None:
+        profile.add_time('materials', t0)
+
+    preamblecode = scene.properties.get('preamble', '')
+    templatevars = dict(preamble=preamblecode, materials=matcode)
+    if STANDALONE:
+        if 'preamble' in scene.properties:
+            templatevars['preamble'] = str(scene.properties['preamble'])
+        if overlay:
+            template = overlay_template
+        else:
+            template = standalone_template
+    elif CODE_ONLY:
+        template = "%(pathcode)s"
+    else:
+        template = fig_template
+
+    t0 = time.time()
+    keyed = depth_sorted(objects, projection=state.projection)
+    if profile is not None:
+        profile.add_time('sort', t0)
+    if state.clip is not None:
+        t0 = time.time()
+        find_visible([obj for key, obj in keyed], state)
+        keyed = [(key, obj) for key, obj in keyed
+                 if obj.name in state.visible or obj.type == 'Empty']
+        if profile is not None:
+            profile.add_time('clip', t0)
+    if SCOPES and not overlay:
+        t0 = time.time()
+        ordered = find_scopes(keyed, state)
+        if profile is not None:
+            profile.add_time('scopes', t0)
+    else:
+        ordered = [obj for key, obj in keyed]
+    t0 = time.time()
+    head, tail = split_template(template)
+    head = head % templatevars
+    tail = tail % templatevars
+    if profile is not None:
+        profile.add_time('template', t0)
+    prologue = []
+    if state.clip is not None:
+        prologue.append(write_clip(state.clip, state))
+    # Projected curves depend on the object's matrix and can't be shared
+    if INSTANCES and state.projection is None:
+        t0 = time.time()
+        shapes = find_shapes(ordered, state)
+        if profile is not None:
+            profile.add_time('shapes', t0)
+        if shapes:
+            prologue.append(write_shapes(shapes))
+    return head, tail, prologue, ordered, empties_dict
+
+
+def object_code(obj, empties, state):
+    """Return the code for obj, from the object cache if there is one"""
+    profile = state.profile
+    t0 = time.time()
+    if state.cache is not None:
+        code = cached_object(obj, empties, state)
+    else:
+        code = write_object(obj, empties, state)
+    if profile is not None:
+        profile.add_object(obj, len(empties.get(obj.name, [])), len(code),
+                           time.time() - t0)
+    return code
+
+
+def iter_document(scene, state=None):
+    """Generate the complete output document as a sequence of fragments"""
+    if state is None:
+        state = ExportState()
+    head, tail, prologue, ordered, empties_dict = begin_document(scene, state)
+    yield head
+    for fragment in prologue:
+        yield fragment
+    for obj in ordered:
+        begin, end = scope_code(obj, state)
+        if begin:
+            yield begin
+        if state.profile is not None or state.cache is not None:
+            yield object_code(obj, empties_dict, state)
+        else:
+            for fragment in iter_object(obj, empties_dict, state):
+                yield fragment
+        if end:
+            yield end
+    yield tail
+
+
+class FileWriter(object):
+    """Writes files in a pool of background threads
+
+    The code for the next file can be generated while the previous files
+    are written. The queue is bounded, so at most a few files are kept in
+    memory.
+    """
+
+    def __init__(self, threads=WRITER_THREADS):
+        self.queue = Queue.Queue(2 * threads)
+        self.errors = []
+        self.threads = []
+        for i in range(threads):
+            t = threading.Thread(target=self._run)
+            t.setDaemon(True)
+            t.start()
+            self.threads.append(t)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            filepath, fragments = job
+            try:
+                f = open(filepath, 'w')
+                try:
+                    f.write("".join(fragments))
+                finally:
+                    f.close()
+            except (IOError, OSError), e:
+                self.errors.append(e)
+
+    def write(self, filepath, fragments):
+        """Write the fragments to filepath"""
+        self.queue.put((filepath, fragments))
+
+    def close(self):
+        """Wait for all files to be written
+
+        Raises the first error from the writer threads.
+        """
+        for t in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        if self.errors:
+            raise self.errors[0]
+
+
+def chunk_name(filepath, number):
+    """Return the file name of the number'th chunk of filepath"""
+    return "%s-part%03d.tex" % (os.path.splitext(os.path.basename(filepath))[0],
+                                number)
+
+
+def write_chunks(scene, filepath, state):
+    """Write the path code to chunk files and a master file
+
+    A new chunk is started when the current one would exceed CHUNK_SIZE kB
+    or CHUNK_PATHS objects. The chunks are written by a FileWriter and
+    included with \\input by the master file at filepath, in draw order.
+    Returns the number of chunks.
+    """
+    profile = state.profile
+    head, tail, prologue, ordered, empties_dict = begin_document(scene, state)
+    directory = os.path.dirname(filepath)
+    max_bytes = CHUNK_SIZE * 1024
+    writer = FileWriter()
+    names = []
+    chunk = []
+    size = 0
+
+    def flush():
+        name = chunk_name(filepath, len(names) + 1)
+        names.append(name)
+        chunk.insert(0, '%% Generated by tikz_export.py v %s, part %d\n'
+                     % (__version__, len(names)))
+        writer.write(os.path.join(directory, name), chunk)
+
+    try:
+        for obj in ordered:
+            begin, end = scope_code(obj, state)
+            code = begin + object_code(obj, empties_dict, state) + end
+            if not code:
+                continue
+            if chunk and ((max_bytes and size + len(code) > max_bytes)
+                          or (CHUNK_PATHS and len(chunk) >= CHUNK_PATHS)):
+                flush()
+                chunk = []
+                size = 0
+            chunk.append(code)
+            size += len(code)
+        if chunk:
+            flush()
+    finally:
+        t0 = time.time()
+        writer.close()
+        if profile is not None:
+            profile.add_time('write', t0)
+    # Remove chunks left over from an earlier export with more chunks
+    number = len(names) + 1
+    while os.path.exists(os.path.join(directory, chunk_name(filepath, number))):
+        os.remove(os.path.join(directory, chunk_name(filepath, number)))
+        number += 1
+    fragments = [head] + prologue
+    fragments.extend(["\\input{%s}\n" % name for name in names])
+    fragments.append(tail)
+    f = file(filepath, 'w')
+    try:
+        f.write('%% Generated by tikz_export.py v %s \n' % (__version__))
+        write_fragments(f, fragments, profile=profile)
+    finally:
+        f.close()
+    return len(names)
+
+
+def write_scene(scene, filepath, profile=None):
+    """Write the code for a scene to filepath or the clipboard
+
+    profile is a tikz_profile.Profile with the timings so far. If PROFILE
+    is set and profile is None, a new profile is started. With CHUNK_SIZE
+    or CHUNK_PATHS set the path code is split into several files, and with
+    PARTITION set the scene is split with write_partitions. Returns False
+    if the code couldn't be copied to the clipboard, or no partitions were
+    written.
+    """
+    if PARTITION != 'off':
+        return write_partitions(scene, filepath, profile)
+    if PROFILE and profile is None:
+        profile = tikz_profile.Profile()
+    if CLIPBOARD_OUTPUT:
+        state = ExportState(open_cache(None), profile)
+    else:
+        state = ExportState(open_cache(filepath), profile)
+        if PLOT_FILE_POINTS and USE_PLOTPATH:
+            state.data_path = os.path.splitext(filepath)[0]
+    success = True
+    if not CLIPBOARD_OUTPUT:
+        if CHUNK_SIZE or CHUNK_PATHS:
+            chunks = write_chunks(scene, filepath, state)
+            print "Code written to %s and %d chunk files" % (filepath, chunks)
+        else:
+            f = file(filepath, 'w')
+            try:
+                # write header to file
+                f.write('%% Generated by tikz_export.py v %s \n' % (__version__))
+                write_fragments(f, iter_document(scene, state), profile=profile)
+            finally:
+                f.close()
+            print "Code written to %s" % filepath
+        for line in state.report():
+            print line
+        if profile is not None:
+            profilepath = os.path.splitext(filepath)[0] + tikz_profile.PROFILE_EXT
+            profile.save(profilepath)
+            print "Profile written to %s" % profilepath
+    else:
+        text = "".join(iter_document(scene, state))
+        copy = copy_to_clipboard
+        if profile is not None:
+            copy = profile.timed(copy, 'write')
+        success = copy(text)
+        if not success:
+            print "Failed to copy code to the clipboard"
+            print "Pywin32, xclip, cbcopy or pygtk required for clipboard support"
+    if state.cache is not None:
+        state.cache.prune()
+    if profile is not None:
+        for line in profile.summary():
+            print line
+    return success
+
+
+def partition_scene(scene, policy=None):
+    """Split a scene by group or layer
+
+    Returns a list of (name, Scene) tuples sorted by name, one for each
+    group or layer with objects. With policy 'group' the names are the
+    group names, with 'layer' they are layer01, layer02 and so on. An
+    object in several groups or on several layers is in each of their
+    scenes, and empties parented to an object follow their parent. If
+    policy is None PARTITION is used.
+    """
+    if policy is None:
+        policy = PARTITION
+    objects_dict = dict([(obj.name, obj) for obj in scene.objects])
+    parts = {}
+    for obj in scene.objects:
+        owner = obj
+        if obj.type == 'Empty' and obj.parent in objects_dict:
+            owner = objects_dict[obj.parent]
+        if policy == 'group':
+            names = owner.groups
+        else:
+            names = ['layer%02d' % layer for layer in owner.layers]
+        for name in names:
+            if name in parts:
+                parts[name].append(obj)
+            else:
+                parts[name] = [obj]
+    names = parts.keys()
+    names.sort()
+    return [(name, tikz_scene.Scene(parts[name], scene.properties, scene.camera))
+            for name in names]
+
+
+def partition_name(filepath, name):
+    """Return the path of the file with the partition name of filepath
+
+    Characters other than letters, digits, _, + and - are replaced by _.
+    """
+    return "%s-%s.tex" % (os.path.splitext(filepath)[0],
+                          re.sub(r'[^A-Za-z0-9_+-]+', '_', name))
+
+
+def write_partitions(scene, filepath, profile=None):
+    """Write the code for each group or layer of a scene to its own file
+
+    The scene is split with partition_scene, and each part is exported to
+    the file named by partition_name. The parts share a
+    tikz_cache.MemoryCache, so the code of an object in several groups or
+    on several layers is only generated once, and are written by a
+    FileWriter while the next part is exported. With EXPORT_MATERIALS the
+    materials of all parts are written once to a common file that each
+    part includes with \\input. Returns False if nothing was written, because
+    CLIPBOARD_OUTPUT is set or no object is in a partition.
+    """
+    if CLIPBOARD_OUTPUT:
+        print "Partitions can't be copied to the clipboard"
+        return False
+    if PROFILE and profile is None:
+        profile = tikz_profile.Profile()
+    t0 = time.time()
+    partitions = partition_scene(scene)
+    if profile is not None:
+        profile.add_time('partition', t0)
+    if not partitions:
+        print "No objects in any %s" % PARTITION
+        return False
+    cache = tikz_cache.MemoryCache(open_cache(filepath))
+    # The materials are shared by all partitions
+    styles = StyleTable()
+    materials = None
+    if EXPORT_MATERIALS:
+        t0 = time.time()
+        collect_materials(scene.objects, styles)
+        matpath = os.path.splitext(filepath)[0] + MATERIALS_EXT
+        f = file(matpath, 'w')
+        try:
+            f.write('%% Generated by tikz_export.py v %s \n' % (__version__))
+            f.write(write_materials(styles))
+        finally:
+            f.close()
+        materials = "\\input{%s}\n" % os.path.basename(matpath)
+        if profile is not None:
+            profile.add_time('materials', t0)
+    exported = set()
+    writer = FileWriter()
+    try:
+        for name, part in partitions:
+            partpath = partition_name(filepath, name)
+            state = ExportState(cache, profile)
+            state.styles = styles
+            state.materials = materials
+            if PLOT_FILE_POINTS and USE_PLOTPATH:
+                state.data_path = os.path.splitext(partpath)[0]
+            if CHUNK_SIZE or CHUNK_PATHS:
+                write_chunks(part, partpath, state)
+            else:
+                fragments = ['%% Generated by tikz_export.py v %s, partition %s\n'
+                             % (__version__, name)]
+                fragments.extend(iter_document(part, state))
+                writer.write(partpath, fragments)
+            exported.update([obj.name for obj in part.objects])
+            print "  %s: %d objects" % (os.path.basename(partpath), len(part.objects))
+    finally:
+        t0 = time.time()
+        writer.close()
+        if profile is not None:
+            profile.add_time('write', t0)
+    print "Code for %d partitions written to %s-*.tex" \
+          % (len(partitions), os.path.splitext(filepath)[0])
+    skipped = len(scene.objects) - len(exported)
+    if skipped:
+        print "%d objects not in any %s were skipped" % (skipped, PARTITION)
+    print "Object reuse: %d hits, %d misses" % (cache.hits, cache.misses)
+    cache.prune()
+    if profile is not None:
+        profilepath = os.path.splitext(filepath)[0] + tikz_profile.PROFILE_EXT
+        profile.save(profilepath)
+        print "Profile written to %s" % profilepath
+        for line in profile.summary():
+            print line
+    return True
+
+
+def parse_frames(value):
+    """Return the frame numbers of a FRAMES value as a list
+
+    value is a comma separated list of frames and first-last ranges. A
+    range can have a step, as in 1-24:2. Raises ValueError for invalid
+    values.
+    """
+    frames = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        numbers, sep, step = item.partition(':')
+        if sep:
+            step = int(step)
+        else:
+            step = 1
+        first, sep, last = numbers.partition('-')
+        first = int(first)
+        if sep:
+            last = int(last)
+        else:
+            last = first
+        if step < 1 or last < first:
+            raise ValueError("invalid frame range: %s" % item)
+        frames.extend(range(first, last + 1, step))
+    return frames
+
+
+def frame_name(filepath, frame):
+    """Return the path of the file with the given frame of filepath"""
+    return "%s-frame%04d.tex" % (os.path.splitext(filepath)[0], frame)
+
+
+def overlay_spec(numbers):
+    """Return a beamer overlay specification for a sorted list of numbers
+
+    Consecutive numbers are joined to ranges, [1, 2, 3, 5] gives 1-3,5.
+    """
+    ranges = []
+    for n in numbers:
+        if ranges and ranges[-1][1] == n - 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ",".join([first == last and str(first) or "%d-%d" % (first, last)
+                     for first, last in ranges])
+
+
+def overlay_code(frames):
+    """Return the path code for the frames of an overlay document as a list
+
+    frames is a list with a (prologue, objects) tuple for each frame, where
+    objects is a list of (name, code) tuples in draw order. If all frames
+    have the same prologue and the same objects in the same order, the code
+    of an object that is the same in all frames is written once, and
+    otherwise each version of it is wrapped in an \only command for the
+    frames it is used in. Else each frame is wrapped in an \only command.
+    """
+    prologues = set([prologue for prologue, objects in frames])
+    orders = set([tuple([name for name, code in objects])
+                  for prologue, objects in frames])
+    fragments = []
+    if len(prologues) == 1 and len(orders) == 1:
+        fragments.append(frames[0][0])
+        for i in range(len(frames[0][1])):
+            codes = []
+            numbers = {}
+            for n, (prologue, objects) in enumerate(frames):
+                code = objects[i][1]
+                if code not in numbers:
+                    numbers[code] = []
+                    codes.append(code)
+                numbers[code].append(n + 1)
+            if len(codes) == 1:
+                fragments.append(codes[0])
+                continue
+            for code in codes:
+                fragments.append("\\only<%s>{\n%s}\n"
+                                 % (overlay_spec(numbers[code]), code))
+    else:
+        for n, (prologue, objects) in enumerate(frames):
+            fragments.append("\\only<%d>{\n%s%s}\n"
+                             % (n + 1, prologue,
+                                "".join([code for name, code in objects])))
+    return fragments
+
+
+def write_frames(frames, filepath, profile=None):
+    """Write the code for the frames of an animation
+
+    frames is a sequence of (frame number, Scene) tuples. The frames are
+    exported in order with a shared tikz_cache.MemoryCache, so objects
+    that don't change between frames reuse the code generated for an
+    earlier frame. With FRAME_MODE 'files' each frame is written to its
+    own file, named by frame_name, by a FileWriter. With 'overlay' the
+    frames are written to filepath or the clipboard as a single document
+    with an overlay for each frame.
+    """
+    if FRAME_MODE == 'files' and CLIPBOARD_OUTPUT:
+        print "Frame files can't be copied to the clipboard"
+        return
+    if PROFILE and profile is None:
+        profile = tikz_profile.Profile()
+    if CLIPBOARD_OUTPUT:
+        cache = tikz_cache.MemoryCache(open_cache(None))
+    else:
+        cache = tikz_cache.MemoryCache(open_cache(filepath))
+    writer = None
+    if FRAME_MODE == 'files':
+        writer = FileWriter()
+    # The materials of all frames of an overlay document
+    styles = StyleTable()
+    overlay = []
+    count = 0
+    try:
+        for frame, scene in frames:
+            state = ExportState(cache, profile)
+            if PLOT_FILE_POINTS and USE_PLOTPATH and not CLIPBOARD_OUTPUT:
+                state.data_path = os.path.splitext(frame_name(filepath, frame))[0]
+            count += 1
+            if writer is not None:
+                fragments = ['%% Generated by tikz_export.py v %s, frame %d\n'
+                             % (__version__, frame)]
+                fragments.extend(iter_document(scene, state))
+                writer.write(frame_name(filepath, frame), fragments)
+                continue
+            state.styles = styles
+            # head has the materials of all frames so far
+            head, tail, prologue, ordered, empties_dict = \
+                begin_document(scene, state, True)
+            objects = []
+            for obj in ordered:
+                code = object_code(obj, empties_dict, state)
+                if code:
+                    objects.append((obj.name, code))
+            overlay.append(("".join(prologue), objects))
+    finally:
+        if writer is not None:
+            t0 = time.time()
+            writer.close()
+            if profile is not None:
+                profile.add_time('write', t0)
+    if not count:
+        print "No frames to export"
+        return
+    if writer is not None:
+        print "Code for %d frames written to %s-frame*.tex" \
+              % (count, os.path.splitext(filepath)[0])
+    else:
+        fragments = [head] + overlay_code(overlay) + [tail]
+        if CLIPBOARD_OUTPUT:
+            if not copy_to_clipboard("".join(fragments)):
+                print "Failed to copy code to the clipboard"
+        else:
+            f = file(filepath, 'w')
+            try:
+                f.write('%% Generated by tikz_export.py v %s \n' % (__version__))
+                write_fragments(f, fragments, profile=profile)
+            finally:
+                f.close()
+            print "Code for %d frames written to %s" % (count, filepath)
+    print "Object reuse: %d hits, %d misses" % (cache.hits, cache.misses)
+    cache.prune()
+    if profile is not None:
+        if not CLIPBOARD_OUTPUT:
+            profilepath = os.path.splitext(filepath)[0] + tikz_profile.PROFILE_EXT
+            profile.save(profilepath)
+            print "Profile written to %s" % profilepath
+        for line in profile.summary():
+            print line
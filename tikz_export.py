@@ -32,12 +32,34 @@ A dialog box will pop up with various options:<br>
     - Draw: Insert a draw operation in the generated path.<br>
     - Fill: Insert a fill operation in the generated path.<br>
     - Transform: Apply translation and scale transformations.<br>
+    - Depth: Draw order policy: origin, min, mean, max or layer.<br>
+    - Projection: Project through the scene camera: none, camera, ortho or persp.<br>
+    - Clip: Only export what is inside a rectangle: none, scene or camera.<br>
+    - Simplify: Simplify curves within the given tolerance. 0 disables.<br>
+    - Primitives: Export circles, ellipses, arcs and rectangles as TikZ operations.<br>
+    - Instances: Define curves shared by several objects once.<br>
+    - Scopes: Move styles shared by consecutive paths to scopes.<br>
+    - Meshes: Export meshes: off, edges or faces.<br>
+    - Cull backfaces: Skip mesh faces facing away from the viewer.<br>
+    - Precision: Number of decimals in coordinates. -1 selects it automatically.<br>
+    - Compact: Remove trailing zeros and plus signs from coordinates.<br>
+    - Relative: Use relative coordinates for polylines and bezier knots.<br>
+    - Plot files: Write plot paths with more points to .table files. 0 disables.<br>
     - Materials: Export materials assigned to curves.<br>
     - Empties: Export empties as named coordinates.<br>
     - Only properties: Use on the style property of materials if set.<br>
     - Standalone: Create a standalone document.<br>
     - Only code: Generate only code for drawing paths.<br>
     - Clipboard: Copy generated code to the clipboard. <br>
+    - Save scene: Save a scene description for exporting without Blender.<br>
+    - Cache: Directory for caching the code of unchanged objects. Empty disables.<br>
+    - Cache MB: Maximum size of the cache.<br>
+    - Profile: Write a profiling report next to the generated file.<br>
+    - Chunk kB: Split the path code into files of at most this size. 0 disables.<br>
+    - Chunk paths: Split the path code into files with at most this many objects. 0 disables.<br>
+    - Frames: Export a range of animation frames, e.g. 1-24 or 1-24:2. Empty disables.<br>
+    - Frame mode: Write the frames to separate files or to a single overlay document.<br>
+    - Partition: Write each group or layer to its own file: off, group or layer.<br>
 
 Properties:
 
@@ -58,71 +80,39 @@ You can use the Help->Property ID browser to set this value.
 
 Issues:<br>
 
-- Only bezier and polyline curves are supported.<br>
+- NURBS curves are converted to bezier curves, approximately for orders above 4.<br>
 - A full Python install is required for clipboard support on Windows. Other platforms
 need the standard subprocess module (requires Python 2.4 or later). Additionally:<br>
     * Windows users need to install the PyWin32 module.<br>
     * Unix-like users need the xclip command line tool or the PyGTK_ module installed.<br>
     * OS X users need the pbcopy command line tool installed.<br>
 
-[1] Requires you to put the script in Blender's scripts folder. Blender will
-then automatically detect the script.
+[1] Requires you to put the script and the tikz_*.py helper modules in
+Blender's scripts folder. Blender will then automatically detect the script.
 """
 
-import Blender
-from Blender import sys as bsys
-from itertools import izip
-import itertools, math
-from Blender import Mesh, Mathutils, Registry, Scene, Material, Group
-from textwrap import wrap
-
-from string import Template
-
-# Curve types
-TYPE_POLY = 0
-TYPE_BEZIER = 1
-TYPE_NURBS = 4
-
-R2D = 180.0 / math.pi
-
-# Start of configuration section -------
-
-# Templates
-standalone_template = r"""
-\documentclass{article}
-\usepackage{tikz}
-%(preamble)s
-%(materials)s
-\begin{document}
-\begin{tikzpicture}
-%(pathcode)s
-\end{tikzpicture}
-\end{document}
-"""
-
-fig_template = r"""
-%(materials)s
-\begin{tikzpicture}
-%(pathcode)s
-\end{tikzpicture}
-"""
+import os
+import sys
+import time
+try:
+    import tikz_core
+except ImportError:
+    # Running in Blender. The tikz_*.py helper modules are installed next
+    # to this script in one of Blender's scripts folders.
+    import Blender
+    for scriptsdir in (Blender.Get('scriptsdir'), Blender.Get('uscriptsdir')):
+        if scriptsdir and scriptsdir not in sys.path:
+            sys.path.append(scriptsdir)
+    import tikz_core
+import tikz_scene
+import tikz_profile
+
+# The Blender modules are imported by the functions that use them, so
+# importing this module has no side effects and doesn't need Blender.
+# The export itself is done by tikz_core.
 
 REG_KEY = 'tikz_export'
 
-# config options:
-
-STANDALONE = True
-CODE_ONLY = False
-DRAW_CURVE = True
-FILL_CLOSED_CURVE = True
-TRANSFORM_CURVE = True
-CLIPBOARD_OUTPUT = False
-EMPTIES = True
-EXPORT_MATERIALS = False
-ONLY_PROPERTIES = False
-USE_PLOTPATH = False
-WRAP_LINES = True
-
 tooltips = {
     'STANDALONE': 'Output a standalone document',
     'DRAW_CURVE':
@@ -143,71 +133,114 @@ tooltips = {
         'Use the plot path operations for polylines',
     'WRAP_LINES':
         'Wrap long lines',
+    'SAVE_SCENE':
+        'Save a scene description for exporting without Blender',
+    'DEPTH_POLICY':
+        'Draw order: origin, min, mean or max point Z, or layer property',
+    'SIMPLIFY_TOLERANCE':
+        'Simplify curves within this tolerance (0 = off)',
+    'PRECISION':
+        'Number of decimals in coordinates (-1 = automatic)',
+    'COMPACT_COORDS':
+        'Remove trailing zeros and plus signs from coordinates',
+    'RELATIVE_COORDS':
+        'Use relative coordinates for polylines and bezier knots',
+    'CACHE_DIR':
+        'Cache the code for unchanged objects in this directory (empty = off)',
+    'CACHE_SIZE':
+        'Maximum size of the object cache in MB',
+    'INSTANCES':
+        'Define curves shared by several objects once and reuse them',
+    'PROFILE':
+        'Write a profiling report next to the output file',
+    'MESH_MODE':
+        'Export meshes: off, edges or faces',
+    'MESH_CULL':
+        'Remove mesh faces facing away from the viewer',
+    'PROJECTION':
+        'Projection: none (drop Z), camera, ortho or persp',
+    'CLIP':
+        'Only export what is inside: none, scene (clip property) or camera frame',
+    'PLOT_FILE_POINTS':
+        'Write plot paths with more points to .table files (0 = off)',
+    'CHUNK_SIZE':
+        'Split the path code into files of at most this many kB (0 = off)',
+    'CHUNK_PATHS':
+        'Split the path code into files with at most this many objects (0 = off)',
+    'SCOPES':
+        'Move styles shared by consecutive paths to scopes',
+    'PRIMITIVES':
+        'Export curves that are circles, ellipses, arcs or rectangles as such',
+    'FRAMES':
+        'Export these animation frames, e.g. 1-24 or 1-24:2 (empty = current frame)',
+    'FRAME_MODE':
+        'Write the frames to separate files or to a single overlay document',
+    'PARTITION':
+        'Write each group or layer to its own file: off, group or layer',
 }
 
 
 def update_registry():
-    d = {
-        'STANDALONE': STANDALONE,
-        'DRAW_CURVE': DRAW_CURVE,
-        'FILL_CLOSED_CURVE': FILL_CLOSED_CURVE,
-        'TRANSFORM_CURVE': TRANSFORM_CURVE,
-        'CLIPBOARD_OUTPUT': CLIPBOARD_OUTPUT,
-        'CODE_ONLY': CODE_ONLY,
-        'EMPTIES': EMPTIES,
-        'EXPORT_MATERIALS': EXPORT_MATERIALS,
-        'ONLY_PROPERTIES': ONLY_PROPERTIES,
-        'USE_PLOTPATH': USE_PLOTPATH,
-        'WRAP_LINES': WRAP_LINES,
-    }
-    Registry.SetKey(REG_KEY, d, True)
-
-# Looking for a saved key in Blender.Registry dict:
-rd = Registry.GetKey(REG_KEY, True)
-
-if rd:
-    try:
-        STANDALONE = rd['STANDALONE']
-        DRAW_CURVE = rd['DRAW_CURVE']
-        FILL_CLOSED_CURVE = rd['FILL_CLOSED_CURVE']
-        TRANSFORM_CURVE = rd['TRANSFORM_CURVE']
-        CLIPBOARD_OUTPUT = rd['CLIPBOARD_OUTPUT']
-        CODE_ONLY = rd['CODE_ONLY']
-        EMPTIES = rd['EMPTIES']
-        EXPORT_MATERIALS = rd['EXPORT_MATERIALS']
-        ONLY_PROPERTIES = rd['ONLY_PROPERTIES']
-        USE_PLOTPATH = rd['USE_PLOTPATH']
-        WRAP_LINES = rd['WRAP_LINES']
-    except KeyError:
-        print "Keyerror"
+    """Save the export options in Blender's registry"""
+    from Blender import Registry
+    Registry.SetKey(REG_KEY, tikz_core.get_options(), True)
+
+
+def load_registry():
+    """Set the export options saved in Blender's registry"""
+    from Blender import Registry
+    rd = Registry.GetKey(REG_KEY, True)
+    if rd:
+        tikz_core.set_options(dict([(name, value) for name, value in rd.items()
+                                    if name in tikz_core.OPTIONS]))
+        if [name for name in tikz_core.OPTIONS if name not in rd]:
+            # Options added since the key was saved
+            update_registry()
+    else:
+        print "update registry"
         update_registry()
-else:
-    print "update registry"
-    update_registry()
 
-# Start of GUI section ------------------------------------------------
-
-from Blender import Draw
 
+# Start of GUI section ------------------------------------------------
 
 def draw_GUI():
-    global STANDALONE, DRAW_CURVE, FILL_CLOSED_CURVE, TRANSFORM_CURVE
-    global CLIPBOARD_OUTPUT, CODE_ONLY, EMPTIES, EXPORT_MATERIALS
-    global ONLY_PROPERTIES
-    global USE_PLOTPATH
-    global WRAP_LINES
-
-    standalonetog = Draw.Create(STANDALONE)
-    codeonlytog = Draw.Create(CODE_ONLY)
-    drawcurvetog = Draw.Create(DRAW_CURVE)
-    fillcurvetog = Draw.Create(FILL_CLOSED_CURVE)
-    transformcurvetog = Draw.Create(TRANSFORM_CURVE)
-    clipboardtog = Draw.Create(CLIPBOARD_OUTPUT)
-    emptiestog = Draw.Create(EMPTIES)
-    materialstog = Draw.Create(EXPORT_MATERIALS)
-    onlyproptog = Draw.Create(ONLY_PROPERTIES)
-    useplotpathtog = Draw.Create(USE_PLOTPATH)
-    wraplinestog = Draw.Create(WRAP_LINES)
+    """Show the options dialog. Returns true if the options were accepted."""
+    from Blender import Draw
+    options = tikz_core.get_options()
+
+    standalonetog = Draw.Create(options['STANDALONE'])
+    codeonlytog = Draw.Create(options['CODE_ONLY'])
+    drawcurvetog = Draw.Create(options['DRAW_CURVE'])
+    fillcurvetog = Draw.Create(options['FILL_CLOSED_CURVE'])
+    transformcurvetog = Draw.Create(options['TRANSFORM_CURVE'])
+    clipboardtog = Draw.Create(options['CLIPBOARD_OUTPUT'])
+    emptiestog = Draw.Create(options['EMPTIES'])
+    materialstog = Draw.Create(options['EXPORT_MATERIALS'])
+    onlyproptog = Draw.Create(options['ONLY_PROPERTIES'])
+    useplotpathtog = Draw.Create(options['USE_PLOTPATH'])
+    plotfilenum = Draw.Create(int(options['PLOT_FILE_POINTS']))
+    wraplinestog = Draw.Create(options['WRAP_LINES'])
+    savescenetog = Draw.Create(options['SAVE_SCENE'])
+    depthpolicystr = Draw.Create(options['DEPTH_POLICY'])
+    simplifynum = Draw.Create(float(options['SIMPLIFY_TOLERANCE']))
+    primitivestog = Draw.Create(options['PRIMITIVES'])
+    instancestog = Draw.Create(options['INSTANCES'])
+    scopestog = Draw.Create(options['SCOPES'])
+    meshmodestr = Draw.Create(options['MESH_MODE'])
+    meshculltog = Draw.Create(options['MESH_CULL'])
+    projectionstr = Draw.Create(options['PROJECTION'])
+    clipstr = Draw.Create(options['CLIP'])
+    precisionnum = Draw.Create(int(options['PRECISION']))
+    compacttog = Draw.Create(options['COMPACT_COORDS'])
+    relativetog = Draw.Create(options['RELATIVE_COORDS'])
+    cachedirstr = Draw.Create(options['CACHE_DIR'])
+    cachesizenum = Draw.Create(int(options['CACHE_SIZE']))
+    profiletog = Draw.Create(options['PROFILE'])
+    chunksizenum = Draw.Create(int(options['CHUNK_SIZE']))
+    chunkpathsnum = Draw.Create(int(options['CHUNK_PATHS']))
+    framesstr = Draw.Create(options['FRAMES'])
+    framemodestr = Draw.Create(options['FRAME_MODE'])
+    partitionstr = Draw.Create(options['PARTITION'])
     block = []
 
     #block.append("Export:")
@@ -215,6 +248,16 @@ def draw_GUI():
     block.append(("Fill", fillcurvetog, tooltips['FILL_CLOSED_CURVE']))
     block.append(("Transform", transformcurvetog, tooltips['TRANSFORM_CURVE']))
     block.append(("Use plot path", useplotpathtog, tooltips['USE_PLOTPATH']))
+    block.append(("Plot files: ", plotfilenum, 0, 1000000, tooltips['PLOT_FILE_POINTS']))
+    block.append(("Depth: ", depthpolicystr, 0, 10, tooltips['DEPTH_POLICY']))
+    block.append(("Projection: ", projectionstr, 0, 10, tooltips['PROJECTION']))
+    block.append(("Clip: ", clipstr, 0, 10, tooltips['CLIP']))
+    block.append(("Simplify: ", simplifynum, 0.0, 10.0, tooltips['SIMPLIFY_TOLERANCE']))
+    block.append(("Primitives", primitivestog, tooltips['PRIMITIVES']))
+    block.append(("Instances", instancestog, tooltips['INSTANCES']))
+    block.append(("Scopes", scopestog, tooltips['SCOPES']))
+    block.append(("Meshes: ", meshmodestr, 0, 10, tooltips['MESH_MODE']))
+    block.append(("Cull backfaces", meshculltog, tooltips['MESH_CULL']))
 
     block.append("Export:")
     block.append(("Materials", materialstog, tooltips['EXPORT_MATERIALS']))
@@ -226,425 +269,309 @@ def draw_GUI():
     block.append(("Only code", codeonlytog, tooltips['CODE_ONLY']))
     block.append(("Clipboard", clipboardtog, tooltips['CLIPBOARD_OUTPUT']))
     block.append(("Wrap lines", wraplinestog, tooltips['WRAP_LINES']))
-
-    retval = Blender.Draw.PupBlock("Blend2TikZ options", block)
+    block.append(("Precision: ", precisionnum, -1, 8, tooltips['PRECISION']))
+    block.append(("Compact", compacttog, tooltips['COMPACT_COORDS']))
+    block.append(("Relative", relativetog, tooltips['RELATIVE_COORDS']))
+    block.append(("Save scene", savescenetog, tooltips['SAVE_SCENE']))
+    block.append(("Cache: ", cachedirstr, 0, 200, tooltips['CACHE_DIR']))
+    block.append(("Cache MB: ", cachesizenum, 1, 4096, tooltips['CACHE_SIZE']))
+    block.append(("Profile", profiletog, tooltips['PROFILE']))
+    block.append(("Chunk kB: ", chunksizenum, 0, 1000000, tooltips['CHUNK_SIZE']))
+    block.append(("Chunk paths: ", chunkpathsnum, 0, 1000000, tooltips['CHUNK_PATHS']))
+    block.append(("Frames: ", framesstr, 0, 100, tooltips['FRAMES']))
+    block.append(("Frame mode: ", framemodestr, 0, 10, tooltips['FRAME_MODE']))
+    block.append(("Partition: ", partitionstr, 0, 10, tooltips['PARTITION']))
+
+    retval = Draw.PupBlock("Blend2TikZ options", block)
     if retval:
         # set options
-        STANDALONE = standalonetog.val
-        DRAW_CURVE = drawcurvetog.val
-        FILL_CLOSED_CURVE = fillcurvetog.val
-        TRANSFORM_CURVE = transformcurvetog.val
-        CLIPBOARD_OUTPUT = clipboardtog.val
-        CODE_ONLY = codeonlytog.val
-        EMPTIES = emptiestog.val
-        EXPORT_MATERIALS = materialstog.val
-        ONLY_PROPERTIES = onlyproptog.val
-        USE_PLOTPATH = useplotpathtog.val
-        WRAP_LINES = wraplinestog.val
+        options['STANDALONE'] = standalonetog.val
+        options['DRAW_CURVE'] = drawcurvetog.val
+        options['FILL_CLOSED_CURVE'] = fillcurvetog.val
+        options['TRANSFORM_CURVE'] = transformcurvetog.val
+        options['CLIPBOARD_OUTPUT'] = clipboardtog.val
+        options['CODE_ONLY'] = codeonlytog.val
+        options['EMPTIES'] = emptiestog.val
+        options['EXPORT_MATERIALS'] = materialstog.val
+        options['ONLY_PROPERTIES'] = onlyproptog.val
+        options['USE_PLOTPATH'] = useplotpathtog.val
+        options['PLOT_FILE_POINTS'] = plotfilenum.val
+        options['WRAP_LINES'] = wraplinestog.val
+        options['SAVE_SCENE'] = savescenetog.val
+        if depthpolicystr.val in tikz_core.DEPTH_POLICIES:
+            options['DEPTH_POLICY'] = depthpolicystr.val
+        options['SIMPLIFY_TOLERANCE'] = simplifynum.val
+        options['PRIMITIVES'] = primitivestog.val
+        options['INSTANCES'] = instancestog.val
+        options['SCOPES'] = scopestog.val
+        if meshmodestr.val in tikz_core.MESH_MODES:
+            options['MESH_MODE'] = meshmodestr.val
+        options['MESH_CULL'] = meshculltog.val
+        if projectionstr.val in tikz_core.PROJECTIONS:
+            options['PROJECTION'] = projectionstr.val
+        if clipstr.val in tikz_core.CLIPS:
+            options['CLIP'] = clipstr.val
+        options['PRECISION'] = precisionnum.val
+        options['COMPACT_COORDS'] = compacttog.val
+        options['RELATIVE_COORDS'] = relativetog.val
+        options['CACHE_DIR'] = cachedirstr.val
+        options['CACHE_SIZE'] = cachesizenum.val
+        options['PROFILE'] = profiletog.val
+        options['CHUNK_SIZE'] = chunksizenum.val
+        options['CHUNK_PATHS'] = chunkpathsnum.val
+        options['FRAMES'] = framesstr.val
+        if framemodestr.val in tikz_core.FRAME_MODES:
+            options['FRAME_MODE'] = framemodestr.val
+        if partitionstr.val in tikz_core.PARTITIONS:
+            options['PARTITION'] = partitionstr.val
+        tikz_core.set_options(options)
         update_registry()
     return retval
 
-
 # End of GUI section ----------------------
 
-# End of configuration section ---------
-X = 0
-Y = 1
-
-used_materials = {}
 
-# Utility functions
+# Start of Blender section --------------------------------------------
+#
+# Conversion of Blender objects to the scene description in tikz_scene.
 
-def nsplit(seq, n=2):
-    """Split a sequence into pieces of length n
 
-    If the lengt of the sequence isn't a multiple of n, the rest is discareded.
-    Note that nsplit will strings into individual characters.
+def dump_properties(props):
+    """Return the ID properties with simple values as a dict"""
+    d = {}
+    try:
+        for key in props.keys():
+            value = props[key]
+            if isinstance(value, (basestring, int, float)):
+                d[key] = value
+    except:
+        pass
+    return d
 
-    Examples:
-    >>> nsplit('aabbcc')
-    [('a', 'a'), ('b', 'b'), ('c', 'c')]
-    >>> nsplit('aabbcc',n=3)
-    [('a', 'a', 'b'), ('b', 'c', 'c')]
 
-    # Note that cc is discarded
-    >>> nsplit('aabbcc',n=4)
-    [('a', 'a', 'b', 'b')]
-    """
-    return [xy for xy in izip(*[iter(seq)] * n)]
+def dump_game_properties(obj):
+    """Return the non-empty string game properties of obj as a dict"""
+    d = {}
+    try:
+        for prop in obj.getAllProperties():
+            if prop.type == "STRING" and prop.data.strip():
+                d[prop.name] = prop.data
+    except:
+        pass
+    return d
 
 
-def mreplace(s, chararray, newchararray):
-    for a, b in zip(chararray, newchararray):
-        s = s.replace(a, b)
-    return s
+def dump_material(material):
+    """Convert a Blender material"""
+    return tikz_scene.Material(material.name, material.rgbCol, material.alpha,
+                               dump_properties(material.properties))
 
 
-def tikzify(s):
-    if s.strip():
-        return mreplace(s, r'\,:.', '-+_*')
+def dump_nurb(curnurb):
+    """Convert a Blender CurNurb"""
+    if curnurb.type == tikz_scene.TYPE_BEZIER:
+        points = []
+        for point in curnurb:
+            h1, knot, h2 = point.vec
+            points.append(list(h1[:3]) + list(knot[:3]) + list(h2[:3]))
     else:
-        return ""
+        points = [list(point[:4]) for point in curnurb]
+    return tikz_scene.Nurb(curnurb.type, points, bool(curnurb.isCyclic()),
+                           getattr(curnurb, 'orderU', 4),
+                           getattr(curnurb, 'flagU', 0))
 
 
-def copy_to_clipboard(text):
-    """Copy text to the clipboard
+def dump_first_material(mats, materials):
+    """Convert the first material in mats, or return None
 
-    Returns True if successful. False otherwise.
-
-    Works on Windows, *nix and Mac. Tries the following:
-    1. Use the win32clipboard module from the win32 package.
-    2. Calls the xclip command line tool (*nix)
-    3. Calls the pbcopy command line tool (Mac)
-    4. Try pygtk
+    materials is a dict with the materials converted so far.
     """
-    # try windows first
-    try:
-        import win32clipboard
+    for mat in mats:
+        if mat:
+            if mat.name not in materials:
+                materials[mat.name] = dump_material(mat)
+            return materials[mat.name]
+    return None
 
-        win32clipboard.OpenClipboard()
-        win32clipboard.EmptyClipboard()
-        win32clipboard.SetClipboardText(text)
-        win32clipboard.CloseClipboard()
-        return True
-    except:
-        pass
-    # try xclip
-    try:
-        import subprocess
 
-        p = subprocess.Popen(['xclip', '-selection', 'c'], stdin=subprocess.PIPE)
-        p.stdin.write(text)
-        p.stdin.close()
-        retcode = p.wait()
-        return True
-    except:
-        pass
-    # try pbcopy (Os X)
-    try:
-        import subprocess
+def dump_mesh(obj):
+    """Convert the mesh data of a Blender object"""
+    mesh = obj.getData(mesh=True)
+    verts = [list(v.co[:3]) for v in mesh.verts]
+    faces = [[v.index for v in face.v] for face in mesh.faces]
+    edges = [(edge.v1.index, edge.v2.index) for edge in mesh.edges]
+    return tikz_scene.MeshData(verts, faces, edges), mesh
 
-        p = subprocess.Popen(['pbcopy'], stdin=subprocess.PIPE)
-        p.stdin.write(text)
-        p.stdin.close()
-        retcode = p.wait()
-        return True
-    except:
-        pass
-    # try os /linux
-    try:
-        import subprocess
 
-        p = subprocess.Popen(['xsel'], stdin=subprocess.PIPE)
-        p.stdin.write(text)
-        p.stdin.close()
-        retcode = p.wait()
-        return True
-    except:
-        pass
-    # try pygtk
-    try:
-        # Code from
-        # http://www.vector-seven.com/2007/06/27/
-        #    passing-data-between-gtk-applications-with-gtkclipboard/
-        import pygtk
-
-        pygtk.require('2.0')
-        import gtk
-        # get the clipboard
-        clipboard = gtk.clipboard_get()
-        # set the clipboard text data
-        clipboard.set_text(text)
-        # make our data available to other applications
-        clipboard.store()
-    except:
-        return False
+def dump_groups():
+    """Return a dict with the names of the groups of each object
+
+    The dict is keyed by the object's name.
+    """
+    from Blender import Group
+    groups = {}
+    for group in Group.Get():
+        for obj in group.objects:
+            if obj.name in groups:
+                groups[obj.name].append(group.name)
+            else:
+                groups[obj.name] = [group.name]
+    return groups
+
 
+def dump_object(obj, materials, groups):
+    """Convert a Blender object
 
-def get_property(obj, name):
-    """Get named object property
-    
-    Looks first in custom properties, then game properties. Returns a list.
+    materials is a dict with the materials converted so far, and groups
+    the dict returned by dump_groups.
     """
-    prop_value = []
+    if obj.parent:
+        parent = obj.parent.name
+    else:
+        parent = None
+    matrix = [list(obj.matrixWorld[i]) for i in range(4)]
+    scnobj = tikz_scene.Object(obj.name, obj.type, matrix, parent,
+                               properties=dump_properties(obj.properties),
+                               game_properties=dump_game_properties(obj),
+                               groups=groups.get(obj.name), layers=obj.layers)
+    if obj.type == 'Curve':
+        curvedata = obj.data
+        scnobj.data_name = curvedata.name
+        scnobj.nurbs = [dump_nurb(curnurb) for curnurb in curvedata]
+        try:
+            mats = curvedata.getMaterials()
+        except:
+            mats = []
+        # pick first material
+        scnobj.material = dump_first_material(mats, materials)
+    elif obj.type == 'Mesh':
+        scnobj.mesh, meshdata = dump_mesh(obj)
+        scnobj.data_name = meshdata.name
+        scnobj.material = dump_first_material(meshdata.materials, materials)
+    return scnobj
+
+
+def dump_camera(scn):
+    """Convert the active camera of a Blender scene, or return None"""
     try:
-        prop_value.append(obj.properties[name])
-    except:
-        pass
+        camobj = scn.objects.camera
+    except AttributeError:
+        camobj = scn.getCurrentCamera()
+    if not camobj:
+        return None
+    cam = camobj.getData()
+    matrix = [list(camobj.matrixWorld[i]) for i in range(4)]
+    aspect = 1.0
     try:
-        # look for game properties
-        prop = obj.getProperty(name)
-        if prop.type == "STRING" and prop.data.strip():
-            prop_value.append(prop.data)
-    except:
+        context = scn.getRenderingContext()
+        aspect = float(context.imageSizeX()) / context.imageSizeY()
+    except (AttributeError, ZeroDivisionError):
         pass
-    return prop_value
-
-
-def get_material(material):
-    """Convert material to TikZ options"""
-    if not material:
-        return ""
-    opts = ""
-    mat_name = tikzify(material.name)
-    used_materials[mat_name] = material
-    return mat_name
-
-
-def write_materials(used_materials):
-    """Return code for the used materials"""
-    c = "% Materials section \n"
-    for material in used_materials.values():
-        mat_name = tikzify(material.name)
-        matopts = ''
-        proponly = ONLY_PROPERTIES
-        try:
-            proponly = material.properties['onlyproperties']
-            if proponly and type(proponly) == str:
-                proponly = proponly.lower() not in ('0', 'false')
-        except:
-            pass
-        try:
-            matopts = material.properties['style']
-        except:
-            pass
-
-        rgb = material.rgbCol
-        spec = material.specCol
-        alpha = material.alpha
-        flags = material.getMode()
-        options = []
-
-        if not (proponly and matopts):
-            c += "\\definecolor{%s_col}{rgb}{%s,%s,%s}\n" \
-                 % tuple([mat_name] + rgb)
-            options.append('%s_col' % mat_name)
-            if alpha < 1.0:
-                options.append('opacity=%s' % alpha)
-        if matopts:
-            options += [matopts]
-        c += "\\tikzstyle{%s}= [%s]\n" % (mat_name, ",".join(options))
-    return c
-
-
-def write_object(obj, empties):
-    """Write Curves"""
-    s = ""
-    name = obj.name
-    prop = obj.properties
-
-    mtrx = obj.matrix.rotationPart()
-    x, y, z = obj.getLocation('worldspace')
-    rot = obj.getEuler('worldspace')
-    scale_x, scale_y, scale_z = obj.matrix.scalePart()
-
-    # Convert to degrees
-    rot_z = rot.z * R2D
-    if obj.type not in ["Curve", "Empty"]:
-        return s
-
-    ps = ""
-    if obj.type == 'Curve':
-        curvedata = obj.data
-        s += "%% %s\n" % name
-        for curnurb in curvedata:
-            if curnurb.type == TYPE_BEZIER:
-                knots = []
-                handles = []
-                # Build lists of knots and handles
-                for point in curnurb:
-                    h1, knot, h2 = point.vec
-                    handles.extend([h1, h2])
-                    knots.append("(+%.4f,+%.4f)" % (knot[X], knot[Y]))
-
-                if curnurb.isCyclic():
-                    # The curve is closed.
-                    # Move the first handle to the end of the handles list.
-                    handles = handles[1:] + [handles[0]]
-                    # Repeat the first knot at the end of the knot list
-                    knots.append(knots[0])
-                else:
-                    # We don't need the first and last handles since the curve is
-                    # not closed. 
-                    handles = handles[1:-1]
-                hh = []
-                for h1, h2 in nsplit(handles, 2):
-                    hh.append("controls (+%.4f,+%.4f) and (+%.4f,+%.4f)" \
-                              % (h1[X], h1[Y], h2[X], h2[Y]))
-
-                ps += "%s\n" % knots[0]
-                for h, k in zip(hh, knots[1:]):
-                    ps += "  .. %s .. %s\n" % (h, k)
-                if curnurb.isCyclic():
-                    ps += "  -- cycle\n"
-            elif curnurb.type == TYPE_POLY:
-                coords = ["(+%.4f,+%.4f)" % (point[X], point[Y]) for point in curnurb]
-
-                if USE_PLOTPATH:
-                    plotopts = get_property(obj, 'plotstyle')
-                    if plotopts:
-                        poptstr = "[%s]" % ",".join(plotopts)
-                    else:
-                        poptstr = ''
-                    ps += " plot%s coordinates {%s}" % (poptstr, " ".join(coords))
-                    if curnurb.isCyclic():
-                        ps += " -- cycle"
-                    if WRAP_LINES:
-                        ps = "\n".join(wrap(ps, 80, subsequent_indent="  ", break_long_words=False))
-
-                else:
-                    if curnurb.isCyclic():
-                        coords.extend([coords[0], 'cycle\n  '])
-                    # Join the coordinates. Could have used "--".join(coords), but
-                    # have to add some logic for pretty printing.
-                    if WRAP_LINES:
-                        ps += "%s\n  " % coords[0]
-                        i = 0
-                        for c in coords[1:]:
-                            i += 1
-                            if i % 3:
-                                ps += "-- %s" % c
-                            else:
-                                ps += "  -- %s\n  " % c
-                    else:
-                        ps += "%s" % " -- ".join(coords)
-            else:
-                continue
-
-        if not ps:
-            return s
-        options = []
-        if DRAW_CURVE:
-            options += ['draw']
-        if FILL_CLOSED_CURVE:
-            if ps.find('cycle') > 0:
-                options += ['fill']
-        if TRANSFORM_CURVE:
-            if x <> 0: options.append('xshift=%.4fcm' % x)
-            if y <> 0: options.append('yshift=%.4fcm' % y)
-            if rot_z <> 0: options.append('rotate=%.4f' % rot_z)
-            if scale_x <> 1: options += ['xscale=%.4f' % scale_x]
-            if scale_y <> 1: options += ['yscale=%.4f' % scale_y]
-        if EXPORT_MATERIALS:
-            try:
-                materials = obj.data.getMaterials()
-            except:
-                materials = []
-            if materials:
-                # pick first material
-                for mat in materials:
-                    if mat:
-                        matopts = get_material(mat)
-                        options.append(matopts)
-                        break
-        extraopts = get_property(obj, 'style')
-        if extraopts:
-            options.extend(extraopts)
-
-        optstr = ",".join(options)
-        emptstr = ""
-        if EMPTIES:
-            if obj in empties:
-                for empty in empties[obj]:
-                    # Get correct coordinate relative to the parent
-                    if TRANSFORM_CURVE:
-                        ex, ey, ez = (empty.mat * (obj.mat.copy()).invert()).translationPart()
-                    else:
-                        ex, ey, ez = (empty.matrix - obj.matrix).translationPart()
-                    emptstr += "  (+%.4f,+%.4f) coordinate (%s)\n" \
-                               % (ex, ey, empty.name)
-
-        if not WRAP_LINES:
-            ps = ' '.join(ps.replace('\n', ' ').split())
-        if len(optstr) > 50 or emptstr:
-            s += "\\path[%s]\n%s  %s;\n" % (optstr, emptstr, ps.rstrip())
-        else:
-            s += "\\path[%s] %s;\n" % (optstr, ps.rstrip())
-    elif obj.type == 'Empty' and EMPTIES and not obj.parent:
-        x, y, z = obj.loc
-        s += "\\coordinate (%s) at (%.4f,%.4f);\n" % (tikzify(obj.name), x, y)
-
-    return s
+    return tikz_scene.Camera(camobj.name, matrix, cam.type, cam.lens, cam.scale,
+                             aspect)
+
+
+def dump_scene(objects, scn):
+    """Convert Blender objects to a tikz_scene.Scene"""
+    materials = {}
+    types = ["Curve", "Empty"]
+    if tikz_core.MESH_MODE != 'off':
+        types.append("Mesh")
+    groups = dump_groups()
+    scnobjects = [dump_object(obj, materials, groups) for obj in objects
+                  if obj.type in types]
+    camera = None
+    if tikz_core.PROJECTION != 'none' or tikz_core.CLIP == 'camera':
+        camera = dump_camera(scn)
+    return tikz_scene.Scene(scnobjects, dump_properties(scn.properties), camera)
+
+
+def iter_frames(objects, scn, frames, filepath, profile=None):
+    """Generate a (frame, Scene) tuple for each frame number in frames
+
+    The timeline is walked once, converting the objects at each frame, and
+    the current frame is restored at the end. With SAVE_SCENE each scene is
+    saved next to the file for its frame.
+    """
+    import Blender
+    current = Blender.Get('curframe')
+    try:
+        for frame in frames:
+            t0 = time.time()
+            Blender.Set('curframe', frame)
+            scene = dump_scene(objects, scn)
+            if profile is not None:
+                profile.add_time('collect', t0)
+            if tikz_core.SAVE_SCENE:
+                scenepath = os.path.splitext(tikz_core.frame_name(filepath, frame))[0] \
+                            + tikz_scene.SCENE_EXT
+                tikz_scene.save(scene, scenepath)
+                print "Scene saved to %s" % scenepath
+            yield frame, scene
+    finally:
+        Blender.Set('curframe', current)
 
 
 def write_objects(filepath):
-    """Write all selected objects to filepath"""
-
-    def z_comp(a, b):
-        x, y, z1 = a.getLocation('worldspace')
-        x, y, z2 = b.getLocation('worldspace')
-        return cmp(z1, z2)
+    """Write all selected objects to filepath
 
+    With FRAMES set the given frames of the animation are exported.
+    """
+    import Blender
+    if tikz_core.PROFILE:
+        profile = tikz_profile.Profile()
+    else:
+        profile = None
+    t0 = time.time()
     # get all selected objects
     objects = Blender.Object.GetSelected()
     # get current scene
     scn = Blender.Scene.GetCurrent()
-    # iterate over each object
-    code = ""
-    # Find all empties with parents
-    empties_wp = [obj for obj in objects if obj.type == 'Empty' and obj.parent]
-    empties_dict = {}
-    for empty in empties_wp:
-        if empty.parent in empties_dict:
-            empties_dict[empty.parent] += [empty]
-        else:
-            empties_dict[empty.parent] = [empty]
-
-    for obj in sorted(objects, z_comp):
-        code += write_object(obj, empties_dict)
-    s = ""
-    if EXPORT_MATERIALS:
-        matcode = write_materials(used_materials)
-    else:
-        matcode = ""
 
-    try:
-        preamblecode = scn.properties['preamble']
-    except:
-        preamblecode = ''
-    templatevars = dict(pathcode=code, preamble=preamblecode, materials=matcode)
-    if STANDALONE:
-        extra = ""
+    if tikz_core.FRAMES:
         try:
-            preambleopt = scn.properties['preamble']
-            templatevars['preamble'] = str(preambleopt)
-        except:
-            pass
-        template = standalone_template
-
-    elif CODE_ONLY:
-        template = "%(pathcode)s"
-    else:
-        template = fig_template
-
-    s = template % templatevars
-    if not CLIPBOARD_OUTPUT:
-        try:
-            f = file(filepath, 'w')
-            # write header to file
-            f.write('%% Generated by tikz_export.py v %s \n' % (__version__))
-            f.write(s)
-            print "Code written to %s" % filepath
-        finally:
-            f.close()
+            frames = tikz_core.parse_frames(tikz_core.FRAMES)
+        except ValueError, e:
+            print "Invalid frames: %s" % e
+            Blender.Draw.PupMenu('ERROR: Invalid frame range')
+            return
+        tikz_core.write_frames(iter_frames(objects, scn, frames, filepath, profile),
+                               filepath, profile)
         return
-    else:
-        success = copy_to_clipboard(s)
-        if not success:
-            print "Failed to copy code to the clipboard"
-            print "Pywin32, xclip, cbcopy or pygtk required for clipboard support"
+    scene = dump_scene(objects, scn)
+    if profile is not None:
+        profile.add_time('collect', t0)
+    if tikz_core.SAVE_SCENE:
+        scenepath = os.path.splitext(filepath)[0] + tikz_scene.SCENE_EXT
+        tikz_scene.save(scene, scenepath)
+        print "Scene saved to %s" % scenepath
+    if not tikz_core.write_scene(scene, filepath, profile):
+        if tikz_core.PARTITION != 'off':
+            Blender.Draw.PupMenu('ERROR: No partitions written, see the console')
+        else:
             Blender.Draw.PupMenu('ERROR: Failed to copy generated code to the clipboard')
 
 # Start of script -----------------------------------------------------
 
-# Ensure that at leas one object is selected
-if len(Blender.Object.GetSelected()) == 0:
-    # no objects selected. Print error message and quit
-    Blender.Draw.PupMenu('ERROR: Please select at least one curve')
-else:
-    fname = bsys.makename(ext=".tex")
-    retval = draw_GUI()
-    if retval and not CLIPBOARD_OUTPUT:
+def main():
+    """Show the options dialog and export the selected objects"""
+    import Blender
+    load_registry()
+    # Ensure that at leas one object is selected
+    if len(Blender.Object.GetSelected()) == 0:
+        # no objects selected. Print error message and quit
+        Blender.Draw.PupMenu('ERROR: Please select at least one curve')
+        return
+    fname = Blender.sys.makename(ext=".tex")
+    if not draw_GUI():
+        return
+    if tikz_core.CLIPBOARD_OUTPUT:
+        write_objects(fname)
+    else:
+        # write_objects is called when a file is selected
         Blender.Window.FileSelector(write_objects, "Export TikZ", fname)
-    write_objects(fname)
     print "tikz_export ended ..."
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,942 @@
+"""Geometry functions for tikz_export.py
+
+Points are sequences of (x, y) pairs, either NumPy arrays or lists of
+tuples. Only the x and y coordinates are used. This module does not
+depend on Blender.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from tikz_scene import matrix_invert, matrix_multiply
+from tikz_scene import KNOTS_ENDPOINT, KNOTS_BEZIER
+
+# Maximum number of bezier segments merged into one
+MAX_MERGE = 32
+# Number of points compared on each segment when merging bezier segments
+MERGE_SAMPLES = 8
+
+
+def is_array(points):
+    return numpy is not None and isinstance(points, numpy.ndarray)
+
+
+def _segment_distances(points, i, j):
+    """Return the distances from points i+1..j-1 to the line through i and j"""
+    x0, y0 = points[i][0], points[i][1]
+    dx = points[j][0] - x0
+    dy = points[j][1] - y0
+    length = math.hypot(dx, dy)
+    if is_array(points):
+        inner = points[i + 1:j]
+        if length == 0:
+            return numpy.hypot(inner[:, 0] - x0, inner[:, 1] - y0)
+        return abs(dy * (inner[:, 0] - x0) - dx * (inner[:, 1] - y0)) / length
+    if length == 0:
+        return [math.hypot(p[0] - x0, p[1] - y0) for p in points[i + 1:j]]
+    return [abs(dy * (p[0] - x0) - dx * (p[1] - y0)) / length
+            for p in points[i + 1:j]]
+
+
+def rdp_indices(points, tolerance):
+    """Simplify a polyline with the Ramer-Douglas-Peucker algorithm
+
+    Returns the sorted indices of the points to keep. The first and last
+    points are always kept.
+    """
+    n = len(points)
+    if n < 3:
+        return range(n)
+    keep = [0, n - 1]
+    # Use a stack instead of recursion. Long polylines would otherwise hit
+    # the recursion limit.
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        d = _segment_distances(points, i, j)
+        if is_array(points):
+            k = int(numpy.argmax(d))
+            dmax = d[k]
+        else:
+            dmax = max(d)
+            k = d.index(dmax)
+        if dmax > tolerance:
+            k += i + 1
+            keep.append(k)
+            stack.append((i, k))
+            stack.append((k, j))
+    keep.sort()
+    return keep
+
+
+def simplify_polyline(points, tolerance, cyclic=False):
+    """Return the indices of the points to keep in a simplified polyline
+
+    Closed polylines keep at least three points.
+    """
+    n = len(points)
+    if n < 3:
+        return range(n)
+    if cyclic:
+        # Close the polyline and simplify it as an open polyline
+        if is_array(points):
+            closed = numpy.vstack([points, points[:1]])
+        else:
+            closed = list(points) + [points[0]]
+        keep = rdp_indices(closed, tolerance)[:-1]
+        if len(keep) < 3:
+            return range(n)
+        return keep
+    return rdp_indices(points, tolerance)
+
+
+def bezier_point(p0, p1, p2, p3, t):
+    """Evaluate a cubic bezier segment at t"""
+    s = 1 - t
+    a = s * s * s
+    b = 3 * s * s * t
+    c = 3 * s * t * t
+    d = t * t * t
+    return (a * p0[0] + b * p1[0] + c * p2[0] + d * p3[0],
+            a * p0[1] + b * p1[1] + c * p2[1] + d * p3[1])
+
+
+def _polygon_length(seg):
+    return sum([math.hypot(b[0] - a[0], b[1] - a[1])
+                for a, b in zip(seg[:-1], seg[1:])])
+
+
+def _distance(a, b):
+    return math.hypot(b[0] - a[0], b[1] - a[1])
+
+
+def _parameter_spans(segments):
+    """Estimate the parameter span of each segment on a merged segment
+
+    If the segments are pieces of a single cubic, the handle lengths on each
+    side of a joint are proportional to the parameter spans of the pieces.
+    The length of the control polygon is used when a handle has zero length.
+    """
+    spans = [1.0]
+    for prev, seg in zip(segments[:-1], segments[1:]):
+        a = _distance(prev[3], prev[2])
+        b = _distance(seg[0], seg[1])
+        if a > 0 and b > 0:
+            spans.append(spans[-1] * b / a)
+        else:
+            a = _polygon_length(prev)
+            b = _polygon_length(seg)
+            if a == 0 or b == 0:
+                return None
+            spans.append(spans[-1] * b / a)
+    total = sum(spans)
+    return [span / total for span in spans]
+
+
+def _merge_segments(segments):
+    """Try to replace consecutive bezier segments with a single segment
+
+    segments is a list of (p0, p1, p2, p3) tuples. Returns the merged
+    segment and the maximum distance from the original segments, or None
+    if the segments can't be merged.
+    """
+    spans = _parameter_spans(segments)
+    if spans is None:
+        return None
+    # Parameter range of each original segment on the merged segment
+    starts = []
+    t = 0.0
+    for span in spans:
+        starts.append(t)
+        t += span
+    first = segments[0]
+    last = segments[-1]
+    t_first = spans[0]
+    t_last = spans[-1]
+    if t_first == 0 or t_last == 0:
+        return None
+    # Splitting a segment at t scales the outer handles by t, so scale the
+    # handles of the first and last segment the other way.
+    p0 = first[0]
+    p3 = last[3]
+    p1 = (p0[0] + (first[1][0] - p0[0]) / t_first,
+          p0[1] + (first[1][1] - p0[1]) / t_first)
+    p2 = (p3[0] + (last[2][0] - p3[0]) / t_last,
+          p3[1] + (last[2][1] - p3[1]) / t_last)
+    deviation = 0.0
+    for seg, start, span in zip(segments, starts, spans):
+        for i in range(1, MERGE_SAMPLES):
+            u = float(i) / MERGE_SAMPLES
+            x0, y0 = bezier_point(seg[0], seg[1], seg[2], seg[3], u)
+            x1, y1 = bezier_point(p0, p1, p2, p3, start + span * u)
+            deviation = max(deviation, math.hypot(x1 - x0, y1 - y0))
+    return (p0, p1, p2, p3), deviation
+
+
+def simplify_bezier(h1, knots, h2, tolerance, cyclic=False):
+    """Merge bezier segments where the result stays within tolerance
+
+    h1, knots and h2 are sequences of the first handles, knots and second
+    handles. Returns new lists of (x, y) tuples with the simplified curve.
+    """
+    n = len(knots)
+    h1 = [tuple(p[:2]) for p in h1]
+    knots = [tuple(p[:2]) for p in knots]
+    h2 = [tuple(p[:2]) for p in h2]
+    if cyclic:
+        nseg = n
+    else:
+        nseg = n - 1
+    if nseg < 2:
+        return h1, knots, h2
+    # segment i goes from knot i to knot i+1
+    segments = [(knots[i], h2[i], h1[(i + 1) % n], knots[(i + 1) % n])
+                for i in range(nseg)]
+    new_h1 = [h1[0]]
+    new_knots = [knots[0]]
+    new_h2 = []
+    i = 0
+    while i < nseg:
+        # Extend the run of merged segments as long as possible
+        merged = segments[i]
+        j = i + 1
+        while j < nseg and j - i < MAX_MERGE:
+            result = _merge_segments(segments[i:j + 1])
+            if result is None or result[1] > tolerance:
+                break
+            merged = result[0]
+            j += 1
+        new_h2.append(merged[1])
+        new_h1.append(merged[2])
+        new_knots.append(merged[3])
+        i = j
+    if cyclic:
+        # The last segment ends at the first knot
+        new_h1[0] = new_h1.pop()
+        new_knots.pop()
+    else:
+        new_h2.append(h2[-1])
+    return new_h1, new_knots, new_h2
+
+
+# Nurbs functions. A nurbs curve is converted to cubic bezier segments by
+# finding the bezier control points of each knot span. The points are
+# (x, y, z, w) rows, where w is the weight.
+
+
+def nurbs_knots(n, order, knot_type=0):
+    """Return the knot vector of an open nurbs curve with n control points
+
+    knot_type is one of the tikz_scene.KNOTS_* values. Endpoint knots make
+    the curve start and end at the first and last points. Bezier knots
+    repeat the inner knots order-1 times, which makes the curve a chain of
+    bezier segments.
+    """
+    p = order - 1
+    if knot_type == KNOTS_ENDPOINT:
+        inner = [float(i) for i in range(1, n - p)]
+    elif knot_type == KNOTS_BEZIER:
+        inner = [float(1 + i // p) for i in range(n - order)]
+    else:
+        return [float(i) for i in range(n + order)]
+    end = (inner or [0.0])[-1] + 1
+    return [0.0] * order + inner + [end] * order
+
+
+def bezier_spans(points, order, knots):
+    """Return the bezier control points of the knot spans of a B-spline
+
+    Returns an array, or a list of lists, with order control points for
+    each span with a non-zero length. The control points of the span
+    [u_i, u_i+1] are the blossom values with p-k arguments u_i and k
+    arguments u_i+1, for k = 0..p, the same points as found by inserting
+    knots until each one has multiplicity p. With NumPy each level of the
+    de Boor recursion is computed for all spans at once.
+    """
+    p = order - 1
+    n = len(points)
+    spans = [i for i in range(p, n) if knots[i] < knots[i + 1]]
+    if not spans:
+        return []
+    if is_array(points):
+        u = numpy.asarray(knots, float)
+        spans = numpy.array(spans)
+        # The control points that affect each span
+        window = points[spans[:, None] + numpy.arange(-p, 1)]
+        a = u[spans][:, None]
+        b = u[spans + 1][:, None]
+        result = numpy.empty((len(spans), order, points.shape[1]))
+        for k in range(order):
+            d = window.copy()
+            for r in range(1, order):
+                if r <= p - k:
+                    t = a
+                else:
+                    t = b
+                g = spans[:, None] - p + numpy.arange(r, order)
+                lo = u[g]
+                alpha = ((t - lo) / (u[g + p + 1 - r] - lo))[:, :, None]
+                d[:, r:] = (1 - alpha) * d[:, r - 1:-1] + alpha * d[:, r:]
+            result[:, k] = d[:, p]
+        return result
+    result = []
+    for i in spans:
+        window = [list(points[j]) for j in range(i - p, i + 1)]
+        segment = []
+        for k in range(order):
+            d = [list(row) for row in window]
+            for r in range(1, order):
+                if r <= p - k:
+                    t = knots[i]
+                else:
+                    t = knots[i + 1]
+                # Update from the end, d[j - 1] still has the old value
+                for j in range(p, r - 1, -1):
+                    lo = knots[i - p + j]
+                    alpha = (t - lo) / (knots[i + 1 + j - r] - lo)
+                    d[j] = [(1 - alpha) * c0 + alpha * c1
+                            for c0, c1 in zip(d[j - 1], d[j])]
+            segment.append(d[p])
+        result.append(segment)
+    return result
+
+
+def nurbs_to_bezier(points, order, cyclic=False, knot_type=0):
+    """Convert a nurbs curve to cubic bezier segments
+
+    points are (x, y, z, w) rows and order is at least 3 and at most the
+    number of points. Cyclic curves use uniform knots. Returns the first
+    handles, knots and second handles of the bezier curve as (x, y, z)
+    rows, in arrays if points is an array. The spans are converted in
+    homogeneous coordinates, so weights are exact for quadratic and cubic
+    curves with equal weights and approximated otherwise. Quadratic spans
+    are raised to cubic exactly, and higher degree spans are replaced by
+    the cubic with the same end points and end tangents.
+    """
+    p = order - 1
+    n = len(points)
+    if is_array(points):
+        w = points[:, 3:4]
+        weighted = numpy.hstack([points[:, :3] * w, w])
+        if cyclic:
+            weighted = numpy.vstack([weighted, weighted[:p]])
+    else:
+        weighted = [[x * w, y * w, z * w, w] for x, y, z, w in points]
+        if cyclic:
+            weighted = weighted + weighted[:p]
+    if cyclic:
+        knots = nurbs_knots(n + p, order)
+    else:
+        knots = nurbs_knots(n, order, knot_type)
+    spans = bezier_spans(weighted, order, knots)
+    if is_array(points):
+        if not len(spans):
+            empty = numpy.zeros((0, 3))
+            return empty, empty, empty
+        b = spans[:, :, :3] / spans[:, :, 3:]
+        start = b[:, 0]
+        end = b[:, p]
+        if p == 2:
+            c1 = (start + 2 * b[:, 1]) / 3
+            c2 = (2 * b[:, 1] + end) / 3
+        else:
+            c1 = start + p / 3.0 * (b[:, 1] - start)
+            c2 = end - p / 3.0 * (end - b[:, p - 1])
+        if cyclic:
+            return numpy.roll(c2, 1, 0), start, c1
+        return (numpy.vstack([start[:1], c2]), numpy.vstack([start, end[-1:]]),
+                numpy.vstack([c1, end[-1:]]))
+    h1 = []
+    knots = []
+    h2 = []
+    for segment in spans:
+        b = [[c / row[3] for c in row[:3]] for row in segment]
+        start = b[0]
+        end = b[p]
+        if p == 2:
+            c1 = [(s + 2 * m) / 3 for s, m in zip(start, b[1])]
+            c2 = [(2 * m + e) / 3 for m, e in zip(b[1], end)]
+        else:
+            c1 = [s + p / 3.0 * (m - s) for s, m in zip(start, b[1])]
+            c2 = [e - p / 3.0 * (e - m) for e, m in zip(end, b[p - 1])]
+        knots.append(tuple(start))
+        h2.append(tuple(c1))
+        h1.append(tuple(c2))
+    if not knots:
+        return [], [], []
+    if cyclic:
+        h1.insert(0, h1.pop())
+    else:
+        h1.insert(0, knots[0])
+        knots.append(tuple(end))
+        h2.append(tuple(end))
+    return h1, knots, h2
+
+
+# Primitive recognition. Curves are sampled, and the samples are compared
+# with the shape. The tolerance is relative to the size of the shape.
+
+# Number of samples on each bezier segment
+PRIMITIVE_SAMPLES = 4
+# Arcs must turn at least this many radians. Nearly straight curves fit
+# circles with huge radii.
+MIN_ARC_SWEEP = 0.05
+
+
+def bezier_samples(h1, knots, h2, cyclic=False, samples=PRIMITIVE_SAMPLES):
+    """Return points on a bezier curve, starting at the first knot
+
+    Each segment is sampled at samples points, the last one at its end
+    knot. The points are (x, y) tuples.
+    """
+    n = len(knots)
+    if cyclic:
+        nseg = n
+    else:
+        nseg = n - 1
+    points = [tuple(knots[0][:2])]
+    for i in range(nseg):
+        j = (i + 1) % n
+        for k in range(1, samples + 1):
+            points.append(bezier_point(knots[i], h2[i], h1[j], knots[j],
+                                       float(k) / samples))
+    return points
+
+
+def _sweep(points, cx, cy, sx=1.0, sy=1.0):
+    """Return the angles turned around (cx, cy) from each point to the next
+
+    The coordinates are divided by sx and sy first. Returns None if the
+    direction changes.
+    """
+    angles = [math.atan2((y - cy) / sy, (x - cx) / sx) for x, y in points]
+    steps = []
+    for a, b in zip(angles[:-1], angles[1:]):
+        d = (b - a) % (2 * math.pi)
+        if d > math.pi:
+            d -= 2 * math.pi
+        steps.append(d)
+    if [d for d in steps if d > 0] and [d for d in steps if d < 0]:
+        return None
+    return angles[0], sum(steps)
+
+
+def find_ellipse(points, tolerance):
+    """Return (cx, cy, rx, ry) if the closed curve through points is an ellipse
+
+    The axes of the ellipse must be parallel to the x and y axes. The
+    radial distance of every point may differ by a fraction tolerance from
+    the ellipse, and the curve must go around the center once. Returns None
+    for other curves.
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    rx = (max(xs) - min(xs)) / 2
+    ry = (max(ys) - min(ys)) / 2
+    if rx <= DEGENERATE_SIZE or ry <= DEGENERATE_SIZE:
+        return None
+    cx = (max(xs) + min(xs)) / 2
+    cy = (max(ys) + min(ys)) / 2
+    for x, y in points:
+        if abs(math.hypot((x - cx) / rx, (y - cy) / ry) - 1) > tolerance:
+            return None
+    sweep = _sweep(points, cx, cy, rx, ry)
+    if sweep is None or abs(abs(sweep[1]) - 2 * math.pi) > 0.5:
+        return None
+    return cx, cy, rx, ry
+
+
+def find_arc(points, tolerance):
+    """Return (start, sweep, radius) if the curve through points is a circular arc
+
+    start is the angle of the first point and sweep the angle turned from
+    it, in degrees. The distance of every point from the center may differ
+    by a fraction tolerance from the radius. Returns None for other curves.
+    """
+    (x1, y1), (x2, y2), (x3, y3) = points[0], points[len(points) // 2], points[-1]
+    if (x1, y1) == (x3, y3):
+        # A full circle. Use the point opposite the middle one.
+        x3, y3 = points[len(points) // 4]
+    # Center of the circle through the three points
+    d = 2 * (x1 * (y2 - y3) + x2 * (y3 - y1) + x3 * (y1 - y2))
+    if abs(d) <= DEGENERATE_SIZE:
+        return None
+    s1 = x1 * x1 + y1 * y1
+    s2 = x2 * x2 + y2 * y2
+    s3 = x3 * x3 + y3 * y3
+    cx = (s1 * (y2 - y3) + s2 * (y3 - y1) + s3 * (y1 - y2)) / d
+    cy = (s1 * (x3 - x2) + s2 * (x1 - x3) + s3 * (x2 - x1)) / d
+    radius = math.hypot(x1 - cx, y1 - cy)
+    for x, y in points:
+        if abs(math.hypot(x - cx, y - cy) - radius) > tolerance * radius:
+            return None
+    sweep = _sweep(points, cx, cy)
+    if sweep is None or abs(sweep[1]) < MIN_ARC_SWEEP \
+            or abs(sweep[1]) > 2 * math.pi + 0.5:
+        return None
+    start, sweep = sweep
+    return math.degrees(start), math.degrees(sweep), radius
+
+
+def find_rectangle(points, tolerance):
+    """Return (x0, y0, x1, y1) if a closed polyline is a rectangle
+
+    points are the corners, optionally followed by the first corner again.
+    The sides must be parallel to the x and y axes within a fraction
+    tolerance of the size. (x0, y0) is the first corner and (x1, y1) the
+    opposite one. Returns None for other polylines.
+    """
+    points = [(p[0], p[1]) for p in points]
+    if len(points) == 5 and points[0] == points[4]:
+        points.pop()
+    if len(points) != 4:
+        return None
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    size = max(max(xs) - min(xs), max(ys) - min(ys))
+    if size <= DEGENERATE_SIZE:
+        return None
+    limit = tolerance * size
+    for start in (0, 1):
+        # The sides alternate between horizontal and vertical
+        for i in range(4):
+            (ax, ay), (bx, by) = points[i], points[(i + 1) % 4]
+            if (i + start) % 2:
+                aligned = abs(bx - ax) <= limit
+            else:
+                aligned = abs(by - ay) <= limit
+            if not aligned:
+                break
+        else:
+            return points[0] + points[2]
+    return None
+
+
+# Mesh functions. The points are (x, y, depth) rows in drawing
+# coordinates, where a larger depth is closer to the viewer. See also
+# Projection.
+
+# Faces with a smaller projected area and edges with a smaller projected
+# length are degenerate and not exported
+DEGENERATE_SIZE = 1e-9
+
+
+def transform_points(points, matrix):
+    """Transform (x, y, z) points by a 4x4 matrix in Blender's row convention"""
+    m = matrix
+    if numpy is not None:
+        if not len(points):
+            return numpy.zeros((0, 3))
+        p = numpy.asarray(points, float)[:, :3]
+        m = numpy.asarray(matrix, float)
+        return numpy.dot(p, m[:3, :3]) + m[3, :3]
+    return [tuple([p[0] * m[0][j] + p[1] * m[1][j] + p[2] * m[2][j] + m[3][j]
+                   for j in range(3)]) for p in points]
+
+
+def _face_groups(faces):
+    """Return the faces grouped by vertex count
+
+    Returns a list of (vertex count, face numbers, faces) tuples.
+    """
+    groups = {}
+    for i, face in enumerate(faces):
+        n = len(face)
+        if n < 3:
+            continue
+        if n not in groups:
+            groups[n] = ([], [])
+        groups[n][0].append(i)
+        groups[n][1].append(face)
+    return [(n, numbers, group) for n, (numbers, group) in sorted(groups.items())]
+
+
+def sort_faces(points, faces, cull_backfaces=True, rect=None):
+    """Return the visible faces in painter's order
+
+    Faces with a clockwise outline in the drawing are facing away from the
+    viewer. They are removed if cull_backfaces is true. Degenerate faces
+    are always removed, and faces outside the clip rectangle rect if it is
+    given. The remaining faces are sorted by their mean depth, farthest
+    first. Returns a tuple (sizes, values) with the vertex count of each
+    face and a flat list with the x and y values of all faces.
+    """
+    if is_array(points):
+        return _sort_faces_array(points, faces, cull_backfaces, rect)
+    visible = []
+    for face in faces:
+        n = len(face)
+        if n < 3:
+            continue
+        xy = [points[i] for i in face]
+        if rect is not None and not boxes_overlap(points_box(xy), rect):
+            continue
+        area = 0.0
+        for j in range(n):
+            a = xy[j - 1]
+            b = xy[j]
+            area += a[0] * b[1] - b[0] * a[1]
+        area *= 0.5
+        if area <= DEGENERATE_SIZE and (cull_backfaces or area >= -DEGENERATE_SIZE):
+            continue
+        depth = sum([p[2] for p in xy]) / n
+        values = []
+        for p in xy:
+            values.extend((p[0], p[1]))
+        visible.append((depth, len(visible), n, values))
+    # The face number keeps the sort stable
+    visible.sort()
+    values = []
+    for face in visible:
+        values.extend(face[3])
+    return [face[2] for face in visible], values
+
+
+def _sort_faces_array(points, faces, cull_backfaces, rect):
+    depths = []
+    rows = []
+    sizes = []
+    for n, numbers, group in _face_groups(faces):
+        fp = points[numpy.array(group, int)]
+        x = fp[:, :, 0]
+        y = fp[:, :, 1]
+        area = 0.5 * (x * numpy.roll(y, -1, 1) - numpy.roll(x, -1, 1) * y).sum(1)
+        if cull_backfaces:
+            keep = area > DEGENERATE_SIZE
+        else:
+            keep = abs(area) > DEGENERATE_SIZE
+        if rect is not None:
+            keep &= _overlaps_rect(x, y, rect)
+        fp = fp[keep]
+        depths.append(fp[:, :, 2].mean(1))
+        rows.append(fp[:, :, :2].reshape(len(fp), 2 * n))
+        sizes.append(numpy.zeros(len(fp), int) + n)
+    if not depths:
+        return [], []
+    depth = numpy.concatenate(depths)
+    order = numpy.argsort(depth, kind='mergesort')
+    sizes = numpy.concatenate(sizes)[order].tolist()
+    if len(rows) == 1:
+        return sizes, rows[0][order].ravel().tolist()
+    # Faces with different vertex counts. Gather the rows in Python.
+    allrows = []
+    for r in rows:
+        allrows.extend(r.tolist())
+    values = []
+    for i in order.tolist():
+        values.extend(allrows[i])
+    return sizes, values
+
+
+def visible_edges(points, edges, rect=None):
+    """Return the x and y values of the edges that aren't degenerate
+
+    Edges outside the clip rectangle rect are removed if it is given.
+    Returns a flat list with x1, y1, x2, y2 for each edge.
+    """
+    if is_array(points):
+        if not edges:
+            return []
+        e = numpy.array(edges, int)
+        a = points[e[:, 0], :2]
+        b = points[e[:, 1], :2]
+        keep = numpy.hypot(*(b - a).T) > DEGENERATE_SIZE
+        if rect is not None:
+            keep &= _overlaps_rect(numpy.column_stack([a[:, 0], b[:, 0]]),
+                                   numpy.column_stack([a[:, 1], b[:, 1]]), rect)
+        return numpy.hstack([a, b])[keep].ravel().tolist()
+    values = []
+    for i, j in edges:
+        a = points[i]
+        b = points[j]
+        if rect is not None and not boxes_overlap(points_box([a, b]), rect):
+            continue
+        if math.hypot(b[0] - a[0], b[1] - a[1]) > DEGENERATE_SIZE:
+            values.extend((a[0], a[1], b[0], b[1]))
+    return values
+
+
+def _overlaps_rect(x, y, rect):
+    """Return a mask of the rows of x and y with bounding boxes overlapping rect"""
+    return (x.max(1) >= rect[0]) & (x.min(1) <= rect[2]) \
+        & (y.max(1) >= rect[1]) & (y.min(1) <= rect[3])
+
+
+# Smallest distance in front of a perspective camera. Points closer to
+# the camera or behind it are moved to this distance.
+NEAR_CLIP = 1e-3
+
+
+class Projection(object):
+    """Projection of world coordinates through a camera
+
+    camera_matrix is the camera's world matrix. The projected points are
+    (x, y, depth) rows, where x and y are the coordinates in the camera's
+    view and the depth is the camera space z. The camera looks along its
+    negative z axis, so a larger depth is closer to the camera.
+
+    A perspective projection keeps the size of objects in the plane
+    through the world origin facing the camera.
+    """
+
+    def __init__(self, camera_matrix, perspective=False):
+        self.view = matrix_invert(camera_matrix)
+        self.perspective = perspective
+        self.distance = -self.view[3][2]
+        if self.distance <= NEAR_CLIP:
+            self.distance = 1.0
+
+    def project(self, points, matrix=None):
+        """Project (x, y, z) points
+
+        matrix is the world matrix of the object the points belong to. All
+        points are transformed with a single matrix product.
+        """
+        if matrix is None:
+            m = self.view
+        else:
+            m = matrix_multiply(matrix, self.view)
+        p = transform_points(points, m)
+        if not self.perspective:
+            return p
+        d = self.distance
+        if is_array(p):
+            s = d / numpy.maximum(-p[:, 2], NEAR_CLIP)
+            p[:, 0] *= s
+            p[:, 1] *= s
+            return p
+        projected = []
+        for x, y, z in p:
+            s = d / max(-z, NEAR_CLIP)
+            projected.append((x * s, y * s, z))
+        return projected
+
+    def depth(self, point):
+        """Return the depth of a world space point"""
+        return self.project([point])[0][2]
+
+
+# Clipping. Boxes and clip rectangles are (xmin, ymin, xmax, ymax) tuples
+# in drawing coordinates.
+
+# Number of grid cells along the larger side of the area of a GridIndex
+GRID_CELLS = 16
+# Boxes covering more grid cells are kept in a list that is always searched
+MAX_CELLS = 64
+
+
+def points_box(points):
+    """Return the bounding box of the x and y coordinates of points
+
+    Returns None if there are no points.
+    """
+    if not len(points):
+        return None
+    if is_array(points):
+        lo = points[:, :2].min(0)
+        hi = points[:, :2].max(0)
+        return (float(lo[0]), float(lo[1]), float(hi[0]), float(hi[1]))
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def boxes_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def box_inside(a, b):
+    """Return True if box a is inside box b"""
+    return a[0] >= b[0] and a[1] >= b[1] and a[2] <= b[2] and a[3] <= b[3]
+
+
+def expand_box(box, margin):
+    return (box[0] - margin, box[1] - margin, box[2] + margin, box[3] + margin)
+
+
+class GridIndex(object):
+    """A uniform grid for finding the boxes that overlap a rectangle
+
+    area is the rectangle that is searched most. The grid has GRID_CELLS
+    cells along its larger side, but boxes outside the area are also
+    stored. Each box is added to the cells it overlaps.
+    """
+
+    def __init__(self, area, cells=GRID_CELLS):
+        self.x0 = area[0]
+        self.y0 = area[1]
+        self.size = max(area[2] - area[0], area[3] - area[1]) / float(cells)
+        if self.size <= 0:
+            self.size = 1.0
+        self.cells = {}
+        self.large = []
+        self.items = []
+
+    def _range(self, box):
+        x0 = int(math.floor((box[0] - self.x0) / self.size))
+        y0 = int(math.floor((box[1] - self.y0) / self.size))
+        x1 = int(math.floor((box[2] - self.x0) / self.size))
+        y1 = int(math.floor((box[3] - self.y0) / self.size))
+        return x0, y0, x1, y1
+
+    def insert(self, item, box):
+        """Add item with the bounding box box"""
+        n = len(self.items)
+        self.items.append((item, box))
+        x0, y0, x1, y1 = self._range(box)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_CELLS:
+            self.large.append(n)
+            return
+        cells = self.cells
+        for i in xrange(x0, x1 + 1):
+            for j in xrange(y0, y1 + 1):
+                if (i, j) in cells:
+                    cells[(i, j)].append(n)
+                else:
+                    cells[(i, j)] = [n]
+
+    def query(self, box):
+        """Return the items with boxes overlapping box in insertion order"""
+        x0, y0, x1, y1 = self._range(box)
+        found = set(self.large)
+        cells = self.cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(cells):
+            for key, numbers in cells.iteritems():
+                if x0 <= key[0] <= x1 and y0 <= key[1] <= y1:
+                    found.update(numbers)
+        else:
+            for i in xrange(x0, x1 + 1):
+                for j in xrange(y0, y1 + 1):
+                    found.update(cells.get((i, j), ()))
+        items = self.items
+        return [items[n][0] for n in sorted(found) if boxes_overlap(items[n][1], box)]
+
+
+def clip_polyline(points, rect):
+    """Clip an open polyline to a rectangle
+
+    Each segment is clipped with the Liang-Barsky algorithm. Returns a list
+    with the (x, y) points of the pieces inside the rectangle. Vertices
+    inside the rectangle are kept unchanged.
+    """
+    n = len(points)
+    if n < 2:
+        if n and box_inside(points_box(points), rect):
+            return [points[:, :2] if is_array(points) else [tuple(points[0][:2])]]
+        return []
+    if is_array(points):
+        return _clip_polyline_array(points[:, :2], rect)
+    xmin, ymin, xmax, ymax = rect
+    pieces = []
+    piece = None
+    for k in xrange(n - 1):
+        x0, y0 = points[k][0], points[k][1]
+        dx = points[k + 1][0] - x0
+        dy = points[k + 1][1] - y0
+        t0, t1 = 0.0, 1.0
+        for p, q in ((-dx, x0 - xmin), (dx, xmax - x0), (-dy, y0 - ymin), (dy, ymax - y0)):
+            if p == 0:
+                if q < 0:
+                    t0, t1 = 1.0, 0.0
+            elif p < 0:
+                t0 = max(t0, q / float(p))
+            else:
+                t1 = min(t1, q / float(p))
+        if t0 > t1:
+            piece = None
+            continue
+        if piece is None or t0 > 0:
+            piece = [(x0 + t0 * dx, y0 + t0 * dy)]
+            pieces.append(piece)
+        piece.append((x0 + t1 * dx, y0 + t1 * dy))
+        if t1 < 1:
+            piece = None
+    return pieces
+
+
+def _clip_polyline_array(points, rect):
+    xmin, ymin, xmax, ymax = rect
+    p0 = points[:-1]
+    d = points[1:] - p0
+    m = len(d)
+    t0 = numpy.zeros(m)
+    t1 = numpy.ones(m)
+    accept = numpy.ones(m, bool)
+    err = numpy.seterr(divide='ignore', invalid='ignore')
+    try:
+        for p, q in ((-d[:, 0], p0[:, 0] - xmin), (d[:, 0], xmax - p0[:, 0]),
+                     (-d[:, 1], p0[:, 1] - ymin), (d[:, 1], ymax - p0[:, 1])):
+            parallel = p == 0
+            accept &= ~(parallel & (q < 0))
+            t = q / numpy.where(parallel, 1.0, p)
+            t0 = numpy.where(p < 0, numpy.maximum(t0, t), t0)
+            t1 = numpy.where(p > 0, numpy.minimum(t1, t), t1)
+    finally:
+        numpy.seterr(**err)
+    accept &= t0 <= t1
+    # A segment continues the piece of the previous segment if both are
+    # accepted and the shared vertex is inside
+    joined = numpy.zeros(m, bool)
+    joined[1:] = accept[1:] & accept[:-1] & (t1[:-1] == 1) & (t0[1:] == 0)
+    starts = numpy.nonzero(accept & ~joined)[0]
+    ends = numpy.nonzero(accept & ~numpy.append(joined[1:], False))[0]
+    pieces = []
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        pieces.append(numpy.vstack([p0[s] + t0[s] * d[s], points[s + 1:e + 1],
+                                    p0[e] + t1[e] * d[e]]))
+    return pieces
+
+
+def clip_polygon(points, rect):
+    """Clip a closed polygon to a rectangle
+
+    Uses the Sutherland-Hodgman algorithm. Returns the (x, y) points of the
+    clipped polygon, or an empty sequence if less than three points are
+    left. Parts of the outline can run along the rectangle.
+    """
+    if is_array(points):
+        p = points[:, :2]
+    else:
+        p = [tuple(q[:2]) for q in points]
+    for axis, bound, sign in ((0, rect[0], 1), (0, rect[2], -1),
+                              (1, rect[1], 1), (1, rect[3], -1)):
+        if len(p) < 3:
+            break
+        if is_array(p):
+            p = _clip_polygon_array(p, axis, bound, sign)
+            continue
+        clipped = []
+        prev = p[-1]
+        prev_inside = sign * (prev[axis] - bound) >= 0
+        for cur in p:
+            inside = sign * (cur[axis] - bound) >= 0
+            if inside != prev_inside:
+                t = (bound - prev[axis]) / float(cur[axis] - prev[axis])
+                clipped.append((prev[0] + t * (cur[0] - prev[0]),
+                                prev[1] + t * (cur[1] - prev[1])))
+            if inside:
+                clipped.append(cur)
+            prev, prev_inside = cur, inside
+        p = clipped
+    if len(p) < 3:
+        return p[:0]
+    return p
+
+
+def _clip_polygon_array(p, axis, bound, sign):
+    """Clip a polygon against one side of the rectangle"""
+    inside = sign * (p[:, axis] - bound) >= 0
+    prev = numpy.roll(p, 1, 0)
+    crossing = inside != numpy.roll(inside, 1)
+    delta = p[:, axis] - prev[:, axis]
+    t = (bound - prev[:, axis]) / numpy.where(crossing, delta, 1.0)
+    points = numpy.empty((len(p), 2, 2))
+    points[:, 0] = prev + t[:, numpy.newaxis] * (p - prev)
+    points[:, 1] = p
+    return points[numpy.column_stack([crossing, inside])]
@@ -0,0 +1,127 @@
+"""Export profiling for tikz_export.py
+
+A Profile records the wall time of each export stage, counts the
+objects, nurbs, points, empties and output bytes per object type, and
+keeps the time used for each object so the slowest objects can be found.
+The report is saved as JSON. This module does not depend on Blender.
+"""
+
+import time
+import heapq
+
+try:
+    import json
+except ImportError:
+    # Python < 2.6
+    json = None
+
+# Number of objects listed in the slowest objects section
+SLOWEST = 10
+
+PROFILE_EXT = '.profile.json'
+
+
+class Profile(object):
+    """Timings and counts for a single export"""
+
+    def __init__(self, slowest=SLOWEST):
+        self.slowest = slowest
+        self.start = time.time()
+        self.stages = {}
+        self.stage_order = []
+        self.types = {}
+        self.objects = []
+
+    def add_time(self, stage, t0):
+        """Add the time since t0 to stage"""
+        self.add_seconds(stage, time.time() - t0)
+
+    def add_seconds(self, stage, seconds):
+        if stage not in self.stages:
+            self.stages[stage] = 0.0
+            self.stage_order.append(stage)
+        self.stages[stage] += seconds
+
+    def timed(self, func, stage):
+        """Return a function that calls func and adds the time used to stage"""
+        def timed_func(*args):
+            t0 = time.time()
+            try:
+                return func(*args)
+            finally:
+                self.add_time(stage, t0)
+        return timed_func
+
+    def add_object(self, obj, empties, nbytes, seconds, stage='format'):
+        """Record the code generated for obj
+
+        empties is the number of empties parented to obj.
+        """
+        self.add_seconds(stage, seconds)
+        nurbs = len(obj.nurbs)
+        points = sum([len(nurb) for nurb in obj.nurbs])
+        counts = self.types.get(obj.type)
+        if counts is None:
+            counts = self.types[obj.type] = dict(objects=0, nurbs=0, points=0,
+                                                 empties=0, bytes=0, seconds=0.0)
+        counts['objects'] += 1
+        counts['nurbs'] += nurbs
+        counts['points'] += points
+        counts['empties'] += empties
+        counts['bytes'] += nbytes
+        counts['seconds'] += seconds
+        self.objects.append((seconds, obj.name, obj.type, nurbs, points, nbytes))
+
+    def report(self):
+        """Return the report as a dict"""
+        slowest = [dict(name=name, type=type, seconds=seconds, nurbs=nurbs,
+                        points=points, bytes=nbytes)
+                   for seconds, name, type, nurbs, points, nbytes
+                   in heapq.nlargest(self.slowest, self.objects)]
+        return dict(total_seconds=time.time() - self.start,
+                    stages=[dict(stage=stage, seconds=self.stages[stage])
+                            for stage in self.stage_order],
+                    types=self.types, slowest=slowest)
+
+    def summary(self):
+        """Return a list of lines with the stage timings"""
+        return ["  %-10s %8.3fs" % (stage, self.stages[stage])
+                for stage in self.stage_order]
+
+    def save(self, filename):
+        """Save the report to filename as JSON"""
+        f = open(filename, 'w')
+        try:
+            f.write(dumps(self.report()))
+            f.write('\n')
+        finally:
+            f.close()
+
+
+def dumps(value):
+    """Return value as JSON"""
+    if json is not None:
+        return json.dumps(value, indent=1, sort_keys=True)
+    return _dumps(value)
+
+
+def _dumps(value):
+    """A minimal JSON encoder for Python versions without the json module"""
+    if isinstance(value, dict):
+        items = value.items()
+        items.sort()
+        return '{%s}' % ', '.join(['%s: %s' % (_dumps(str(k)), _dumps(v))
+                                   for k, v in items])
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join([_dumps(v) for v in value])
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, basestring):
+        s = value.replace('\\', '\\\\').replace('"', '\\"')
+        s = s.replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t')
+        return '"%s"' % s
+    return repr(value)
@@ -0,0 +1,359 @@
+"""Scene description for tikz_export.py
+
+The exporter does not work on Blender objects directly. The selected
+objects are first converted to the light weight classes in this module,
+which only hold what the exporter needs:
+
+    - curves with their type, cyclic flag and point arrays
+    - mesh vertices, faces and edges
+    - world matrices
+    - empties and their parents
+    - materials and style properties
+    - the active camera
+
+A scene can be saved to a file and exported later without Blender, for
+instance on a build server. This module does not depend on Blender.
+"""
+
+import math
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Curve types. Same values as Blender uses.
+TYPE_POLY = 0
+TYPE_BEZIER = 1
+TYPE_NURBS = 4
+
+# Knot vectors of nurbs curves, the values of knot_type. Same values as
+# the flagU of Blender's CurNurb.
+KNOTS_UNIFORM = 0
+KNOTS_ENDPOINT = 1
+KNOTS_BEZIER = 2
+
+# File format version. Increase when the format changes.
+FORMAT_VERSION = 4
+
+SCENE_EXT = '.tikzscene'
+
+IDENTITY = [[1.0, 0.0, 0.0, 0.0],
+            [0.0, 1.0, 0.0, 0.0],
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0]]
+
+
+def point_array(rows):
+    """Return rows of point coordinates as an array
+
+    A NumPy array is returned if NumPy is available, otherwise a list of
+    tuples.
+    """
+    if numpy is not None:
+        rows = numpy.array(rows, float)
+        if rows.ndim != 2:
+            rows = rows.reshape(0, 0)
+        return rows
+    return [tuple(row) for row in rows]
+
+
+def as_rows(points):
+    """Return points as a list of lists (the inverse of point_array)"""
+    if numpy is not None and isinstance(points, numpy.ndarray):
+        return points.tolist()
+    return [list(row) for row in points]
+
+
+class Nurb(object):
+    """A single curve segment
+
+    For poly lines and nurbs curves each point is a row (x, y, z, w). For
+    bezier curves each point is a row with the first handle, the knot and
+    the second handle (h1x, h1y, h1z, x, y, z, h2x, h2y, h2z). order and
+    knot_type, one of the KNOTS_* values, are only used for nurbs curves.
+    """
+
+    def __init__(self, type, points, cyclic=False, order=4, knot_type=0):
+        self.type = type
+        self.points = point_array(points)
+        self.cyclic = cyclic
+        self.order = order
+        self.knot_type = knot_type
+
+    def __len__(self):
+        return len(self.points)
+
+    def to_dict(self):
+        return dict(type=self.type, points=as_rows(self.points),
+                    cyclic=self.cyclic, order=self.order,
+                    knot_type=self.knot_type)
+
+
+class MeshData(object):
+    """Mesh vertices, faces and edges
+
+    verts has a row (x, y, z) for each vertex. faces and edges are lists of
+    vertex index tuples.
+    """
+
+    def __init__(self, verts, faces=None, edges=None):
+        self.verts = point_array(verts)
+        self.faces = [tuple(face) for face in faces or []]
+        self.edges = [tuple(edge) for edge in edges or []]
+
+    def to_dict(self):
+        return dict(verts=as_rows(self.verts), faces=self.faces, edges=self.edges)
+
+
+class Material(object):
+    """Material color, alpha and custom properties"""
+
+    def __init__(self, name, rgb, alpha=1.0, properties=None):
+        self.name = name
+        self.rgb = list(rgb)
+        self.alpha = alpha
+        self.properties = properties or {}
+
+    def to_dict(self):
+        return dict(name=self.name, rgb=self.rgb, alpha=self.alpha,
+                    properties=self.properties)
+
+
+class Object(object):
+    """A curve, mesh or empty
+
+    matrix is the 4x4 world matrix using Blender's convention, with the
+    translation in the last row. parent is the name of the parent object,
+    or None. material is the first material assigned to a curve or mesh.
+    mesh is the MeshData of a mesh. groups is a list with the names of the
+    groups the object is in and layers a list with the numbers of the
+    layers it is on.
+    """
+
+    def __init__(self, name, type, matrix=None, parent=None, nurbs=None,
+                 material=None, properties=None, game_properties=None,
+                 data_name=None, mesh=None, groups=None, layers=None):
+        self.name = name
+        self.type = type
+        if matrix is None:
+            matrix = IDENTITY
+        self.matrix = [list(row) for row in matrix]
+        self.parent = parent
+        self.nurbs = nurbs or []
+        self.material = material
+        self.properties = properties or {}
+        self.game_properties = game_properties or {}
+        self.data_name = data_name
+        self.mesh = mesh
+        self.groups = list(groups or [])
+        self.layers = list(layers or [])
+
+    def _get_location(self):
+        return tuple(self.matrix[3][:3])
+
+    location = property(_get_location, doc="World space location")
+
+    def to_dict(self):
+        if self.material:
+            material = self.material.name
+        else:
+            material = None
+        if self.mesh:
+            mesh = self.mesh.to_dict()
+        else:
+            mesh = None
+        return dict(name=self.name, type=self.type, matrix=self.matrix,
+                    parent=self.parent,
+                    nurbs=[nurb.to_dict() for nurb in self.nurbs],
+                    material=material, properties=self.properties,
+                    game_properties=self.game_properties,
+                    data_name=self.data_name, mesh=mesh, groups=self.groups,
+                    layers=self.layers)
+
+
+class Camera(object):
+    """The camera used for projecting the scene
+
+    matrix is the camera's world matrix. type is 'persp' or 'ortho'. lens is
+    the focal length in mm and scale the frame width of orthographic
+    cameras. aspect is the width/height ratio of the rendered image.
+    """
+
+    def __init__(self, name, matrix, type='persp', lens=35.0, scale=7.0,
+                 aspect=1.0):
+        self.name = name
+        self.matrix = [list(row) for row in matrix]
+        self.type = type
+        self.lens = lens
+        self.scale = scale
+        self.aspect = aspect
+
+    def to_dict(self):
+        return dict(name=self.name, matrix=self.matrix, type=self.type,
+                    lens=self.lens, scale=self.scale, aspect=self.aspect)
+
+
+class Scene(object):
+    """The objects to export, the scene properties and the camera"""
+
+    def __init__(self, objects=None, properties=None, camera=None):
+        self.objects = objects or []
+        self.properties = properties or {}
+        self.camera = camera
+
+    def materials(self):
+        """Return a dict with all materials used by the objects"""
+        materials = {}
+        for obj in self.objects:
+            if obj.material:
+                materials[obj.material.name] = obj.material
+        return materials
+
+    def to_dict(self):
+        if self.camera:
+            camera = self.camera.to_dict()
+        else:
+            camera = None
+        return dict(version=FORMAT_VERSION, properties=self.properties,
+                    materials=[m.to_dict() for m in self.materials().values()],
+                    objects=[obj.to_dict() for obj in self.objects],
+                    camera=camera)
+
+
+def scene_from_dict(d):
+    """Create a Scene from a dict created by Scene.to_dict"""
+    # Older versions only lack some fields
+    if d.get('version') not in range(1, FORMAT_VERSION + 1):
+        raise ValueError("Unsupported scene format version %s" % d.get('version'))
+    materials = {}
+    for m in d['materials']:
+        materials[m['name']] = Material(**m)
+    objects = []
+    for o in d['objects']:
+        o = dict(o)
+        o['nurbs'] = [Nurb(**n) for n in o['nurbs']]
+        o['material'] = materials.get(o['material'])
+        if o.get('mesh'):
+            o['mesh'] = MeshData(**o['mesh'])
+        objects.append(Object(**o))
+    camera = None
+    if d.get('camera'):
+        camera = Camera(**d['camera'])
+    return Scene(objects, d['properties'], camera)
+
+
+def save(scene, filename):
+    """Save scene to filename"""
+    f = open(filename, 'wb')
+    try:
+        pickle.dump(scene.to_dict(), f, 2)
+    finally:
+        f.close()
+
+
+def load(filename):
+    """Load a scene saved with save"""
+    f = open(filename, 'rb')
+    try:
+        return scene_from_dict(pickle.load(f))
+    finally:
+        f.close()
+
+
+# Matrix functions. Matrices are lists of rows.
+
+def matrix_multiply(a, b):
+    """Return the matrix product a*b"""
+    bt = zip(*b)
+    return [[sum([x * y for x, y in zip(row, col)]) for col in bt] for row in a]
+
+
+def matrix_invert(m):
+    """Return the inverse of a 4x4 matrix
+
+    Raises ValueError if the matrix is singular.
+    """
+    n = len(m)
+    a = [[float(v) for v in row] + [float(i == j) for j in range(n)]
+         for i, row in enumerate(m)]
+    for c in range(n):
+        p = max(range(c, n), key=lambda r: abs(a[r][c]))
+        if a[p][c] == 0:
+            raise ValueError("Matrix is singular")
+        a[c], a[p] = a[p], a[c]
+        pivot = a[c][c]
+        a[c] = [v / pivot for v in a[c]]
+        for r in range(n):
+            if r != c and a[r][c]:
+                f = a[r][c]
+                a[r] = [v - f * w for v, w in zip(a[r], a[c])]
+    return [row[n:] for row in a]
+
+
+def _row_lengths(m):
+    """Return the lengths of the first three rows of a matrix"""
+    return [math.sqrt(sum([v * v for v in row[:3]])) for row in m[:3]]
+
+
+def euler_matrix(eul):
+    """Return the 3x3 rotation matrix of an Euler rotation in radians
+
+    Uses the same method as Blender's EulToMat3.
+    """
+    ci, cj, ch = [math.cos(a) for a in eul]
+    si, sj, sh = [math.sin(a) for a in eul]
+    cc, cs = ci * ch, ci * sh
+    sc, ss = si * ch, si * sh
+    return [[cj * ch, cj * sh, -sj],
+            [sj * sc - cs, sj * ss + cc, cj * si],
+            [sj * cc + ss, sj * cs - sc, cj * ci]]
+
+
+def matrix_scale(m):
+    """Return the x, y and z scale of a matrix
+
+    Like Blender's scalePart, the scale is what is left when the rotation
+    from matrix_euler is removed, so mirrored axes get a negative scale.
+    The length of each row is used as the size of the scale, which is the
+    same for matrices without shear.
+    """
+    rot = euler_matrix(matrix_euler(m))
+    scale = []
+    for row, rot_row, length in zip(m[:3], rot, _row_lengths(m)):
+        if sum([v * w for v, w in zip(row[:3], rot_row)]) < 0:
+            length = -length
+        scale.append(length)
+    return tuple(scale)
+
+
+def matrix_euler(m):
+    """Return the Euler rotation of a matrix in radians
+
+    Uses the same method as Blender's Mat3ToEul.
+    """
+    mat = []
+    for row, s in zip(m[:3], _row_lengths(m)):
+        if s:
+            mat.append([v / s for v in row[:3]])
+        else:
+            mat.append(list(row[:3]))
+    cy = math.hypot(mat[0][0], mat[0][1])
+    if cy > 16 * 1.192092896e-07:
+        eul1 = (math.atan2(mat[1][2], mat[2][2]),
+                math.atan2(-mat[0][2], cy),
+                math.atan2(mat[0][1], mat[0][0]))
+        eul2 = (math.atan2(-mat[1][2], -mat[2][2]),
+                math.atan2(-mat[0][2], -cy),
+                math.atan2(-mat[0][1], -mat[0][0]))
+        if sum(map(abs, eul1)) > sum(map(abs, eul2)):
+            return eul2
+        return eul1
+    else:
+        return (math.atan2(-mat[2][1], mat[1][1]),
+                math.atan2(-mat[0][2], cy),
+                0.0)